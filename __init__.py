@@ -34,18 +34,28 @@ bl_info = {
     "category": "Animation"
 }
 
+import os
+import time
+import logging
 import bpy
+from bpy.app.handlers import persistent
 
 try:
     from . import mixamoroot
+    from . import watcher
+    from . import journal
 except SystemError:
     import mixamoroot
+    import watcher
+    import journal
 
 if "bpy" in locals():
     from importlib import reload
     if "mixamoroot" in locals():
         reload(mixamoroot)
 
+log = logging.getLogger(__name__)
+
 class MixamoPropertyGroup(bpy.types.PropertyGroup):
     '''Property container for options and paths of Mixamo Root'''
     hip_name: bpy.props.StringProperty(
@@ -66,6 +76,12 @@ class MixamoPropertyGroup(bpy.types.PropertyGroup):
         maxlen = 256,
         default = "mixamorig:",
         subtype='NONE')
+    target_prefix: bpy.props.StringProperty(
+        name="Target Prefix",
+        description="Prefix put in place of the Name Prefix when Remove Prefix is set, empty to only strip it",
+        maxlen = 256,
+        default = "",
+        subtype='NONE')
     source_directory: bpy.props.StringProperty(
         name="Source Directory",
         description="Path to directory containing mixamo animation files (.fbx)",
@@ -84,14 +100,213 @@ class MixamoPropertyGroup(bpy.types.PropertyGroup):
         name="Delete Armatures",
         description="Deletes all but one imported armature in the blend file. This assumes you've imported mixamo armatures for animations all applied to the same model",
         default=False)
+    root_motion_engine: bpy.props.EnumProperty(
+        name="Root Motion Engine",
+        description="How the hip motion is moved onto the root bone",
+        items=(
+            ('OPERATOR', "Operator", "Use the Graph Editor operators, requires a UI area"),
+            ('DIRECT', "Direct", "Edit the F-curves directly, faster and works in the background"),
+        ),
+        default='OPERATOR')
+    root_mode: bpy.props.EnumProperty(
+        name="Root Motion",
+        description="Which part of the hips motion moves to the root bone",
+        items=(
+            ('LEGACY', "Legacy", "The original behaviour of Insert Root and Add Root"),
+            ('XY', "XY", "Root X and Y follow the hips, Z stays on the hips"),
+            ('XYZ', "XYZ", "Root follows the hips on every axis, never going below 0"),
+            ('GROUND', "Ground", "Root follows the hips projected onto the ground, the height stays on the hips"),
+            ('CONTACT', "Contact", "Like Ground, but the root height follows the lowest foot or toe of every frame, so jumps and offset floors move the root"),
+        ),
+        default='LEGACY')
+    extract_yaw: bpy.props.BoolProperty(
+        name="Extract Facing",
+        description="Also moves the hips rotation around the up axis to the root bone (not with Legacy)",
+        default=False)
+    import_workers: bpy.props.IntProperty(
+        name="Workers",
+        description="Number of background Blender processes used to import the files in parallel. Only used together with Delete Armatures",
+        min=1,
+        max=64,
+        default=1)
+    native_reader: bpy.props.BoolProperty(
+        name="Fast Animation Reader",
+        description="Read the animation of every file but the last straight from the FBX onto the kept armature, without importing meshes and materials. Only used together with Delete Armatures",
+        default=False)
+    use_cache: bpy.props.BoolProperty(
+        name="Import Cache",
+        description="Skip files that have not changed since they were last imported with the same options, restoring their actions from a cache in the Source Directory",
+        default=False)
+    use_journal: bpy.props.BoolProperty(
+        name="Resumable",
+        description="Keeps the status of every file in a journal in the Source Directory. Failing files no longer stop the import, files failing twice are quarantined, and finished files are skipped when the import is run again",
+        default=False)
+    cache_size: bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Size the import cache is trimmed to, least recently used files are removed first",
+        min=1,
+        default=512)
+    streaming: bpy.props.BoolProperty(
+        name="Streaming Import",
+        description="Removes the meshes, materials and images of every deleted armature before the next file is imported, so memory does not grow with the directory. Only used together with Delete Armatures",
+        default=False)
+    max_resident_actions: bpy.props.IntProperty(
+        name="Max Actions In Memory",
+        description="While streaming, finished actions past this count are moved to a file on disk and appended back at the end. 0 keeps every action in memory",
+        min=0,
+        default=0)
+    normalize_cycles: bpy.props.BoolProperty(
+        name="Close Loops",
+        description="Finds looping clips, makes their hips match on the first and last frame and stores the root travel per cycle and cycle velocity as custom properties of the action. Only used together with Insert Root",
+        default=False)
+    loop_threshold: bpy.props.FloatProperty(
+        name="Loop Threshold",
+        description="Largest rotation difference of any bone between the first and last frame of a clip counted as a loop, in degrees",
+        min=0.0,
+        default=10.0)
+    normalize_start: bpy.props.BoolProperty(
+        name="Start At Frame 0",
+        description="Moves the keys of every imported action so it starts at frame 0",
+        default=True)
+    target_fps: bpy.props.IntProperty(
+        name="Target FPS",
+        description="Resamples every imported action to this frame rate and sets it on the scene. 0 keeps the frame rate of the files",
+        min=0,
+        default=0)
+    dedup: bpy.props.EnumProperty(
+        name="Duplicates",
+        description="What happens to imported clips with the same bone rotations as an action already in the file, or a trimmed part of one",
+        items=(
+            ('OFF', "Keep", "Duplicates are kept as separate actions"),
+            ('ALIAS', "Alias", "Duplicates are removed, their names are kept in a custom property of the matching action"),
+            ('SKIP', "Skip", "Duplicates are removed"),
+        ),
+        default='OFF')
+    decimate: bpy.props.BoolProperty(
+        name="Reduce Keys",
+        description="Removes redundant baked keys from the processed actions, keeping every channel within the tolerances",
+        default=False)
+    location_tolerance: bpy.props.FloatProperty(
+        name="Location Tolerance",
+        description="Largest change of a location or scale value allowed when removing keys",
+        min=0.0,
+        precision=4,
+        default=0.001)
+    rotation_tolerance: bpy.props.FloatProperty(
+        name="Rotation Tolerance",
+        description="Largest change of a rotation allowed when removing keys, in degrees",
+        min=0.0,
+        default=0.1)
+    report_path: bpy.props.StringProperty(
+        name="Timing Report",
+        description="File the per file stage timings of an import are written to, .csv or .json. Left empty no report is written",
+        maxlen = 1024,
+        default = "",
+        subtype='FILE_PATH')
+    profile_slowest: bpy.props.IntProperty(
+        name="Profile Slowest",
+        description="Keeps a cProfile dump of this many of the slowest files next to the report. Profiling slows the import down",
+        min=0,
+        default=0)
+    tick_budget: bpy.props.FloatProperty(
+        name="Time Budget",
+        description="Seconds of importing per update of the background import before Blender gets to redraw and handle input. At least one file is imported per update",
+        min=0.0,
+        default=0.1)
+    watch_interval: bpy.props.FloatProperty(
+        name="Poll Interval",
+        description="Seconds between checks of the Source Directory while watching",
+        min=0.5,
+        default=2.0)
+    watch_debounce: bpy.props.FloatProperty(
+        name="Settle Time",
+        description="Seconds a new file has to stay unchanged before it is imported, so unfinished downloads are skipped",
+        min=0.0,
+        default=5.0)
+    use_nla_frame_range: bpy.props.BoolProperty(
+        name="Limit Frame Range",
+        description="Only add root motion to strips overlapping the NLA frame range (Direct engine)",
+        default=False)
+    nla_frame_start: bpy.props.IntProperty(
+        name="Start",
+        description="First frame of the strips to process",
+        default=0)
+    nla_frame_end: bpy.props.IntProperty(
+        name="End",
+        description="Last frame of the strips to process",
+        default=250)
     delete_applied_armatures: bpy.props.BoolProperty(
         name="Delete Armatures",
         description="Deletes all armatures for applied animations after the process is complete",
         default=False)
     push_nla: bpy.props.BoolProperty(
         name="Push To NLA",
-        description="Pushes all the actions created for the control rig to the NLA",
+        description="Pushes every action created for the control rig to its own NLA track, at the frame the action starts",
+        default=False)
+    nla_pack: bpy.props.BoolProperty(
+        name="Pack Strips",
+        description="Push To NLA lays the actions out on [Tracks] tracks one after another instead, see Gap and Align",
         default=False)
+    nla_tracks: bpy.props.IntProperty(
+        name="Tracks",
+        description="Number of NLA tracks the strips are laid out on, one after another. 0 puts every strip on its own track",
+        min=0,
+        default=1)
+    nla_gap: bpy.props.IntProperty(
+        name="Gap",
+        description="Frames between consecutive strips on a track",
+        min=0,
+        default=0)
+    nla_align: bpy.props.IntProperty(
+        name="Align",
+        description="Strips start on a multiple of this many frames",
+        min=1,
+        default=1)
+    builtin_retarget: bpy.props.BoolProperty(
+        name="Built-in Retarget",
+        description="Retargets the animations with the add-on's own bone mapping instead of the mixamo addon's Import Animation operator. Only FK controls are keyed",
+        default=False)
+
+def import_arguments(operator, mixamo):
+    # Arguments of get_all_anims from the panel settings, None after reporting what is missing
+    source_directory = mixamo.source_directory
+    hip_name = mixamo.hip_name
+    root_name = mixamo.root_name
+    name_prefix = mixamo.name_prefix
+    remove_prefix = mixamo.remove_prefix
+    target_prefix = mixamo.target_prefix
+    insert_root = mixamo.insert_root
+    delete_armatures = mixamo.delete_armatures
+    root_motion_engine = mixamo.root_motion_engine
+    import_workers = mixamo.import_workers
+    native_reader = mixamo.native_reader
+    use_cache = mixamo.use_cache
+    cache_size = mixamo.cache_size
+    if source_directory == '':
+        operator.report({'ERROR_INVALID_INPUT'}, "Error: no Source Directory set.")
+        return None
+    if hip_name == '':
+        operator.report({'ERROR_INVALID_INPUT'}, "Error: no Hip Bone Name set.")
+        return None
+    if root_name == '':
+        operator.report({'ERROR_INVALID_INPUT'}, "Error: no Root Bone Name set.")
+        return None
+    if remove_prefix == True:
+        operator.report({'WARNING'}, "Remove Prefix set to true, armature components will have their mixamo prefix removed.")
+    if delete_armatures == True:
+        operator.report({'WARNING'}, "Delete Armatures set to true, imported animation armatures will be removed.")
+    return dict(
+        source_dir=bpy.path.abspath(source_directory),
+        root_bone_name=root_name,
+        hip_bone_name=hip_name,
+        remove_prefix=remove_prefix, name_prefix=name_prefix, insert_root=insert_root, delete_armatures=delete_armatures, engine=root_motion_engine, workers=import_workers, native_reader=native_reader, use_cache=use_cache, cache_size=cache_size * 1024 * 1024, target_prefix=target_prefix,
+        decimate=mixamo.decimate, location_tolerance=mixamo.location_tolerance, rotation_tolerance=mixamo.rotation_tolerance,
+        streaming=mixamo.streaming, max_resident_actions=mixamo.max_resident_actions,
+        report_path=bpy.path.abspath(mixamo.report_path) if mixamo.report_path else None, profile_slowest=mixamo.profile_slowest,
+        root_mode=mixamo.root_mode, extract_yaw=mixamo.extract_yaw,
+        normalize_cycles=mixamo.normalize_cycles, loop_threshold=mixamo.loop_threshold, dedup=mixamo.dedup,
+        normalize_start=mixamo.normalize_start, target_fps=mixamo.target_fps,
+        journal_path=os.path.join(bpy.path.abspath(source_directory), journal.JOURNAL_NAME) if mixamo.use_journal else None)
 
 class OBJECT_OT_ImportAnimations(bpy.types.Operator):
     '''Operator for importing animations and inserting root bones'''
@@ -99,33 +314,189 @@ class OBJECT_OT_ImportAnimations(bpy.types.Operator):
     bl_label = "Import Animations"
     bl_description = "Imports all mixamo animations from the [Source Directory], insert root bones, and merges into a single armature"
 
+    def execute(self, context):
+        arguments = import_arguments(self, context.scene.mixamo)
+        if arguments is None:
+            return{ 'CANCELLED'}
+        mixamoroot.get_all_anims(**arguments)
+        return{ 'FINISHED'}
+
+# State of the running background import, drawn by the panel
+import_progress = {"running": False, "finished": 0, "total": 0, "file": None, "start": 0.0}
+
+class OBJECT_OT_ImportAnimationsModal(bpy.types.Operator):
+    '''Operator for importing animations a few files per timer tick, keeping Blender responsive'''
+    bl_idname = "mixamo.importanimmodal"
+    bl_label = "Import In Background"
+    bl_description = "Imports all mixamo animations from the [Source Directory] like Import Animations, a few files at a time so Blender stays responsive. Press Esc to stop after the current file"
+
+    def execute(self, context):
+        if import_progress["running"]:
+            self.report({'ERROR'}, "Error: an import is already running.")
+            return{ 'CANCELLED'}
+        arguments = import_arguments(self, context.scene.mixamo)
+        if arguments is None:
+            return{ 'CANCELLED'}
+        self.steps = mixamoroot.iter_all_anims(**arguments)
+        self.cancel_requested = False
+        self.timer = None
+        import_progress.update(running=True, finished=0, total=0, file=None, start=time.perf_counter())
+        try:
+            self.update(next(self.steps))
+        except StopIteration as stop:
+            return self.done(context, stop.value)
+        except Exception as e:
+            return self.failed(context, e)
+        window_manager = context.window_manager
+        window_manager.progress_begin(0, 100)
+        self.timer = window_manager.event_timer_add(0.01, window=context.window)
+        window_manager.modal_handler_add(self)
+        return{ 'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.cancel_requested = True
+            self.report({'INFO'}, "Stopping the import after the current file")
+            return{ 'RUNNING_MODAL'}
+        if event.type != 'TIMER' or event.timer != self.timer:
+            return{ 'PASS_THROUGH'}
+        # Files are imported until the time budget of the tick is used up, at least one per tick
+        start = time.perf_counter()
+        try:
+            while True:
+                self.update(self.steps.send(self.cancel_requested))
+                if self.cancel_requested or time.perf_counter() - start > context.scene.mixamo.tick_budget:
+                    break
+        except StopIteration as stop:
+            return self.done(context, stop.value)
+        except Exception as e:
+            return self.failed(context, e)
+        if import_progress["total"]:
+            context.window_manager.progress_update(100.0 * import_progress["finished"] / import_progress["total"])
+        redraw_panels(context)
+        return{ 'PASS_THROUGH'}
+
+    def update(self, progress):
+        finished, total, file = progress
+        import_progress.update(finished=finished, total=total, file=file)
+
+    def cancel(self, context):
+        # Blender stopped the modal operator, e.g. when another file is loaded
+        self.cleanup(context)
+
+    def cleanup(self, context):
+        # Safe to call more than once, leaves no timer, progress bar or running import behind
+        window_manager = context.window_manager
+        if self.timer:
+            window_manager.event_timer_remove(self.timer)
+            window_manager.progress_end()
+            self.timer = None
+        # Closing a suspended generator ends its profiler
+        self.steps.close()
+        import_progress["running"] = False
+        redraw_panels(context)
+
+    def failed(self, context, error):
+        print("[Mixamo Root] ERROR the background import raised %s" % str(error))
+        self.cleanup(context)
+        self.report({'ERROR'}, "Error: the import stopped with %s, see the console" % str(error))
+        return{ 'CANCELLED'}
+
+    def done(self, context, result):
+        self.cleanup(context)
+        if result == -1:
+            self.report({'ERROR'}, "Some animations could not be imported, see the console")
+        elif self.cancel_requested:
+            self.report({'WARNING'}, "Import cancelled after %d of %d files" % (import_progress["finished"], import_progress["total"]))
+            return{ 'CANCELLED'}
+        return{ 'FINISHED'}
+
+def redraw_panels(context):
+    for area in context.screen.areas if context.screen else []:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+def progress_text():
+    # "12/500 files, 1m 20s left" for the panel
+    finished, total = import_progress["finished"], import_progress["total"]
+    elapsed = time.perf_counter() - import_progress["start"]
+    text = "%d/%d files" % (finished, total)
+    if finished and total > finished:
+        left = int(elapsed / finished * (total - finished))
+        text += ", %dm %02ds left" % divmod(left, 60)
+    return text
+
+# Kept out of the scene properties, a saved file would otherwise reopen as watching without a timer
+directory_watch = {"watcher": None}
+
+def watch_tick():
+    directory_watcher = directory_watch["watcher"]
+    if directory_watcher is None:
+        return None
+    mixamo = bpy.context.scene.mixamo
+    if import_progress["running"]:
+        # New files wait for the background import to finish
+        return mixamo.watch_interval
+    ready = directory_watcher.poll()
+    if ready:
+        print("[Mixamo Root] New animation files: " + ", ".join(ready))
+    for name in ready:
+        # One file at a time, so only the files that imported are indexed and the others are retried.
+        # Timers have no UI area, so the direct root motion engine is used
+        try:
+            result = mixamoroot.get_all_anims(
+                directory_watcher.directory,
+                root_bone_name=mixamo.root_name,
+                hip_bone_name=mixamo.hip_name,
+                remove_prefix=mixamo.remove_prefix, name_prefix=mixamo.name_prefix, insert_root=mixamo.insert_root, delete_armatures=mixamo.delete_armatures,
+                engine='DIRECT', native_reader=mixamo.native_reader, use_cache=mixamo.use_cache, cache_size=mixamo.cache_size * 1024 * 1024, files=[name], target_prefix=mixamo.target_prefix,
+                decimate=mixamo.decimate, location_tolerance=mixamo.location_tolerance, rotation_tolerance=mixamo.rotation_tolerance,
+                streaming=mixamo.streaming, max_resident_actions=mixamo.max_resident_actions,
+                root_mode=mixamo.root_mode, extract_yaw=mixamo.extract_yaw,
+                normalize_cycles=mixamo.normalize_cycles, loop_threshold=mixamo.loop_threshold, dedup=mixamo.dedup,
+                normalize_start=mixamo.normalize_start, target_fps=mixamo.target_fps,
+                journal_path=os.path.join(directory_watcher.directory, journal.JOURNAL_NAME) if mixamo.use_journal else None,
+                append=True)
+        except Exception as e:
+            # An exception would drop the timer, the file is retried once it changes or the watch restarts
+            log.error("[Mixamo Root] ERROR watching %s raised %s when importing %s" % (directory_watcher.directory, str(e), name))
+            continue
+        if result != -1:
+            directory_watcher.imported(name)
+    return mixamo.watch_interval
+
+def is_watching():
+    return directory_watch["watcher"] is not None
+
+def stop_watching():
+    directory_watch["watcher"] = None
+    if bpy.app.timers.is_registered(watch_tick):
+        bpy.app.timers.unregister(watch_tick)
+
+@persistent
+def stop_watching_on_load(_filepath):
+    # Loading a file drops the timer, the watch has to be started again
+    stop_watching()
+
+class OBJECT_OT_WatchDirectory(bpy.types.Operator):
+    '''Operator for importing new animations as they appear in the Source Directory'''
+    bl_idname = "mixamo.watchdir"
+    bl_label = "Watch Directory"
+    bl_description = "Starts or stops watching the [Source Directory], importing new or changed mixamo animations with the current settings once they finish downloading"
+
     def execute(self, context):
         mixamo = context.scene.mixamo
-        source_directory = mixamo.source_directory
-        hip_name = mixamo.hip_name
-        root_name = mixamo.root_name
-        name_prefix = mixamo.name_prefix
-        remove_prefix = mixamo.remove_prefix
-        insert_root = mixamo.insert_root
-        delete_armatures = mixamo.delete_armatures
-        if source_directory == '':
+        if is_watching():
+            stop_watching()
+            return{ 'FINISHED'}
+        if mixamo.source_directory == '':
             self.report({'ERROR_INVALID_INPUT'}, "Error: no Source Directory set.")
             return{ 'CANCELLED'}
-        if hip_name == '':
-            self.report({'ERROR_INVALID_INPUT'}, "Error: no Hip Bone Name set.")
-            return{ 'CANCELLED'}
-        if root_name == '':
-            self.report({'ERROR_INVALID_INPUT'}, "Error: no Root Bone Name set.")
+        if mixamo.hip_name == '' or mixamo.root_name == '':
+            self.report({'ERROR_INVALID_INPUT'}, "Error: no Hip Bone Name or Root Bone Name set.")
             return{ 'CANCELLED'}
-        if remove_prefix == True:
-            self.report({'WARNING'}, "Remove Prefix set to true, armature components will have their mixamo prefix removed.")
-        if delete_armatures == True:
-            self.report({'WARNING'}, "Delete Armatures set to true, imported animation armatures will be removed.")
-        mixamoroot.get_all_anims(
-            bpy.path.abspath(source_directory),
-            root_bone_name=root_name,
-            hip_bone_name=hip_name,
-            remove_prefix=remove_prefix, name_prefix=name_prefix, insert_root=insert_root, delete_armatures=delete_armatures)
+        directory_watch["watcher"] = watcher.DirectoryWatcher(bpy.path.abspath(mixamo.source_directory), debounce=mixamo.watch_debounce)
+        bpy.app.timers.register(watch_tick, first_interval=mixamo.watch_interval)
         return{ 'FINISHED'}
 
 class OBJECT_OT_ApplyAnimations(bpy.types.Operator):
@@ -145,7 +516,48 @@ class OBJECT_OT_ApplyAnimations(bpy.types.Operator):
             return{ 'CANCELLED'}
         if delete_applied_armatures == True:
             self.report({'WARNING'}, "Delete Armatures set to true, imported animation armatures will be removed.")
-        mixamoroot.apply_all_anims(delete_applied_armatures=delete_applied_armatures, control_rig=control_rig, push_nla=push_nla)
+        mixamoroot.apply_all_anims(delete_applied_armatures=delete_applied_armatures, control_rig=control_rig, push_nla=push_nla, builtin_retarget=mixamo.builtin_retarget, name_prefix=mixamo.name_prefix, hip_bone_name=mixamo.hip_name,
+            nla_pack=mixamo.nla_pack, nla_tracks=mixamo.nla_tracks, nla_gap=mixamo.nla_gap, nla_align=mixamo.nla_align)
+        return{ 'FINISHED'}
+
+class OBJECT_OT_PackNLA(bpy.types.Operator):
+    '''Operator for laying out the actions of an armature on a few NLA tracks'''
+    bl_idname = "mixamo.packnla"
+    bl_label = "Pack NLA"
+    bl_description = "Replaces the NLA tracks of the selected armature with [Tracks] tracks holding all its strip actions one after another"
+
+    def execute(self, context):
+        mixamo = context.scene.mixamo
+        if context.object is None or context.object.type != 'ARMATURE':
+            self.report({'ERROR_INVALID_INPUT'}, "Error: no armature selected.")
+            return{ 'CANCELLED'}
+        mixamoroot.pack_nla(context.object, mixamo.nla_tracks, mixamo.nla_gap, mixamo.nla_align)
+        return{ 'FINISHED'}
+
+class OBJECT_OT_UnpackNLA(bpy.types.Operator):
+    '''Operator for turning the NLA strips of an armature back into standalone actions'''
+    bl_idname = "mixamo.unpacknla"
+    bl_label = "Unpack NLA"
+    bl_description = "Removes the NLA tracks of the selected armature, keeping the actions of its strips with a fake user"
+
+    def execute(self, context):
+        if context.object is None or context.object.type != 'ARMATURE':
+            self.report({'ERROR_INVALID_INPUT'}, "Error: no armature selected.")
+            return{ 'CANCELLED'}
+        mixamoroot.unpack_nla(context.object)
+        return{ 'FINISHED'}
+
+class OBJECT_OT_RemoveDuplicates(bpy.types.Operator):
+    '''Operator for removing duplicate actions from the file'''
+    bl_idname = "mixamo.removeduplicates"
+    bl_label = "Remove Duplicate Actions"
+    bl_description = "Removes actions with the same bone rotations as another action, or a trimmed part of one, moving their users to the kept action"
+
+    def execute(self, context):
+        mixamo = context.scene.mixamo
+        root_name = mixamoroot.prefixed_name(mixamo.name_prefix + mixamo.root_name, mixamo.remove_prefix, mixamo.name_prefix, mixamo.target_prefix)
+        removed = mixamoroot.remove_duplicate_actions('SKIP' if mixamo.dedup == 'SKIP' else 'ALIAS', root_name)
+        self.report({'INFO'}, "Removed %d duplicate actions" % removed)
         return{ 'FINISHED'}
 
 class OBJECT_OT_AddRootNLA(bpy.types.Operator):
@@ -166,7 +578,10 @@ class OBJECT_OT_AddRootNLA(bpy.types.Operator):
         if root_name == '':
             self.report({'ERROR_INVALID_INPUT'}, "Error: no Root Bone Name set.")
             return{ 'CANCELLED'}
-        mixamoroot.add_root_bone_nla(root_bone_name=root_name, hip_bone_name=hip_name, name_prefix=name_prefix)
+        frame_range = (mixamo.nla_frame_start, mixamo.nla_frame_end) if mixamo.use_nla_frame_range else None
+        mixamoroot.add_root_bone_nla(root_bone_name=root_name, hip_bone_name=hip_name, name_prefix=name_prefix, engine=mixamo.root_motion_engine, frame_range=frame_range,
+            decimate=mixamo.decimate, location_tolerance=mixamo.location_tolerance, rotation_tolerance=mixamo.rotation_tolerance,
+            root_mode=mixamo.root_mode, extract_yaw=mixamo.extract_yaw)
         return{ 'FINISHED'}
 
 class MIXAMOCONV_VIEW_3D_PT_mixamoroot(bpy.types.Panel):
@@ -191,11 +606,42 @@ class MIXAMOCONV_VIEW_3D_PT_mixamoroot(bpy.types.Panel):
         row.prop(scene.mixamo, "remove_prefix", toggle=True)
         row.prop(scene.mixamo, "delete_armatures", toggle=True)
         row = box.row()
+        row.prop(scene.mixamo, "root_motion_engine")
+        row = box.row()
+        row.prop(scene.mixamo, "root_mode")
+        row.prop(scene.mixamo, "extract_yaw", toggle=True)
+        row = box.row()
+        row.prop(scene.mixamo, "import_workers")
+        row.prop(scene.mixamo, "native_reader", toggle=True)
+        row = box.row()
+        row.prop(scene.mixamo, "use_cache", toggle=True)
+        row.prop(scene.mixamo, "cache_size")
+        row = box.row()
+        row.prop(scene.mixamo, "use_journal", toggle=True)
+        row = box.row()
+        row.prop(scene.mixamo, "streaming", toggle=True)
+        row.prop(scene.mixamo, "max_resident_actions")
+        row = box.row()
+        row.prop(scene.mixamo, "normalize_cycles", toggle=True)
+        row.prop(scene.mixamo, "loop_threshold")
+        row = box.row()
+        row.prop(scene.mixamo, "normalize_start", toggle=True)
+        row.prop(scene.mixamo, "target_fps")
+        row = box.row()
+        row.prop(scene.mixamo, "dedup")
+        row = box.row()
+        row.prop(scene.mixamo, "decimate", toggle=True)
+        row = box.row()
+        row.prop(scene.mixamo, "location_tolerance")
+        row.prop(scene.mixamo, "rotation_tolerance")
+        row = box.row()
         box.prop(scene.mixamo, "hip_name")
         row = box.row()
         box.prop(scene.mixamo, "root_name")
         row = box.row()
         box.prop(scene.mixamo, "name_prefix")
+        row = box.row()
+        box.prop(scene.mixamo, "target_prefix")
         # Button for conversion of single Selected rig
         box = layout.box()
         box.label(text="Animation Files")
@@ -205,6 +651,29 @@ class MIXAMOCONV_VIEW_3D_PT_mixamoroot(bpy.types.Panel):
         row = box.row()
         row.scale_y = 2.0
         row.operator("mixamo.importanim")
+        row = box.row()
+        row.operator("mixamo.importanimmodal")
+        row.prop(scene.mixamo, "tick_budget")
+        if import_progress["running"]:
+            row = box.row()
+            if hasattr(row, "progress"):
+                row.progress(factor=import_progress["finished"] / max(import_progress["total"], 1), text=progress_text())
+            else:
+                row.label(text=progress_text())
+            if import_progress["file"]:
+                box.label(text=import_progress["file"])
+            box.label(text="Esc to stop after the current file")
+        row = box.row()
+        row.operator("mixamo.watchdir", text="Stop Watching" if is_watching() else "Watch Directory", depress=is_watching())
+        row = box.row()
+        row.prop(scene.mixamo, "watch_interval")
+        row.prop(scene.mixamo, "watch_debounce")
+        row = box.row()
+        row.prop(scene.mixamo, "report_path")
+        row.prop(scene.mixamo, "profile_slowest")
+        # Timings of the last import
+        for line in mixamoroot.profiling.last_summary:
+            box.label(text=line)
         status_row = box.row()
         box = layout.box()
         box.label(text="Animation Helpers")
@@ -216,17 +685,38 @@ class MIXAMOCONV_VIEW_3D_PT_mixamoroot(bpy.types.Panel):
         row.prop(scene.mixamo, "delete_applied_armatures", toggle=True) # todo delete_applied_armatures
         row.prop(scene.mixamo, "push_nla", toggle=True)
         row = box.row()
+        row.prop(scene.mixamo, "nla_pack", toggle=True)
+        row.prop(scene.mixamo, "nla_tracks")
+        row.prop(scene.mixamo, "nla_gap")
+        row.prop(scene.mixamo, "nla_align")
+        row = box.row()
+        row.operator("mixamo.packnla")
+        row.operator("mixamo.unpacknla")
+        row = box.row()
+        row.prop(scene.mixamo, "builtin_retarget", toggle=True)
+        row = box.row()
         # box.prop(scene.mixamo, "mixamo.applyanims") # todo
         row.operator("mixamo.applyanims")
         row = box.row()
         row.scale_y = 2.0
         row.operator("mixamo.addrootnla")
+        row = box.row()
+        row.operator("mixamo.removeduplicates")
+        row = box.row()
+        row.prop(scene.mixamo, "use_nla_frame_range", toggle=True)
+        row.prop(scene.mixamo, "nla_frame_start")
+        row.prop(scene.mixamo, "nla_frame_end")
         status_row = box.row()
         # status_row = box.row()
 
 classes = (
     OBJECT_OT_ImportAnimations,
+    OBJECT_OT_ImportAnimationsModal,
+    OBJECT_OT_WatchDirectory,
     OBJECT_OT_ApplyAnimations,
+    OBJECT_OT_PackNLA,
+    OBJECT_OT_UnpackNLA,
+    OBJECT_OT_RemoveDuplicates,
     OBJECT_OT_AddRootNLA,
     MIXAMOCONV_VIEW_3D_PT_mixamoroot,
 )
@@ -240,6 +730,7 @@ def register():
     bpy.types.Scene.mixamo = bpy.props.PointerProperty(type=MixamoPropertyGroup)
     for cls in classes:
         bpy.utils.register_class(cls)
+    bpy.app.handlers.load_post.append(stop_watching_on_load)
     '''
     bpy.utils.register_class(OBJECT_OT_ImportAnimations)
     bpy.utils.register_class(OBJECT_OT_ApplyAnimations)
@@ -248,6 +739,9 @@ def register():
     '''
 
 def unregister():
+    stop_watching()
+    if stop_watching_on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(stop_watching_on_load)
     for cls in classes:
         bpy.utils.unregister_class(cls)
     bpy.utils.unregister_class(MixamoPropertyGroup)    
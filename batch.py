@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Headless batch conversion of a whole animation library:
+#   blender -b -P mixamoroot.py -- --src ~/mixamo --out library.blend --jobs 32 --insert-root --delete-armatures
+# The FBX list is split into contiguous shards, each shard is converted by its own background
+# Blender process into a partial .blend, and the parts are appended into the output file.
+# With --journal a failing file no longer stops the conversion, the output is saved every
+# --checkpoint-every finished files, and --resume continues a crashed run from that checkpoint:
+#   blender -b -P mixamoroot.py -- --src ~/mixamo --out library.blend --journal library.json --resume
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+
+import bpy
+
+try:
+    from . import mixamoroot
+except ImportError:
+    import mixamoroot
+
+
+log = logging.getLogger(__name__)
+
+
+def shard(files, jobs):
+    # Contiguous shards, so the last file of the last shard is still the last file overall
+    size, extra = divmod(len(files), jobs)
+    shards = []
+    start = 0
+    for i in range(jobs):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            shards.append(files[start:end])
+        start = end
+    return shards
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="blender -b -P mixamoroot.py --", description="Convert a directory of Mixamo animations into one .blend file")
+    parser.add_argument("--src", required=True, help="Directory containing the mixamo animation files (.fbx)")
+    parser.add_argument("--out", required=True, help=".blend file to write")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of background Blender processes")
+    parser.add_argument("--root-name", default="Root")
+    parser.add_argument("--hip-name", default="mixamorig:Hips")
+    parser.add_argument("--name-prefix", default="mixamorig:")
+    parser.add_argument("--insert-root", action="store_true")
+    parser.add_argument("--remove-prefix", action="store_true")
+    parser.add_argument("--root-mode", choices=('LEGACY', 'XY', 'XYZ', 'GROUND', 'CONTACT'), default='LEGACY')
+    parser.add_argument("--extract-yaw", action="store_true", help="Move the hips facing to the root as well")
+    parser.add_argument("--target-prefix", default="", help="Prefix to put in place of the removed one")
+    parser.add_argument("--delete-armatures", action="store_true")
+    parser.add_argument("--streaming", action="store_true", help="Purge the data of deleted armatures after every file, with --delete-armatures")
+    parser.add_argument("--max-resident-actions", type=int, default=0, help="Move finished actions to disk past this many while streaming")
+    parser.add_argument("--normalize-cycles", action="store_true", help="Close looping clips and store their cycle velocity, with --insert-root")
+    parser.add_argument("--loop-threshold", type=float, default=10.0, help="Degrees")
+    parser.add_argument("--dedup", choices=('OFF', 'ALIAS', 'SKIP'), default='OFF', help="Remove clips repeating another one, ALIAS keeps their names on the kept action")
+    parser.add_argument("--target-fps", type=int, default=0, help="Resample every action to this frame rate, 0 keeps the rate of the files")
+    parser.add_argument("--keep-start", action="store_true", help="Leave the actions on the frames they were imported at instead of starting them at frame 0")
+    parser.add_argument("--decimate", action="store_true", help="Remove redundant baked keys")
+    parser.add_argument("--location-tolerance", type=float, default=0.001)
+    parser.add_argument("--rotation-tolerance", type=float, default=0.1, help="Degrees")
+    parser.add_argument("--report", help="Write the per file stage timings to this .json or .csv file")
+    parser.add_argument("--profile-slowest", type=int, default=0, help="Keep cProfile dumps of this many of the slowest files")
+    parser.add_argument("--journal", help="Keep the status of every file in this .json file and continue past failing files")
+    parser.add_argument("--resume", action="store_true", help="Continue the run recorded in --journal from the last checkpoint of the output")
+    parser.add_argument("--checkpoint-every", type=int, default=25, help="Save the output after this many finished files, with --journal")
+    parser.add_argument("--keep-parts", action="store_true", help="Keep the partial .blend files next to the output")
+    # Used by the coordinator to start the shard processes
+    parser.add_argument("--files-from", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def import_options(args):
+    return dict(root_bone_name=args.root_name, hip_bone_name=args.hip_name, name_prefix=args.name_prefix,
+                insert_root=args.insert_root, remove_prefix=args.remove_prefix, delete_armatures=args.delete_armatures,
+                target_prefix=args.target_prefix, root_mode=args.root_mode, extract_yaw=args.extract_yaw,
+                normalize_cycles=args.normalize_cycles, loop_threshold=args.loop_threshold, decimate=args.decimate, location_tolerance=args.location_tolerance, rotation_tolerance=args.rotation_tolerance,
+                streaming=args.streaming, max_resident_actions=args.max_resident_actions, dedup=args.dedup,
+                normalize_start=not args.keep_start, target_fps=args.target_fps,
+                report_path=os.path.abspath(args.report) if args.report else None, profile_slowest=args.profile_slowest,
+                journal_path=os.path.abspath(args.journal) if args.journal else None, resume=args.resume)
+
+def save(out, copy=False):
+    # Every action is kept, the armatures of most of them are deleted
+    for action in bpy.data.actions:
+        action.use_fake_user = True
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(out), copy=copy)
+
+def checkpointer(out, every):
+    # get_all_anims calls this after every finished file
+    finished = [0]
+    def checkpoint():
+        finished[0] += 1
+        if finished[0] % every == 0:
+            save(out, copy=True)
+            print("[Mixamo Root] Checkpoint saved after %d files" % finished[0])
+    return checkpoint
+
+def convert(src, files, out, options, checkpoint_every=0):
+    # Converts files into a fresh session, or the last checkpoint of out when resuming, and saves it to out
+    if options.get("resume") and options.get("journal_path") and os.path.exists(out):
+        bpy.ops.wm.open_mainfile(filepath=os.path.abspath(out))
+    else:
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+    if options.get("journal_path") and checkpoint_every > 0:
+        options = dict(options, checkpoint=checkpointer(out, checkpoint_every))
+    result = mixamoroot.get_all_anims(src, engine='DIRECT', files=files, **options)
+    save(out)
+    return result
+
+def merge(parts, out, keep_objects='ALL', dedup='OFF', root_name=None, normalize_start=True, target_fps=0):
+    # Appends the actions of every part and the objects of all parts ('ALL') or only the last one ('LAST'),
+    # dedup also removes the duplicates between parts. The scene gets the frame rate and range the parts were saved with.
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    for i, part in enumerate(parts):
+        with_objects = keep_objects == 'ALL' or i == len(parts) - 1
+        with bpy.data.libraries.load(part, link=False) as (data_from, data_to):
+            data_to.actions = list(data_from.actions)
+            if with_objects:
+                data_to.objects = list(data_from.objects)
+        for action in data_to.actions:
+            if action:
+                action.use_fake_user = True
+        if with_objects:
+            for obj in data_to.objects:
+                if obj:
+                    scene.collection.objects.link(obj)
+    if dedup != 'OFF':
+        mixamoroot.remove_duplicate_actions(dedup, root_name)
+    mixamoroot.fit_scene(scene, [action.frame_range[1] for action in bpy.data.actions], normalize_start, target_fps)
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(out))
+
+def run_shards(args, files):
+    if args.journal:
+        # A fixed place, so a resumed run finds the parts and journals of the shards again
+        work_dir = os.path.abspath(args.out) + ".parts"
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        work_dir = tempfile.mkdtemp(prefix="mixamoroot_batch_", dir=os.path.dirname(os.path.abspath(args.out)))
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mixamoroot.py")
+    passthrough = sys.argv[sys.argv.index("--") + 1:]
+    processes = []
+    parts = []
+    for i, files_part in enumerate(shard(files, args.jobs)):
+        files_from = os.path.join(work_dir, "shard%03d.json" % i)
+        part = os.path.join(work_dir, "part%03d.blend" % i)
+        with open(files_from, 'w') as f:
+            json.dump(files_part, f)
+        # Every argument is passed on, the shard only overrides the file list and the output
+        command = [bpy.app.binary_path, '--background', '--factory-startup', '--python', script, '--'] + passthrough + ['--files-from', files_from, '--out', part]
+        if args.report:
+            # One timing report per shard, next to the requested one
+            stem, ext = os.path.splitext(os.path.abspath(args.report))
+            command += ['--report', "%s.shard%03d%s" % (stem, i, ext)]
+        if args.journal:
+            stem, ext = os.path.splitext(os.path.abspath(args.journal))
+            command += ['--journal', "%s.shard%03d%s" % (stem, i, ext)]
+        shard_log = open(os.path.join(work_dir, "shard%03d.log" % i), 'w')
+        processes.append((subprocess.Popen(command, stdout=shard_log, stderr=subprocess.STDOUT), shard_log))
+        parts.append(part)
+
+    failed = False
+    for process, shard_log in processes:
+        process.wait()
+        shard_log.close()
+        if process.returncode != 0:
+            failed = True
+            log.error("[Mixamo Root] Batch shard exited with code %d, see %s" % (process.returncode, shard_log.name))
+    parts = [part for part in parts if os.path.exists(part)]
+    return work_dir, parts, failed
+
+def main(argv):
+    args = parse_args(argv)
+    options = import_options(args)
+    src = os.path.abspath(args.src)
+
+    if args.files_from:
+        with open(args.files_from) as f:
+            files = json.load(f)
+        if convert(src, files, args.out, options, args.checkpoint_every) == -1:
+            sys.exit(1)
+        return
+
+    start = time.perf_counter()
+    files = [file for file in os.listdir(src) if not file.endswith('.DS_Store') and file.endswith('.fbx')]
+    if args.journal:
+        # The same shards on every run, so a resumed shard continues its own journal
+        files.sort()
+    if args.jobs <= 1 or len(files) <= 1:
+        result = convert(src, files, args.out, options, args.checkpoint_every)
+        print("[Mixamo Root] Converted %d files in %.1fs" % (len(files), time.perf_counter() - start))
+        if result == -1:
+            sys.exit(1)
+        return
+
+    work_dir, parts, failed = run_shards(args, files)
+    root_name = mixamoroot.prefixed_name(args.name_prefix + args.root_name, args.remove_prefix, args.name_prefix, args.target_prefix)
+    merge(parts, args.out, 'LAST' if args.delete_armatures else 'ALL', args.dedup, root_name, not args.keep_start, args.target_fps)
+    if args.keep_parts or (args.journal and failed):
+        print("[Mixamo Root] Partial files kept in " + work_dir)
+    else:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("[Mixamo Root] Converted %d files with %d jobs in %.1fs" % (len(files), args.jobs, time.perf_counter() - start))
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Benchmarks for the Mixamo Root stages on synthetic Mixamo style rigs.
+# Run from a terminal, the operator comparison needs a window so leave out -b for it:
+#   blender --factory-startup -P benchmark.py -- scale --bones 65 --frames 5000
+#   blender -b --factory-startup -P benchmark.py -- import --files 32 --workers 8
+#   blender -b --factory-startup -P benchmark.py -- stages --clips 10,100,1000 --frames 100,1000,10000 --out results.json
+# The NumPy kernels run without Blender:
+#   python benchmark.py micro --frames 10000 --out micro.json
+# Every run writes the same JSON layout, a header describing the run plus one record per
+# measurement, so results of different versions can be compared with a diff or a script.
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+import contextlib
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if bpy:
+    try:
+        from . import mixamoroot
+    except ImportError:
+        import mixamoroot
+else:
+    mixamoroot = None
+
+try:
+    from . import core
+    from . import decimate
+    from . import fk
+    from . import transforms
+    from .keyframes import KeyframeBuffer
+except ImportError:
+    import core
+    import decimate
+    import fk
+    import transforms
+    from keyframes import KeyframeBuffer
+
+
+# (name, parent, head offset from the parent head in cm), loosely following a Mixamo Y Bot
+MIXAMO_BONES = (
+    ("Hips", None, (0.0, 0.0, 100.0)),
+    ("Spine", "Hips", (0.0, 0.0, 10.0)),
+    ("Spine1", "Spine", (0.0, 0.0, 12.0)),
+    ("Spine2", "Spine1", (0.0, 0.0, 13.0)),
+    ("Neck", "Spine2", (0.0, 0.0, 15.0)),
+    ("Head", "Neck", (0.0, 0.0, 10.0)),
+    ("HeadTop_End", "Head", (0.0, 0.0, 18.0)),
+    ("LeftShoulder", "Spine2", (6.0, 0.0, 10.0)),
+    ("LeftArm", "LeftShoulder", (12.0, 0.0, 0.0)),
+    ("LeftForeArm", "LeftArm", (27.0, 0.0, 0.0)),
+    ("LeftHand", "LeftForeArm", (25.0, 0.0, 0.0)),
+    ("RightShoulder", "Spine2", (-6.0, 0.0, 10.0)),
+    ("RightArm", "RightShoulder", (-12.0, 0.0, 0.0)),
+    ("RightForeArm", "RightArm", (-27.0, 0.0, 0.0)),
+    ("RightHand", "RightForeArm", (-25.0, 0.0, 0.0)),
+    ("LeftUpLeg", "Hips", (9.0, 0.0, -6.0)),
+    ("LeftLeg", "LeftUpLeg", (0.0, 0.0, -42.0)),
+    ("LeftFoot", "LeftLeg", (0.0, 0.0, -42.0)),
+    ("LeftToeBase", "LeftFoot", (0.0, -14.0, -8.0)),
+    ("LeftToe_End", "LeftToeBase", (0.0, -8.0, 0.0)),
+    ("RightUpLeg", "Hips", (-9.0, 0.0, -6.0)),
+    ("RightLeg", "RightUpLeg", (0.0, 0.0, -42.0)),
+    ("RightFoot", "RightLeg", (0.0, 0.0, -42.0)),
+    ("RightToeBase", "RightFoot", (0.0, -14.0, -8.0)),
+    ("RightToe_End", "RightToeBase", (0.0, -8.0, 0.0)),
+)
+
+
+def bone_layout(bone_count, name_prefix="mixamorig:"):
+    # Mixamo bones first, padded with finger style chains off the hands for larger rigs
+    layout = [(name_prefix + name, parent and name_prefix + parent, head) for name, parent, head in MIXAMO_BONES[:bone_count]]
+    for i in range(bone_count - len(layout)):
+        side = "Left" if i % 2 == 0 else "Right"
+        parent = layout[-2][0] if i >= 2 else name_prefix + side + "Hand"
+        layout.append(("%s%sFinger%d" % (name_prefix, side, i // 2), parent, (3.0 if side == "Left" else -3.0, 0.0, 0.0)))
+    return layout
+
+
+def make_armature(name="Benchmark", bone_count=len(MIXAMO_BONES), name_prefix="mixamorig:"):
+    # Mimics an imported Mixamo armature: bones in cm with the 0.01 scale left on the object
+    data = bpy.data.armatures.new(name)
+    armature = bpy.data.objects.new(name, data)
+    bpy.context.scene.collection.objects.link(armature)
+    armature.scale = (0.01, 0.01, 0.01)
+    bpy.context.view_layer.objects.active = armature
+    for obj in bpy.context.selected_objects:
+        obj.select_set(False)
+    armature.select_set(True)
+
+    bpy.ops.object.mode_set(mode='EDIT')
+    heads = {}
+    for bone_name, parent, offset in bone_layout(bone_count, name_prefix):
+        bone = data.edit_bones.new(bone_name)
+        head = np.add(heads.get(parent, (0.0, 0.0, 0.0)), offset)
+        heads[bone_name] = head
+        bone.head = head
+        bone.tail = head + (0.0, 0.0, 5.0)
+        if parent:
+            bone.parent = data.edit_bones[parent]
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return armature
+
+
+def make_action(armature, frame_count=1000, name=None, seed=0):
+    # One key per frame on location, quaternion and scale of every bone, like a baked Mixamo clip
+    rng = np.random.default_rng(seed)
+    action = bpy.data.actions.new(name or armature.name + "Action")
+    frames = np.arange(1, frame_count + 1, dtype=np.float32)
+    phase = frames / 30.0
+    co = np.empty((frame_count, 2), dtype=np.float32)
+    co[:, 0] = frames
+    for bone in armature.pose.bones:
+        channels = []
+        location = rng.normal(0.0, 1.0, 3)[None, :] * np.sin(phase[:, None] * rng.uniform(1.0, 4.0))
+        if bone.parent is None:
+            # Hips travel forward and bob up and down
+            location[:, 1] += phase * 150.0
+            location[:, 2] += np.sin(phase * 6.0) * 4.0
+        channels.append(("location", location))
+        angle = np.sin(phase * rng.uniform(1.0, 4.0)) * 0.3
+        axis = rng.normal(0.0, 1.0, 3)
+        axis /= np.linalg.norm(axis)
+        rotation = np.column_stack((np.cos(angle), *(np.sin(angle)[None, :] * axis[:, None])))
+        channels.append(("rotation_quaternion", rotation))
+        channels.append(("scale", np.ones((frame_count, 3))))
+        for prop, samples in channels:
+            data_path = 'pose.bones["{}"].{}'.format(bone.name, prop)
+            for index in range(samples.shape[1]):
+                fc = action.fcurves.new(data_path, index=index, action_group=bone.name)
+                fc.keyframe_points.add(frame_count)
+                co[:, 1] = samples[:, index]
+                fc.keyframe_points.foreach_set('co', co.ravel())
+                fc.update()
+    if armature.animation_data is None:
+        armature.animation_data_create()
+    armature.animation_data.action = action
+    return action
+
+
+def ui_override():
+    # The Graph Editor operators need an area, borrow the largest one of the first window
+    window = bpy.context.window_manager.windows[0]
+    area = max(window.screen.areas, key=lambda area: area.width * area.height)
+    return window, area
+
+
+def engine_context(engine):
+    # The operator engine runs the Graph Editor operators, which need the borrowed area even under -P
+    if engine != 'OPERATOR':
+        return contextlib.nullcontext()
+    window, area = ui_override()
+    return bpy.context.temp_override(window=window, area=area)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_scaling(bone_count=len(MIXAMO_BONES), frame_count=1000, action_count=1):
+    results = {"bones": bone_count, "frames": frame_count, "actions": action_count}
+    armature = make_armature(bone_count=bone_count)
+    actions = [make_action(armature, frame_count, "ScaleBench%d" % i, seed=i) for i in range(action_count)]
+    results["scale_locations"] = timed(mixamoroot.scale_locations, actions)
+
+    if bpy.app.background:
+        print("[Mixamo Root] Skipping the operator path, it needs a window (run without -b)")
+    else:
+        window, area = ui_override()
+        start = time.perf_counter()
+        for action in actions:
+            armature.animation_data.action = action
+            with bpy.context.temp_override(window=window, area=area):
+                mixamoroot.scale_all_resize()
+        results["scale_all_resize"] = time.perf_counter() - start
+        bpy.ops.object.mode_set(mode='OBJECT')
+        results["speedup"] = results["scale_all_resize"] / max(results["scale_locations"], 1e-9)
+
+    for action in actions:
+        bpy.data.actions.remove(action)
+    bpy.data.objects.remove(armature)
+    return results
+
+
+def make_fbx_files(directory, file_count=8, bone_count=len(MIXAMO_BONES), frame_count=250):
+    armature = make_armature("SyntheticMixamo", bone_count=bone_count)
+    for i in range(file_count):
+        action = make_action(armature, frame_count, "Clip%03d" % i, seed=i)
+        bpy.ops.export_scene.fbx(filepath=os.path.join(directory, "Clip%03d.fbx" % i), use_selection=True,
+                                 add_leaf_bones=False, bake_anim=True, bake_anim_use_nla_strips=False, bake_anim_use_all_actions=False)
+        bpy.data.actions.remove(action)
+    bpy.data.objects.remove(armature)
+
+
+def action_keys(action):
+    return {(fc.data_path, fc.array_index): [tuple(kp.co) for kp in fc.keyframe_points] for fc in action.fcurves}
+
+
+def bench_import(file_count=8, frame_count=250, workers=4):
+    results = {"files": file_count, "frames": frame_count, "workers": workers}
+    directory = tempfile.mkdtemp(prefix="mixamoroot_bench_")
+    make_fbx_files(directory, file_count, frame_count=frame_count)
+    options = dict(insert_root=True, delete_armatures=True, engine='DIRECT')
+
+    runs = {}
+    for label, worker_count in (("sequential", 1), ("parallel", workers)):
+        old_objs = set(bpy.context.scene.objects)
+        old_actions = set(bpy.data.actions)
+        results[label] = timed(mixamoroot.get_all_anims, directory, workers=worker_count, **options)
+        runs[label] = {action.name: action_keys(action) for action in set(bpy.data.actions) - old_actions}
+        # Rename so the second run gets the same action names
+        for action in set(bpy.data.actions) - old_actions:
+            action.name = label + "_" + action.name
+        bpy.data.batch_remove(set(bpy.context.scene.objects) - old_objs)
+
+    results["speedup"] = results["sequential"] / max(results["parallel"], 1e-9)
+    results["identical"] = runs["sequential"] == runs["parallel"]
+    return results
+
+
+def clear_data():
+    # Empties the file between cases without resetting the window
+    if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.data.batch_remove(list(bpy.data.objects) + list(bpy.data.armatures) + list(bpy.data.actions))
+
+
+def make_clips(clip_count, frame_count, bone_count=len(MIXAMO_BONES)):
+    # One imported style armature with its own action per clip
+    clips = []
+    for i in range(clip_count):
+        armature = make_armature("Clip%04d" % i, bone_count)
+        clips.append((armature, make_action(armature, frame_count, "Clip%04d" % i, seed=i)))
+    return clips
+
+
+def select_only(objects):
+    for obj in bpy.context.selected_objects:
+        obj.select_set(False)
+    for obj in objects:
+        obj.select_set(True)
+    bpy.context.view_layer.objects.active = objects[0]
+
+
+def make_control_rig(bone_count=len(MIXAMO_BONES)):
+    # Stand in for a control rig, the same skeleton with Ctrl_ bone names
+    rig = make_armature("ControlRig", bone_count, name_prefix="")
+    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    for bone in rig.data.bones:
+        bone.name = "Ctrl_" + bone.name
+    return rig
+
+
+def stage_cases(clip_count, frame_count, bone_count, engine):
+    # (stage, seconds) for each pipeline entry point on fresh synthetic clips
+    cases = []
+
+    clear_data()
+    clips = make_clips(clip_count, frame_count, bone_count)
+    start = time.perf_counter()
+    for armature, action in clips:
+        select_only([armature])
+        mixamoroot.scaleAll()
+        bpy.ops.object.mode_set(mode='OBJECT')
+    cases.append(("scaleAll", time.perf_counter() - start))
+
+    clear_data()
+    clips = make_clips(clip_count, frame_count, bone_count)
+    start = time.perf_counter()
+    for armature, action in clips:
+        select_only([armature])
+        with engine_context(engine):
+            mixamoroot.add_root_bone(engine=engine)
+        bpy.ops.object.mode_set(mode='OBJECT')
+    cases.append(("add_root_bone", time.perf_counter() - start))
+
+    select_only([armature for armature, action in clips])
+    cases.append(("removePrefix", timed(mixamoroot.removePrefix)))
+
+    clear_data()
+    rig = make_armature("NLA", bone_count)
+    for i in range(clip_count):
+        action = make_action(rig, frame_count, "Strip%04d" % i, seed=i)
+        mixamoroot.push(rig, action, None, i * frame_count)
+    select_only([rig])
+    with engine_context(engine):
+        cases.append(("add_root_bone_nla", timed(mixamoroot.add_root_bone_nla, engine=engine)))
+
+    clear_data()
+    control_rig = make_control_rig(bone_count)
+    clips = make_clips(clip_count, frame_count, bone_count)
+    select_only([control_rig])
+    cases.append(("apply_all_anims", timed(mixamoroot.apply_all_anims, control_rig=control_rig, builtin_retarget=True)))
+    clear_data()
+    return cases
+
+
+def bench_stages(clip_counts, frame_counts, bone_count=len(MIXAMO_BONES), max_keys=50000000):
+    # Every combination of clip and frame count, skipping the ones that would not fit in memory
+    engine = 'DIRECT' if bpy.app.background else 'OPERATOR'
+    records = []
+    for clip_count in clip_counts:
+        for frame_count in frame_counts:
+            keys = clip_count * frame_count * bone_count * 10
+            if keys > max_keys:
+                print("[Mixamo Root] Skipping %d clips of %d frames, %d keys is over --max-keys" % (clip_count, frame_count, keys))
+                continue
+            for stage, seconds in stage_cases(clip_count, frame_count, bone_count, engine):
+                records.append({"stage": stage, "clips": clip_count, "frames": frame_count, "bones": bone_count, "engine": engine, "seconds": seconds})
+                print("[Mixamo Root] %s: %d clips x %d frames in %.3fs" % (stage, clip_count, frame_count, seconds))
+    return records
+
+
+def best_of(func, repeat=5):
+    # Smallest of a few runs, the usual way to time short kernels
+    return min(timed(func) for _ in range(repeat))
+
+
+def bench_micro(frame_count=1000, channel_count=250):
+    # The NumPy kernels on synthetic baked curves, no Blender needed
+    rng = np.random.default_rng(0)
+    frames = np.arange(frame_count, dtype=np.float64)
+    values = np.cumsum(rng.normal(0.0, 0.01, (channel_count, frame_count)), axis=1)
+    buffers = [KeyframeBuffer(np.column_stack((frames, row))) for row in values]
+    angles = np.column_stack((np.sin(frames / 30.0), np.cos(frames / 40.0), frames * 0.0)) * 40.0
+    matrices = transforms.euler_matrices(angles)
+    quaternions = transforms.matrix_quaternions(matrices)
+
+    def scale():
+        for keys in buffers:
+            keys.scale(1.0)
+
+    def clamp():
+        for keys in buffers:
+            keys.clamp(minimum=-1e9)
+
+    hips = {axis: KeyframeBuffer(np.column_stack((frames, values[axis]))) for axis in range(3)}
+
+    # A 65 bone chain like a Mixamo skeleton, every bone rotating
+    bone_count = 65
+    names = ["bone%02d" % i for i in range(bone_count)]
+    rest = {name: transforms.translation_matrices([[0.0, 0.1, 0.0]])[0] for name in names}
+    parents = {name: names[i - 1] if i else None for i, name in enumerate(names)}
+    basis = {name: matrices for name in names}
+
+    def simplify():
+        for row in values[:25]:
+            decimate.simplify(frames, row[:, None], 0.001)
+
+    kernels = (
+        ("KeyframeBuffer.scale", scale, channel_count),
+        ("KeyframeBuffer.clamp", clamp, channel_count),
+        ("decimate.simplify", simplify, 25),
+        ("decimate.simplify_quaternion", lambda: decimate.simplify(frames, quaternions, np.radians(0.1), decimate.quaternion_errors), 1),
+        ("core.root_motion_keys", lambda: core.root_motion_keys(hips, 'IMPORT'), 3),
+        ("fk.evaluate", lambda: fk.evaluate(rest, parents, basis, frame_count), bone_count),
+        ("transforms.euler_matrices", lambda: transforms.euler_matrices(angles), 1),
+        ("transforms.matrix_quaternions", lambda: transforms.matrix_quaternions(matrices), 1),
+        ("transforms.decompose", lambda: transforms.decompose(matrices), 1),
+    )
+    records = []
+    for name, func, channels in kernels:
+        seconds = best_of(func)
+        records.append({"stage": name, "frames": frame_count, "channels": channels, "seconds": seconds})
+        print("[Mixamo Root] %s: %d channels x %d frames in %.6fs" % (name, channels, frame_count, seconds))
+    return records
+
+
+def run_info(suite):
+    # Header of a results file, enough to tell which version and machine produced it
+    directory = os.path.dirname(os.path.abspath(__file__))
+    info = {"suite": suite, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "system": platform.system()}
+    with open(os.path.join(directory, "__init__.py")) as f:
+        for node in ast.parse(f.read()).body:
+            if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "bl_info" for target in node.targets):
+                info["version"] = ".".join(str(part) for part in ast.literal_eval(node.value)["version"])
+    try:
+        info["commit"] = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=directory, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    if bpy:
+        info["blender"] = bpy.app.version_string
+    return info
+
+
+def counts(text):
+    return [int(part) for part in text.split(",") if part]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Mixamo Root benchmarks")
+    parser.add_argument("suite", choices=("scale", "import", "stages", "micro"))
+    parser.add_argument("--bones", type=int, default=len(MIXAMO_BONES))
+    parser.add_argument("--frames", default="1000", help="Frames per clip, a comma separated list for the stages suite")
+    parser.add_argument("--clips", default="10,100", help="Comma separated clip counts for the stages suite")
+    parser.add_argument("--max-keys", type=int, default=50000000, help="Skip stages cases with more keys than this")
+    parser.add_argument("--channels", type=int, default=250, help="Curves per kernel for the micro suite")
+    parser.add_argument("--actions", type=int, default=1)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default="", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    frame_counts = counts(args.frames)
+    if args.suite == "micro":
+        records = [record for frame_count in frame_counts for record in bench_micro(frame_count, args.channels)]
+    elif bpy is None:
+        parser.error("the %s suite runs inside Blender: blender -b -P benchmark.py -- %s" % (args.suite, args.suite))
+    elif args.suite == "stages":
+        records = bench_stages(counts(args.clips), frame_counts, args.bones, args.max_keys)
+    elif args.suite == "import":
+        records = [bench_import(args.files, frame_counts[0], args.workers)]
+    else:
+        records = [bench_scaling(args.bones, frame_counts[0], args.actions)]
+    results = {"run": run_info(args.suite), "results": records}
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    if "--" in sys.argv:
+        main(sys.argv[sys.argv.index("--") + 1:])
+    else:
+        main(sys.argv[1:] if bpy is None else [])
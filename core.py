@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# The root motion transform without Blender. mixamoroot.py reads the hips curves, hands them
+# to these functions and writes the result back; everything in between is NumPy, so it can
+# also run in plain Python worker pools on channel payloads (keyframes.save_channels files):
+#   python core.py --jobs 16 --out baked/ payloads/*.npz
+# Two legacy variants exist, matching the two paths of the add-on:
+#   'IMPORT'  copyHips: root gets the hips location starting at frame 0, root Y >= 0,
+#             the hips keep only Y, clamped to <= 0
+#   'NLA'     copy_hips_nla: root gets the hips location, root Z >= 0, the hips keep none
+# extract_root_motion is the explicit engine behind the other root motion modes. It works on
+# sampled hips location and rotation, in the axes of the root bone:
+#   'XY'      root follows the hips along the armature X and Y, Z stays on the hips
+#   'XYZ'     root follows the hips on every axis, its height kept >= 0
+#   'GROUND'  root follows the hips projected onto the ground plane, the height stays on the hips
+#   'CONTACT' like 'GROUND', but the root height is the ground contact height of every frame
+#             (the lowest foot or toe point, see fk.contact_heights), so jumps lift the root
+# Whatever the root does not take stays on the hips, so the pose in the world is unchanged.
+# With extract_yaw the facing (rotation around up) of the hips moves to the root as well.
+import os
+import sys
+import argparse
+import multiprocessing
+
+import numpy as np
+
+try:
+    from . import transforms
+    from .keyframes import Channel, KeyframeBuffer, save_channels, load_channels
+except ImportError:
+    import transforms
+    from keyframes import Channel, KeyframeBuffer, save_channels, load_channels
+
+
+# Axis of the root clamped to >= 0 and the hips axes that are kept, per legacy variant
+ROOT_CLAMP_AXIS = {'IMPORT': 1, 'NLA': 2}
+HIPS_KEPT_AXES = {'IMPORT': (1,), 'NLA': ()}
+ROOT_MODES = ('LEGACY', 'XY', 'XYZ', 'GROUND', 'CONTACT')
+
+
+def location_path(bone_name):
+    return 'pose.bones["{}"].location'.format(bone_name)
+
+def root_motion_samples(location, mode='IMPORT'):
+    # Hips location samples (n, 3) to (root, hips) samples, for data sampled once per frame
+    location = np.asarray(location, dtype=np.float64).reshape(-1, 3)
+    root = location.copy()
+    axis = ROOT_CLAMP_AXIS[mode]
+    root[:, axis] = np.maximum(root[:, axis], 0.0)
+    hips = np.zeros_like(location)
+    for axis in HIPS_KEPT_AXES[mode]:
+        hips[:, axis] = np.minimum(location[:, axis], 0.0)
+    return root, hips
+
+def root_motion_keys(hips, mode='IMPORT', start_frame=0.0):
+    # hips is {axis: KeyframeBuffer} of the hips location. Returns the root curves for all 3 axes
+    # and {axis: KeyframeBuffer or None} for the hips, None meaning the curve is removed.
+    frame_offset = 0.0
+    rest_frame = start_frame
+    if mode == 'IMPORT':
+        # graph.paste places the first copied key on the cursor frame (0)
+        first_frames = [keys.frames.min() for keys in hips.values() if len(keys)]
+        frame_offset = -min(first_frames) if first_frames else 0.0
+        rest_frame = 0.0
+
+    root = {}
+    for axis in range(3):
+        keys = hips.get(axis)
+        if keys is None or not len(keys):
+            # keyframe_insert_menu only leaves the rest value
+            root[axis] = KeyframeBuffer([[rest_frame, 0.0]])
+            continue
+        keys = keys.copy().offset(frames=frame_offset)
+        if axis == ROOT_CLAMP_AXIS[mode]:
+            keys.clamp(minimum=0.0)
+        root[axis] = keys
+
+    remaining = {}
+    for axis, keys in hips.items():
+        remaining[axis] = keys.copy().clamp(maximum=0.0) if axis in HIPS_KEPT_AXES[mode] else None
+    return root, remaining
+
+def axis_rotations(angles, axis):
+    # (n,) radians around a unit axis to (n, 3, 3) rotation matrices (Rodrigues)
+    axis = np.asarray(axis, dtype=np.float64)
+    cross = np.array([[0.0, -axis[2], axis[1]], [axis[2], 0.0, -axis[0]], [-axis[1], axis[0], 0.0]])
+    sin = np.sin(angles)[:, None, None]
+    cos = np.cos(angles)[:, None, None]
+    return np.eye(3) + sin * cross + (1.0 - cos) * (cross @ cross)
+
+def split_rows(array, lengths):
+    return np.split(array, np.cumsum(lengths)[:-1]) if len(lengths) > 1 else [array]
+
+def extract_root_motion(location, rotation=None, hips_to_root=np.eye(3), up=(0.0, 0.0, 1.0), mode='GROUND', extract_yaw=False, lengths=None, ground=None, axes=np.eye(3)):
+    # location (n, 3) and rotation (n, 4) are hips samples in the hips' own axes. hips_to_root turns
+    # hips axes into root axes and up is the world up in root axes. Several actions can be processed
+    # at once by stacking their samples, lengths gives the rows of each so angles unwrap per action.
+    # ground (n,) is the root height of every sample for 'CONTACT'. axes holds the armature X, Y and Z
+    # axes in root axes as columns, 'XY' keeps the armature X and Y parts of the motion.
+    # Returns root location, root rotation (None without yaw), hips location and hips rotation.
+    location = np.asarray(location, dtype=np.float64).reshape(-1, 3)
+    lengths = [len(location)] if lengths is None else list(lengths)
+    matrix = np.asarray(hips_to_root, dtype=np.float64)
+    inverse = np.linalg.inv(matrix)
+    up = np.asarray(up, dtype=np.float64)
+    up = up / np.linalg.norm(up)
+
+    if mode == 'XY':
+        axes = np.asarray(axes, dtype=np.float64)
+        projection = axes @ np.diag([1.0, 1.0, 0.0]) @ np.linalg.inv(axes)
+    elif mode == 'XYZ':
+        projection = np.eye(3)
+    elif mode in ('GROUND', 'CONTACT'):
+        projection = np.eye(3) - np.outer(up, up)
+    else:
+        raise ValueError("Unknown root motion mode " + str(mode))
+
+    offsets = location @ matrix.T
+    root_location = offsets @ projection.T
+    if mode == 'CONTACT':
+        if ground is None:
+            raise ValueError("The CONTACT root motion mode needs ground heights")
+        root_location += np.asarray(ground, dtype=np.float64).reshape(-1)[:, None] * up
+    else:
+        # The root never goes below the ground, the rest stays on the hips
+        height = root_location @ up
+        root_location -= np.minimum(height, 0.0)[:, None] * up
+    remaining = offsets - root_location
+
+    root_rotation = None
+    hips_rotation = None if rotation is None else np.asarray(rotation, dtype=np.float64).reshape(-1, 4)
+    if extract_yaw and hips_rotation is not None:
+        # Facing of the hips: a horizontal reference vector turned by the hips rotation, measured around up
+        rotations = matrix @ transforms.quaternion_matrices(hips_rotation)[:, :3, :3] @ inverse
+        reference = np.eye(3)[np.argmin(np.abs(up))]
+        reference = reference - (reference @ up) * up
+        reference /= np.linalg.norm(reference)
+        side = np.cross(up, reference)
+        facing = rotations @ reference
+        yaw = np.arctan2(facing @ side, facing @ reference)
+        yaw = np.concatenate([np.unwrap(part) for part in split_rows(yaw, lengths)])
+
+        root_rotation = np.column_stack((np.cos(yaw / 2.0), np.sin(yaw / 2.0)[:, None] * up))
+        unturn = axis_rotations(-yaw, up)
+        remaining = np.einsum('nij,nj->ni', unturn, remaining)
+        turned = inverse @ unturn @ rotations @ matrix
+        hips_rotation = transforms.matrix_quaternions(turned)
+        hips_rotation = np.concatenate([transforms.make_compatible(part) for part in split_rows(hips_rotation, lengths)])
+
+    hips_location = remaining @ inverse.T
+    return root_location, root_rotation, hips_location, hips_rotation
+
+def quaternion_angles(a, b):
+    # Angle in radians between rows of two (n, 4) quaternion arrays
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    dots = np.abs(np.einsum('ij,ij->i', a, b)) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return 2.0 * np.arccos(np.clip(dots, 0.0, 1.0))
+
+def loop_errors(first, last, counts):
+    # Largest rotation difference between the first and last pose of each action, in degrees.
+    # first and last stack the (bones, 4) rotations of every action, counts gives the bones of each.
+    # An action without rotations is never a loop, its error is infinite.
+    angles = np.degrees(quaternion_angles(first, last))
+    starts = np.cumsum([0] + list(counts))[:-1]
+    errors = np.full(len(counts), np.inf)
+    filled = np.asarray(counts) > 0
+    errors[filled] = np.maximum.reduceat(angles, starts[filled]) if len(angles) else 0.0
+    return errors
+
+def close_loop(frames, values):
+    # Spreads the difference between the last and first sample linearly over the clip, so they match
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    span = frames[-1] - frames[0]
+    t = (frames - frames[0]) / span if span else np.zeros(len(frames))
+    return values - t[:, None] * (values[-1] - values[0])
+
+def close_quaternion_loop(frames, quaternions):
+    # Same for rotations: a growing correction around the axis of the first-to-last difference
+    frames = np.asarray(frames, dtype=np.float64)
+    q = transforms.make_compatible(quaternions)
+    matrices = transforms.quaternion_matrices(q)[:, :3, :3]
+    difference = matrices[0] @ matrices[-1].T
+    angle = np.arccos(np.clip((np.trace(difference) - 1.0) / 2.0, -1.0, 1.0))
+    if angle < 1e-9:
+        return q
+    axis = np.array([difference[2, 1] - difference[1, 2], difference[0, 2] - difference[2, 0], difference[1, 0] - difference[0, 1]])
+    if np.linalg.norm(axis) < 1e-9:
+        # Half a turn, the axis is the column of the largest diagonal term
+        axis = difference[:, np.argmax(np.diag(difference))] + np.eye(3)[np.argmax(np.diag(difference))]
+    axis /= np.linalg.norm(axis)
+    span = frames[-1] - frames[0]
+    t = (frames - frames[0]) / span if span else np.zeros(len(frames))
+    corrected = axis_rotations(t * angle, axis) @ matrices
+    return transforms.make_compatible(transforms.matrix_quaternions(corrected))
+
+def scale_channels(channels, factor=0.01):
+    # scaleAll on detached channels: every location curve is scaled around 0
+    for channel in channels:
+        if channel.data_path.endswith('.location'):
+            channel.keys.scale(factor)
+    return channels
+
+def root_motion_channels(channels, root_name, hip_bone_name, mode='IMPORT'):
+    # The root motion of a whole action given as channels, returns the new channel list
+    hips_path = location_path(hip_bone_name)
+    root_path = location_path(root_name)
+    hips = {channel.array_index: channel.keys for channel in channels if channel.data_path == hips_path}
+    hips_group = next((channel.group for channel in channels if channel.data_path == hips_path), hip_bone_name)
+    others = [channel for channel in channels if channel.data_path not in (hips_path, root_path)]
+    frames = [channel.keys.frames.min() for channel in channels if len(channel.keys)]
+    root, remaining = root_motion_keys(hips, mode, min(frames) if frames else 0.0)
+    result = others + [Channel(root_path, axis, root_name, keys) for axis, keys in root.items()]
+    result += [Channel(hips_path, axis, hips_group, keys) for axis, keys in remaining.items() if keys is not None]
+    return result
+
+def process_payload(source, destination, root_name="mixamorig:Root", hip_bone_name="mixamorig:Hips", mode='IMPORT', factor=0.01):
+    # Scale and root motion of one channel payload, the plain Python counterpart of add_root_bone
+    channels, meta = load_channels(source)
+    if factor != 1.0:
+        scale_channels(channels, factor)
+    save_channels(destination, root_motion_channels(channels, root_name, hip_bone_name, mode), **meta)
+    return destination
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="core.py", description="Add root motion to channel payloads (.npz) without Blender")
+    parser.add_argument("payloads", nargs="+")
+    parser.add_argument("--out", required=True, help="Directory for the processed payloads")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--root-name", default="mixamorig:Root", help="Full name of the root bone, prefix included")
+    parser.add_argument("--hip-name", default="mixamorig:Hips")
+    parser.add_argument("--mode", choices=('IMPORT', 'NLA'), default='IMPORT')
+    parser.add_argument("--scale", type=float, default=0.01, help="Factor for the location curves, 1 to leave them")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    tasks = [(path, os.path.join(args.out, os.path.basename(path)), args.root_name, args.hip_name, args.mode, args.scale) for path in args.payloads]
+    with multiprocessing.Pool(max(1, args.jobs)) as pool:
+        for destination in pool.starmap(process_payload, tasks):
+            print("[Mixamo Root] Wrote " + destination)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
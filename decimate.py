@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Error bounded key reduction for the baked actions, one key per frame on every channel.
+# Each channel is simplified with Ramer-Douglas-Peucker against linear interpolation, using
+# the vertical (value) distance. The 4 channels of a rotation_quaternion are simplified
+# together so they keep the same frames, with the angle between the original rotation and
+# the normalized interpolated one as the error, which is how Blender evaluates them.
+# The remaining keys are set to linear interpolation, so the reported error is exact.
+import math
+import logging
+
+import numpy as np
+
+try:
+    from .keyframes import Channel, KeyframeBuffer, read_action, write_action
+except ImportError:
+    from keyframes import Channel, KeyframeBuffer, read_action, write_action
+
+
+log = logging.getLogger(__name__)
+
+INTERPOLATION_LINEAR = 1
+
+
+def value_errors(frames, values, start, end):
+    # Largest component distance of the keys between start and end from the straight segment
+    t = (frames[start + 1:end] - frames[start]) / (frames[end] - frames[start])
+    line = values[start] + t[:, None] * (values[end] - values[start])
+    return np.abs(values[start + 1:end] - line).max(axis=1)
+
+def quaternion_errors(frames, values, start, end):
+    # Angle in radians between the keys and the normalized interpolation of the segment ends
+    t = (frames[start + 1:end] - frames[start]) / (frames[end] - frames[start])
+    line = values[start] + t[:, None] * (values[end] - values[start])
+    line /= np.maximum(np.linalg.norm(line, axis=1, keepdims=True), 1e-12)
+    original = values[start + 1:end] / np.maximum(np.linalg.norm(values[start + 1:end], axis=1, keepdims=True), 1e-12)
+    dots = np.clip(np.abs(np.einsum('ij,ij->i', line, original)), 0.0, 1.0)
+    return 2.0 * np.arccos(dots)
+
+def simplify(frames, values, tolerance, errors=value_errors):
+    # Mask of the keys to keep so no removed key is further than tolerance from the result,
+    # and the largest error of a removed key
+    count = len(frames)
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, count - 1]] = True
+    max_error = 0.0
+    stack = [(0, count - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = errors(frames, values, start, end)
+        worst = int(np.argmax(segment))
+        if segment[worst] > tolerance:
+            split = start + 1 + worst
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+        else:
+            max_error = max(max_error, float(segment[worst]))
+    return keep, max_error
+
+def reduced_keys(keys, keep):
+    co = keys.co[keep]
+    return KeyframeBuffer(co, interpolation=np.full(len(co), INTERPOLATION_LINEAR))
+
+def decimate_channels(channels, location_tolerance=0.001, rotation_tolerance=0.1):
+    # Returns the reduced channels and the largest errors per kind, rotations in degrees
+    rotation_radians = math.radians(rotation_tolerance)
+    errors = {'location': 0.0, 'rotation': 0.0, 'scale': 0.0}
+    quaternions = {}
+    reduced = []
+    for channel in channels:
+        prop = channel.data_path.rpartition('.')[2]
+        if prop == 'rotation_quaternion':
+            quaternions.setdefault(channel.data_path, []).append(channel)
+            continue
+        if len(channel.keys) < 3:
+            reduced.append(channel)
+            continue
+        if prop == 'rotation_euler':
+            kind, tolerance = 'rotation', rotation_radians
+        elif prop == 'scale':
+            kind, tolerance = 'scale', location_tolerance
+        else:
+            kind, tolerance = 'location', location_tolerance
+        keep, error = simplify(channel.keys.frames, channel.keys.values[:, None], tolerance)
+        errors[kind] = max(errors[kind], math.degrees(error) if kind == 'rotation' else error)
+        reduced.append(Channel(channel.data_path, channel.array_index, channel.group, reduced_keys(channel.keys, keep)))
+
+    for data_path, group in quaternions.items():
+        group.sort(key=lambda channel: channel.array_index)
+        frames = group[0].keys.frames
+        if len(group) != 4 or len(frames) < 3 or any(not np.array_equal(channel.keys.frames, frames) for channel in group):
+            # Not a complete baked quaternion, fall back to the components on their own
+            for channel in group:
+                if len(channel.keys) < 3:
+                    reduced.append(channel)
+                    continue
+                keep, error = simplify(channel.keys.frames, channel.keys.values[:, None], rotation_radians / 2.0)
+                # A component error e turns the rotation by about 2e
+                errors['rotation'] = max(errors['rotation'], math.degrees(2.0 * error))
+                reduced.append(Channel(channel.data_path, channel.array_index, channel.group, reduced_keys(channel.keys, keep)))
+            continue
+        values = np.column_stack([channel.keys.values for channel in group])
+        keep, error = simplify(frames, values, rotation_radians, quaternion_errors)
+        errors['rotation'] = max(errors['rotation'], math.degrees(error))
+        for channel in group:
+            reduced.append(Channel(channel.data_path, channel.array_index, channel.group, reduced_keys(channel.keys, keep)))
+    return reduced, errors
+
+def decimate_action(action, location_tolerance=0.001, rotation_tolerance=0.1):
+    # Reduces the keys of an action in place and returns a report of what was removed
+    channels = read_action(action)
+    before = sum(len(channel.keys) for channel in channels)
+    reduced, errors = decimate_channels(channels, location_tolerance, rotation_tolerance)
+    write_action(action, reduced)
+    after = sum(len(channel.keys) for channel in reduced)
+    report = {"action": action.name, "before": before, "after": after,
+              "location_error": errors['location'], "rotation_error": errors['rotation'], "scale_error": errors['scale']}
+    print("[Mixamo Root] Decimated %s: %d -> %d keys, max error %.5f location, %.4f degrees rotation, %.5f scale" % (
+        action.name, before, after, errors['location'], errors['rotation'], errors['scale']))
+    return report
+
+def decimate_actions(actions, location_tolerance=0.001, rotation_tolerance=0.1):
+    reports = []
+    seen = set()
+    for action in actions:
+        if action and action.name not in seen:
+            seen.add(action.name)
+            reports.append(decimate_action(action, location_tolerance, rotation_tolerance))
+    if reports:
+        before = sum(report["before"] for report in reports)
+        after = sum(report["after"] for report in reports)
+        print("[Mixamo Root] Decimated %d actions: %d -> %d keys" % (len(reports), before, after))
+    return reports
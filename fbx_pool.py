@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Parallel FBX import: background Blender processes each import a share of the files
+# with the regular importer and root bone pipeline, then save the resulting action as a
+# keyframe payload (.npz). The main session only builds the actions from the payloads.
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import bpy
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from .keyframes import read_action, write_action, save_channels, load_channels
+except ImportError:
+    from keyframes import read_action, write_action, save_channels, load_channels
+
+
+log = logging.getLogger(__name__)
+
+
+def split_files(files, workers):
+    return [files[i::workers] for i in range(workers) if files[i::workers]]
+
+def worker_command(task_file, options):
+    return [bpy.app.binary_path, '--background', '--factory-startup', '--python', os.path.abspath(__file__),
+            '--', '--tasks', task_file, '--options', json.dumps(options)]
+
+def parse_files(files, workers=2, options=None, work_dir=None):
+    # Returns {filepath: payload path} for every file a worker managed to process
+    options = dict(options or {})
+    work_dir = work_dir or tempfile.mkdtemp(prefix="mixamoroot_")
+    payloads = {filepath: os.path.join(work_dir, "%05d.npz" % i) for i, filepath in enumerate(files)}
+
+    processes = []
+    for i, chunk in enumerate(split_files(list(files), max(1, workers))):
+        task_file = os.path.join(work_dir, "tasks%d.json" % i)
+        with open(task_file, 'w') as f:
+            json.dump([{"filepath": filepath, "payload": payloads[filepath]} for filepath in chunk], f)
+        worker_log = open(os.path.join(work_dir, "worker%d.log" % i), 'w')
+        processes.append((subprocess.Popen(worker_command(task_file, options), stdout=worker_log, stderr=subprocess.STDOUT), worker_log))
+
+    for process, worker_log in processes:
+        process.wait()
+        worker_log.close()
+        if process.returncode != 0:
+            log.error("[Mixamo Root] Import worker exited with code %d, see %s" % (process.returncode, worker_log.name))
+    return {filepath: payload for filepath, payload in payloads.items() if os.path.exists(payload)}
+
+def build_action(payload):
+    try:
+        from .mixamoroot import SOURCE_FPS_PROPERTY
+    except ImportError:
+        from mixamoroot import SOURCE_FPS_PROPERTY
+    channels, meta = load_channels(payload)
+    action = write_action(bpy.data.actions.new(meta["name"]), channels)
+    if meta.get("fps"):
+        action[SOURCE_FPS_PROPERTY] = meta["fps"]
+    return action
+
+def import_actions(files, workers=2, options=None):
+    # Parses files in parallel and builds their actions in order. Returns ({filepath: action}, {failed filepath: error}),
+    # a file failing in a worker or while its action is built does not stop the others
+    start = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix="mixamoroot_")
+    actions = {}
+    failed = {}
+    try:
+        payloads = parse_files(files, workers, options, work_dir)
+        parsed = time.perf_counter()
+        for filepath in files:
+            if filepath not in payloads:
+                failed[filepath] = "import worker failed"
+                continue
+            try:
+                actions[filepath] = build_action(payloads[filepath])
+            except Exception as e:
+                log.error("[Mixamo Root] ERROR could not build the action of %s: %s" % (filepath, str(e)))
+                failed[filepath] = str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("[Mixamo Root] %d files parsed by %d workers in %.2fs, actions built in %.2fs" % (len(payloads), workers, parsed - start, time.perf_counter() - parsed))
+    return actions, failed
+
+def import_payload(filepath, payload, options, templates=None):
+    try:
+        from . import mixamoroot
+    except ImportError:
+        import mixamoroot
+    old_objs = set(bpy.context.scene.objects)
+    # Workers have no UI, so the root motion always uses the direct engine
+    mixamoroot.import_armature(filepath, engine='DIRECT', templates=templates, **options)
+    imported_objects = set(bpy.context.scene.objects) - old_objs
+    actions = [obj.animation_data.action for obj in imported_objects if obj.type == 'ARMATURE' and obj.animation_data and obj.animation_data.action]
+    if actions:
+        save_channels(payload, read_action(actions[0]), name=Path(filepath).resolve().stem, fps=actions[0].get(mixamoroot.SOURCE_FPS_PROPERTY))
+
+    # Keep each worker's session small between files
+    bpy.data.batch_remove(imported_objects)
+    bpy.data.batch_remove(actions)
+
+def run_worker(task_file, options):
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    with open(task_file) as f:
+        tasks = json.load(f)
+    # Every armature of a worker is deleted, so clips with one skeleton share its prepared data
+    templates = {}
+    for task in tasks:
+        try:
+            import_payload(task["filepath"], task["payload"], options, templates)
+        except Exception as e:
+            log.error("[Mixamo Root] ERROR import worker raised %s when processing %s" % (str(e), task["filepath"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="fbx_pool.py")
+    parser.add_argument("--tasks", required=True)
+    parser.add_argument("--options", default="{}")
+    args = parser.parse_args(sys.argv[sys.argv.index("--") + 1:])
+    run_worker(args.tasks, json.loads(args.options))
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Animation only reader for binary FBX files. Geometry, materials and textures are skipped
+# by their record offsets; only the skeleton, bind pose and animation curves are decoded.
+# The bone channels it produces match what Blender's FBX importer writes for the same file,
+# (pose space location, rotation_quaternion and scale, one linear key per FBX key time).
+# Works on the file bytes alone, bpy is not needed.
+import zlib
+import struct
+
+import numpy as np
+
+try:
+    from .keyframes import Channel, KeyframeBuffer
+    from . import transforms
+except ImportError:
+    from keyframes import Channel, KeyframeBuffer
+    import transforms
+
+
+FBX_MAGIC = b"Kaydara FBX Binary  \x00\x1a\x00"
+FBX_KTIME = 46186158000
+# GlobalSettings TimeMode to frames per second, 14 is a custom rate
+FBX_FRAME_RATES = (None, 120.0, 100.0, 60.0, 50.0, 48.0, 30.0, 30.0, 29.97, 29.97, 25.0, 24.0, 1000.0, 23.976, None, 96.0, 72.0, 59.94, 119.88)
+FBX_ROTATION_ORDERS = ("XYZ", "XZY", "YZX", "YXZ", "ZXY", "ZYX", "XYZ")
+ARRAY_TYPES = {b'f': np.dtype('<f4'), b'd': np.dtype('<f8'), b'l': np.dtype('<i8'), b'i': np.dtype('<i4'), b'b': np.dtype('?')}
+SCALAR_TYPES = {b'Y': '<h', b'C': '<?', b'I': '<i', b'F': '<f', b'D': '<d', b'L': '<q'}
+# Only these records are decoded, anything else is jumped over
+KEEP_NODES = {
+    None: {"GlobalSettings", "Objects", "Connections"},
+    "Objects": {"Model", "Pose", "AnimationStack", "AnimationLayer", "AnimationCurveNode", "AnimationCurve"},
+}
+CHANNEL_PROPERTIES = {"Lcl Translation": "T", "Lcl Rotation": "R", "Lcl Scaling": "S"}
+INTERPOLATION_LINEAR = 1
+
+
+class FBXError(Exception):
+    pass
+
+
+class FBXNode:
+    __slots__ = ('name', 'props', 'children')
+
+    def __init__(self, name, props, children):
+        self.name = name
+        self.props = props
+        self.children = children
+
+    def find(self, name):
+        return next((child for child in self.children if child.name == name), None)
+
+    def find_all(self, name):
+        return [child for child in self.children if child.name == name]
+
+    def properties70(self):
+        # {property name: values} of the Properties70 block
+        block = self.find("Properties70")
+        return {p.props[0]: p.props[4:] for p in block.children} if block else {}
+
+
+def read_property(data, offset):
+    code = data[offset:offset + 1]
+    offset += 1
+    if code in SCALAR_TYPES:
+        fmt = SCALAR_TYPES[code]
+        return struct.unpack_from(fmt, data, offset)[0], offset + struct.calcsize(fmt)
+    if code in (b'S', b'R'):
+        length = struct.unpack_from('<I', data, offset)[0]
+        value = data[offset + 4:offset + 4 + length]
+        return (value.decode('utf-8', 'replace') if code == b'S' else value), offset + 4 + length
+    if code in ARRAY_TYPES:
+        count, encoding, length = struct.unpack_from('<III', data, offset)
+        raw = data[offset + 12:offset + 12 + length]
+        if encoding == 1:
+            raw = zlib.decompress(raw)
+        return np.frombuffer(raw, dtype=ARRAY_TYPES[code], count=count), offset + 12 + length
+    raise FBXError("Unknown FBX property type %r at offset %d" % (code, offset - 1))
+
+def read_node(data, offset, wide, parent_name=None):
+    # Returns (node, next offset). node is None for the null record ending a list, False for skipped records
+    header = '<QQQB' if wide else '<IIIB'
+    end_offset, prop_count, prop_length, name_length = struct.unpack_from(header, data, offset)
+    offset += struct.calcsize(header)
+    if end_offset == 0:
+        return None, offset
+    name = data[offset:offset + name_length].decode('ascii', 'replace')
+    offset += name_length
+    if parent_name in KEEP_NODES and name not in KEEP_NODES[parent_name]:
+        return False, end_offset
+
+    props = []
+    for _ in range(prop_count):
+        value, offset = read_property(data, offset)
+        props.append(value)
+    children = []
+    while offset < end_offset:
+        child, offset = read_node(data, offset, wide, name)
+        if child is None:
+            break
+        if child is not False:
+            children.append(child)
+    return FBXNode(name, props, children), end_offset
+
+def parse(data):
+    # Top level records of a binary FBX file, restricted to the ones animation needs
+    if not data.startswith(FBX_MAGIC):
+        raise FBXError("Not a binary FBX file")
+    version = struct.unpack_from('<I', data, len(FBX_MAGIC))[0]
+    wide = version >= 7500
+    offset = len(FBX_MAGIC) + 4
+    nodes = []
+    while offset < len(data):
+        node, offset = read_node(data, offset, wide)
+        if node is None:
+            break
+        if node is not False:
+            nodes.append(node)
+    return FBXNode("", [version], nodes)
+
+
+def object_name(value):
+    # Binary FBX names are stored as "Name\x00\x01Class"
+    return value.split('\x00\x01')[0]
+
+def vector_property(props70, name, default):
+    values = props70.get(name)
+    return np.array(values[:3], dtype=np.float64) if values else np.array(default, dtype=np.float64)
+
+def local_matrices(props70, translation, rotation, scaling):
+    # FBX node transform: T * Roff * Rp * Rpre * R * Rpost^-1 * Rp^-1 * Soff * Sp * S * Sp^-1
+    order = FBX_ROTATION_ORDERS[int(props70.get("RotationOrder", [0])[0])]
+    count = len(translation)
+    def constant(matrix):
+        return np.broadcast_to(matrix, (count, 4, 4))
+    rotation_pivot = vector_property(props70, "RotationPivot", (0, 0, 0))
+    scaling_pivot = vector_property(props70, "ScalingPivot", (0, 0, 0))
+    matrices = transforms.translation_matrices(translation)
+    for matrix in (
+            constant(transforms.translation_matrices(vector_property(props70, "RotationOffset", (0, 0, 0)))),
+            constant(transforms.translation_matrices(rotation_pivot)),
+            constant(transforms.euler_matrices(vector_property(props70, "PreRotation", (0, 0, 0)))),
+            transforms.euler_matrices(rotation, order),
+            constant(np.linalg.inv(transforms.euler_matrices(vector_property(props70, "PostRotation", (0, 0, 0))))),
+            constant(transforms.translation_matrices(-rotation_pivot)),
+            constant(transforms.translation_matrices(vector_property(props70, "ScalingOffset", (0, 0, 0)))),
+            constant(transforms.translation_matrices(scaling_pivot)),
+            transforms.scale_matrices(scaling),
+            constant(transforms.translation_matrices(-scaling_pivot))):
+        matrices = matrices @ matrix
+    return matrices
+
+
+class BoneAnimation:
+    '''Pose space samples of one bone, in the units of the FBX file'''
+
+    def __init__(self, name, frames, location, rotation_quaternion, scale):
+        self.name = name
+        self.frames = frames
+        self.location = location
+        self.rotation_quaternion = rotation_quaternion
+        self.scale = scale
+
+    def channels(self):
+        channels = []
+        for prop in ('location', 'rotation_quaternion', 'scale'):
+            samples = getattr(self, prop)
+            data_path = 'pose.bones["{}"].{}'.format(self.name, prop)
+            for index in range(samples.shape[1]):
+                keys = KeyframeBuffer(np.column_stack((self.frames, samples[:, index])), interpolation=np.full(len(self.frames), INTERPOLATION_LINEAR))
+                channels.append(Channel(data_path, index, self.name, keys))
+        return channels
+
+
+class FBXAnimation:
+    '''Skeleton and first animation stack of a binary FBX file'''
+
+    def __init__(self, data):
+        root = parse(data)
+        self.version = root.props[0]
+        settings = root.find("GlobalSettings")
+        settings = settings.properties70() if settings else {}
+        time_mode = int(settings.get("TimeMode", [0])[0])
+        rate = FBX_FRAME_RATES[time_mode] if time_mode < len(FBX_FRAME_RATES) else None
+        self.fps = rate or float(settings.get("CustomFrameRate", [30.0])[0]) or 30.0
+
+        objects = root.find("Objects") or FBXNode("Objects", [], [])
+        self.models = {}
+        self.bind_matrices = {}
+        self.curve_nodes = {}
+        self.curves = {}
+        self.stacks = []
+        self.layers = set()
+        for node in objects.children:
+            if node.name == "Model":
+                self.models[node.props[0]] = (object_name(node.props[1]), node.props[2], node.properties70())
+            elif node.name == "Pose" and len(node.props) > 2 and node.props[2] == "BindPose":
+                for pose_node in node.find_all("PoseNode"):
+                    # FBX matrices are stored column by column
+                    self.bind_matrices[pose_node.find("Node").props[0]] = np.array(pose_node.find("Matrix").props[0], dtype=np.float64).reshape(4, 4).T
+            elif node.name == "AnimationStack":
+                self.stacks.append(node.props[0])
+            elif node.name == "AnimationLayer":
+                self.layers.add(node.props[0])
+            elif node.name == "AnimationCurveNode":
+                self.curve_nodes[node.props[0]] = node.properties70()
+            elif node.name == "AnimationCurve":
+                times = node.find("KeyTime")
+                values = node.find("KeyValueFloat")
+                self.curves[node.props[0]] = (
+                    times.props[0].astype(np.int64) if times else np.zeros(0, dtype=np.int64),
+                    values.props[0].astype(np.float64) if values else np.zeros(0))
+
+        self.parents = {}
+        self.model_nodes = {}
+        node_curves = {}
+        node_layers = {}
+        layer_stacks = {}
+        connections = root.find("Connections")
+        for c in connections.find_all("C") if connections else []:
+            kind, child, parent = c.props[:3]
+            if child in self.models and (parent in self.models or parent == 0):
+                self.parents[child] = parent
+            elif child in self.curves and parent in self.curve_nodes and kind == "OP":
+                node_curves.setdefault(parent, {})[c.props[3]] = child
+            elif child in self.curve_nodes and parent in self.models and kind == "OP" and c.props[3] in CHANNEL_PROPERTIES:
+                self.model_nodes.setdefault(parent, {})[CHANNEL_PROPERTIES[c.props[3]]] = child
+            elif child in self.curve_nodes and parent in self.layers:
+                node_layers[child] = parent
+            elif child in self.layers and parent in self.stacks:
+                layer_stacks[child] = parent
+        self.node_curves = node_curves
+
+        # Only the first take is read, like a Mixamo download holds
+        if self.stacks:
+            stack = self.stacks[0]
+            for model, nodes in self.model_nodes.items():
+                for channel, node in list(nodes.items()):
+                    if node in node_layers and layer_stacks.get(node_layers[node]) != stack:
+                        del nodes[channel]
+
+        self.rest_globals = {}
+
+    def bones(self):
+        return [model for model, (name, kind, props70) in self.models.items() if kind == "LimbNode"]
+
+    def default_local(self, model):
+        name, kind, props70 = self.models[model]
+        return local_matrices(props70,
+            vector_property(props70, "Lcl Translation", (0, 0, 0)),
+            vector_property(props70, "Lcl Rotation", (0, 0, 0)),
+            vector_property(props70, "Lcl Scaling", (1, 1, 1)))[0]
+
+    def rest_global(self, model):
+        # Bind pose where there is one, otherwise the default transforms down the hierarchy
+        if model == 0 or model not in self.models:
+            return np.eye(4)
+        if model not in self.rest_globals:
+            if model in self.bind_matrices:
+                self.rest_globals[model] = self.bind_matrices[model]
+            else:
+                self.rest_globals[model] = self.rest_global(self.parents.get(model, 0)) @ self.default_local(model)
+        return self.rest_globals[model]
+
+    def curve_samples(self, model, channel, times, default):
+        samples = np.tile(default, (len(times), 1))
+        node = self.model_nodes.get(model, {}).get(channel)
+        if node is None:
+            return samples
+        node_props = self.curve_nodes[node]
+        for axis, key in enumerate(("d|X", "d|Y", "d|Z")):
+            if key in node_props:
+                samples[:, axis] = node_props[key][0]
+            curve = self.node_curves.get(node, {}).get(key)
+            if curve is not None and len(self.curves[curve][0]):
+                curve_times, curve_values = self.curves[curve]
+                samples[:, axis] = np.interp(times, curve_times, curve_values)
+        return samples
+
+    def key_times(self, model):
+        nodes = self.model_nodes.get(model, {}).values()
+        times = [self.curves[curve][0] for node in nodes for curve in self.node_curves.get(node, {}).values()]
+        return np.unique(np.concatenate(times)) if times else np.zeros(0, dtype=np.int64)
+
+    def bone_animation(self, model, anim_offset=1.0):
+        times = self.key_times(model)
+        if not len(times):
+            return None
+        name, kind, props70 = self.models[model]
+        anim_local = local_matrices(props70,
+            self.curve_samples(model, "T", times, vector_property(props70, "Lcl Translation", (0, 0, 0))),
+            self.curve_samples(model, "R", times, vector_property(props70, "Lcl Rotation", (0, 0, 0))),
+            self.curve_samples(model, "S", times, vector_property(props70, "Lcl Scaling", (1, 1, 1))))
+        rest_local = np.linalg.inv(self.rest_global(self.parents.get(model, 0))) @ self.rest_global(model)
+        location, rotation, scale = transforms.decompose(np.linalg.inv(rest_local) @ anim_local)
+        frames = times.astype(np.float64) * (self.fps / FBX_KTIME) + anim_offset
+        return BoneAnimation(name, frames, location, transforms.make_compatible(rotation), scale)
+
+    def bone_animations(self, anim_offset=1.0):
+        animations = (self.bone_animation(model, anim_offset) for model in self.bones())
+        return [animation for animation in animations if animation is not None]
+
+
+def read_channels(data, anim_offset=1.0):
+    # Action channels for every animated bone of the FBX file bytes
+    return read_animation(data, anim_offset)[0]
+
+def read_animation(data, anim_offset=1.0):
+    # The channels and the frame rate their keys are placed at
+    fbx = FBXAnimation(data)
+    return [channel for animation in fbx.bone_animations(anim_offset) for channel in animation.channels()], fbx.fps
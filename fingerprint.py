@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Duplicate detection for imported clips. A clip is fingerprinted from its rotation curves only,
+# so the "in place" and root motion downloads of one animation look the same. The rotations are
+# quantized and every frame is reduced to one 64 bit hash; the clip gets a hash of all its frames
+# (exact duplicates) and a hash of every window of WINDOW frames (trimmed copies). Lookups in the
+# index are dictionary hits, so checking a clip does not depend on how many clips are indexed.
+# Nothing here needs bpy.
+import hashlib
+
+import numpy as np
+
+
+WINDOW = 16
+QUANTUM = 1e-3
+# Multiplier of the window hash, the arithmetic wraps around at 64 bits
+WINDOW_BASE = np.uint64(0x100000001b3)
+
+
+def clip_channels(channels, root_name=None):
+    # The rotation channels of every bone but the root, in a stable order
+    selected = []
+    for channel in channels:
+        prop = channel.data_path.rpartition('.')[2]
+        if prop not in ('rotation_quaternion', 'rotation_euler'):
+            continue
+        if root_name and channel.data_path.startswith('pose.bones["{}"]'.format(root_name)):
+            continue
+        selected.append(channel)
+    return sorted(selected, key=lambda channel: (channel.data_path, channel.array_index))
+
+
+def frame_hashes(channels):
+    # One uint64 per frame of the quantized channel values, sampled on the keys of the first channel
+    if not channels:
+        return np.zeros(0, dtype=np.uint64)
+    frames = channels[0].keys.frames
+    values = np.column_stack([channel.keys.values if np.array_equal(channel.keys.frames, frames) else np.interp(frames, channel.keys.frames, channel.keys.values)
+                              for channel in channels])
+    quantized = np.round(values / QUANTUM).astype(np.int64).view(np.uint64)
+    # Weights depend on the channel names, so the same values on other bones hash differently
+    weights = np.array([int.from_bytes(hashlib.blake2b(("%s[%d]" % (channel.data_path, channel.array_index)).encode(), digest_size=8).digest(), 'little') | 1
+                        for channel in channels], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        return (quantized * weights).sum(axis=1, dtype=np.uint64)
+
+
+def window_hashes(rows, window=WINDOW):
+    # Polynomial hash of every run of window consecutive frame hashes
+    count = len(rows) - window + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for k in range(window):
+            hashes = hashes * WINDOW_BASE + rows[k:k + count]
+    return hashes
+
+
+class Fingerprint:
+    '''Frame hashes of a clip plus its full hash'''
+
+    def __init__(self, rows, frames=None):
+        self.rows = rows
+        self.frames = np.arange(len(rows), dtype=np.float64) if frames is None else frames
+        self.full = hashlib.sha1(rows.tobytes() + len(rows).to_bytes(8, 'little')).hexdigest()
+
+    @classmethod
+    def from_channels(cls, channels, root_name=None):
+        channels = clip_channels(channels, root_name)
+        return cls(frame_hashes(channels), channels[0].keys.frames if channels else None)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class FingerprintIndex:
+    '''Fingerprints of the clips seen so far, by full hash and by window hash (every offset of it)'''
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.full = {}
+        self.windows = {}
+        self.clips = {}
+
+    def find(self, fingerprint):
+        # (name, offset) of an indexed clip this one is equal to or a trimmed part of, else None
+        if not len(fingerprint):
+            return None
+        if fingerprint.full in self.full:
+            return self.full[fingerprint.full], 0
+        if len(fingerprint) < self.window:
+            return None
+        first = int(window_hashes(fingerprint.rows[:self.window], self.window)[0])
+        # A held pose repeats its window, so every place the window was seen is a candidate
+        for name, offset in self.windows.get(first, ()):
+            rows = self.clips[name].rows
+            # Check the whole overlap, window hashes can collide
+            if offset + len(fingerprint) <= len(rows) and np.array_equal(rows[offset:offset + len(fingerprint)], fingerprint.rows):
+                return name, offset
+        return None
+
+    def add(self, name, fingerprint):
+        if not len(fingerprint):
+            return
+        self.clips[name] = fingerprint
+        self.full.setdefault(fingerprint.full, name)
+        for offset, value in enumerate(window_hashes(fingerprint.rows, self.window).tolist()):
+            self.windows.setdefault(value, []).append((name, offset))
+
+    def remove(self, name):
+        fingerprint = self.clips.pop(name, None)
+        if fingerprint is None:
+            return
+        if self.full.get(fingerprint.full) == name:
+            del self.full[fingerprint.full]
+        for value in set(window_hashes(fingerprint.rows, self.window).tolist()):
+            candidates = [candidate for candidate in self.windows.get(value, ()) if candidate[0] != name]
+            if candidates:
+                self.windows[value] = candidates
+            else:
+                self.windows.pop(value, None)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Forward kinematics of a whole action at once, without scene.frame_set. The F-curves are
+# sampled into (frames, 4, 4) basis matrices per bone and chained down the hierarchy:
+#   pose = pose(parent) @ inv(parent rest) @ rest @ basis
+# which is what Blender evaluates for bones without constraints. Used for the CONTACT root
+# mode (lowest foot or toe point per frame) and by the built-in retargeting.
+import numpy as np
+
+try:
+    from . import transforms
+    from .keyframes import KeyframeBuffer
+except ImportError:
+    import transforms
+    from keyframes import KeyframeBuffer
+
+
+# Bones whose head and tail can touch the ground, matched case insensitively in the bone name
+CONTACT_KEYWORDS = ('foot', 'toe')
+EULER_ORDERS = ('XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX')
+
+
+def hierarchy_order(bones):
+    # Parents before children
+    return sorted(bones, key=lambda bone: len(bone.parent_recursive))
+
+def rest_matrices(armature):
+    # {bone: parent relative rest matrix} in hierarchy order, and {bone: world rest matrix}
+    world = np.array(armature.matrix_world, dtype=np.float64)
+    relative = {}
+    absolute = {}
+    for bone in hierarchy_order(armature.data.bones):
+        local = np.array(bone.matrix_local, dtype=np.float64)
+        relative[bone.name] = np.linalg.inv(np.array(bone.parent.matrix_local, dtype=np.float64)) @ local if bone.parent else local
+        absolute[bone.name] = world @ local
+    return relative, absolute
+
+def sample_basis(action, modes, frames=None):
+    # Frames and {bone: (frames, 4, 4) pose basis} of the bones in modes ({bone: rotation mode}) the action
+    # animates. Sampled linearly between keys, on every key frame unless frames is given.
+    curves = {}
+    for fc in action.fcurves:
+        name = fc.data_path.partition('["')[2].partition('"]')[0]
+        if name in modes and len(fc.keyframe_points):
+            curves[(name, fc.data_path.rpartition('.')[2], fc.array_index)] = KeyframeBuffer.read(fc)
+    if frames is None:
+        if not curves:
+            return np.zeros(0), {}
+        frames = np.unique(np.concatenate([keys.frames for keys in curves.values()]))
+    frames = np.asarray(frames, dtype=np.float64)
+
+    def values(name, prop, size, default):
+        columns = []
+        for index in range(size):
+            keys = curves.get((name, prop, index))
+            columns.append(np.interp(frames, keys.frames, keys.values) if keys is not None else np.full(len(frames), default[index]))
+        return np.column_stack(columns)
+
+    basis = {}
+    for name in {key[0] for key in curves}:
+        mode = modes.get(name, 'QUATERNION')
+        if mode == 'QUATERNION':
+            rotation = transforms.quaternion_matrices(values(name, 'rotation_quaternion', 4, (1.0, 0.0, 0.0, 0.0)))
+        elif mode in EULER_ORDERS:
+            rotation = transforms.euler_matrices(np.degrees(values(name, 'rotation_euler', 3, (0.0, 0.0, 0.0))), mode)
+        else:
+            rotation = np.tile(np.eye(4), (len(frames), 1, 1))
+        location = transforms.translation_matrices(values(name, 'location', 3, (0.0, 0.0, 0.0)))
+        scale = transforms.scale_matrices(values(name, 'scale', 3, (1.0, 1.0, 1.0)))
+        basis[name] = location @ rotation @ scale
+    return frames, basis
+
+def evaluate(rest, parents, basis, count, world=np.eye(4)):
+    # {bone: (count, 4, 4) pose matrix} of every bone in rest (hierarchy order, parent relative),
+    # bones missing from basis stay in their rest pose relative to their parent
+    identity = np.tile(np.eye(4), (count, 1, 1))
+    pose = {}
+    for name, matrix in rest.items():
+        parent = parents[name]
+        parent_pose = pose[parent] if parent else world
+        pose[name] = parent_pose @ matrix @ basis.get(name, identity)
+    return pose
+
+def armature_pose(armature, action, frames=None, exclude=(), world=False):
+    # Frames and {bone: (frames, 4, 4)} pose of every bone of the armature playing action, in armature
+    # space or with world also in world space. Bones in exclude are evaluated in their rest pose.
+    rest, _absolute = rest_matrices(armature)
+    parents = {bone.name: bone.parent.name if bone.parent else None for bone in armature.data.bones}
+    modes = {pb.name: pb.rotation_mode for pb in armature.pose.bones if pb.name not in exclude}
+    frames, basis = sample_basis(action, modes, frames)
+    if not len(frames):
+        frames = np.array([action.frame_range[0]])
+    matrix = np.array(armature.matrix_world, dtype=np.float64) if world else np.eye(4)
+    return frames, evaluate(rest, parents, basis, len(frames), matrix)
+
+def contact_bones(armature, keywords=CONTACT_KEYWORDS):
+    return [bone.name for bone in armature.data.bones if any(keyword in bone.name.lower() for keyword in keywords)]
+
+def bone_points(pose, lengths, names):
+    # (frames, 2 * len(names), 3) heads and tails of the named bones
+    points = []
+    for name in names:
+        matrix = pose[name]
+        points.append(matrix[:, :3, 3])
+        points.append(matrix[:, :3, 3] + matrix[:, :3, 1] * lengths[name])
+    return np.stack(points, axis=1)
+
+def contact_heights(armature, action, frames=None, exclude=(), up=(0.0, 0.0, 1.0)):
+    # Frames and the height along up (armature space) of the lowest foot or toe point in every frame,
+    # None when the armature has no such bones
+    names = contact_bones(armature)
+    if not names:
+        return frames, None
+    frames, pose = armature_pose(armature, action, frames, exclude)
+    lengths = {bone.name: bone.length for bone in armature.data.bones}
+    points = bone_points(pose, lengths, names)
+    return frames, (points @ np.asarray(up, dtype=np.float64)).min(axis=1)
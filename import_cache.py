@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Import cache keyed by FBX content hash plus the processing options. A hit either finds the
+# action from an earlier run still in the .blend, or restores its baked curves from disk,
+# so the file is not imported again. Payloads keep the custom properties of the action and are
+# evicted least recently used first.
+import os
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+
+import bpy
+
+try:
+    from .keyframes import read_action, write_action, save_channels, load_channels
+except ImportError:
+    from keyframes import read_action, write_action, save_channels, load_channels
+
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = ".mixamoroot_cache"
+CACHE_KEY_PROPERTY = "mixamo_cache_key"
+
+
+def id_properties(action):
+    # The custom properties of the action as JSON values, so a restored action carries the same tags
+    properties = {}
+    for name in action.keys():
+        if name == CACHE_KEY_PROPERTY:
+            continue
+        value = action[name]
+        if hasattr(value, "to_dict"):
+            value = value.to_dict()
+        elif hasattr(value, "to_list"):
+            value = value.to_list()
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            log.warning("[Mixamo Root] Custom property %s of %s is not cached" % (name, action.name))
+            continue
+        properties[name] = value
+    return properties
+
+def file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImportCache:
+    '''Content hash cache of processed animation files, stored in cache_dir'''
+
+    def __init__(self, cache_dir, options, max_size=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.options = json.dumps(options, sort_keys=True)
+        self.max_size = max_size
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.keys = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def key(self, filepath):
+        if filepath not in self.keys:
+            self.keys[filepath] = hashlib.sha256((file_hash(filepath) + self.options).encode()).hexdigest()
+        return self.keys[filepath]
+
+    def payload_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def restore(self, filepath):
+        # Returns the cached action for the file, or None when it has to be imported
+        key = self.key(filepath)
+        entry = self.index.get(key)
+        action = None
+        if entry:
+            action = bpy.data.actions.get(entry["action"])
+            if action is None or action.get(CACHE_KEY_PROPERTY) != key:
+                action = None
+                if os.path.exists(self.payload_path(key)):
+                    channels, meta = load_channels(self.payload_path(key))
+                    action = write_action(bpy.data.actions.new(meta["name"]), channels)
+                    for name, value in meta.get("properties", {}).items():
+                        action[name] = value
+                    action[CACHE_KEY_PROPERTY] = key
+                    entry["action"] = action.name
+        if action is None:
+            self.misses += 1
+            return None
+        entry["used"] = time.time()
+        self.hits += 1
+        return action
+
+    def store(self, filepath, action):
+        key = self.key(filepath)
+        action[CACHE_KEY_PROPERTY] = key
+        payload = self.payload_path(key)
+        save_channels(payload, read_action(action), name=Path(filepath).resolve().stem, properties=id_properties(action))
+        self.index[key] = {"file": os.path.basename(filepath), "action": action.name, "size": os.path.getsize(payload), "used": time.time()}
+
+    def evict(self):
+        entries = sorted(self.index.items(), key=lambda item: item[1]["used"], reverse=True)
+        total = 0
+        for key, entry in entries:
+            total += entry["size"]
+            if total > self.max_size:
+                del self.index[key]
+                try:
+                    os.remove(self.payload_path(key))
+                except OSError:
+                    pass
+
+    def save(self):
+        self.evict()
+        with open(self.index_path, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        print("[Mixamo Root] Import cache: %d hits, %d misses" % (self.hits, self.misses))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Batch journal for get_all_anims: the status, output actions, timing and last error of every
+# file, written to disk whenever a file starts or ends. A file is marked running before it is
+# imported, so one still running when a journal is loaded took the last run down with it.
+# Files failing quarantine_after times are quarantined and skipped until they change on disk.
+# Nothing here needs bpy.
+import os
+import json
+import time
+import logging
+
+
+log = logging.getLogger(__name__)
+
+JOURNAL_NAME = "mixamoroot_journal.json"
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+QUARANTINED = 'quarantined'
+
+
+def signature(filepath):
+    # Size and modification time, a file that changed is imported again whatever its status
+    stat = os.stat(filepath)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+class Journal:
+    '''Per file status of an import run in a JSON file, keyed by file name'''
+
+    def __init__(self, path, resume=True, quarantine_after=2):
+        self.path = path
+        self.quarantine_after = quarantine_after
+        self.entries = {}
+        self.skipped = 0
+        if resume:
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError):
+                self.entries = {}
+        for name, entry in self.entries.items():
+            if entry["status"] == RUNNING:
+                log.warning("[Mixamo Root] %s did not finish in the last run" % name)
+                self.fail_entry(entry, "interrupted")
+        self.save()
+
+    def entry(self, filepath):
+        # The entry of the file, reset when the file changed since it was written
+        name = os.path.basename(filepath)
+        entry = self.entries.get(name)
+        current = signature(filepath)
+        if entry is None or entry.get("signature") != current:
+            entry = {"status": None, "signature": current, "attempts": 0, "actions": [], "wall": 0.0, "error": None}
+            self.entries[name] = entry
+        return entry
+
+    def skip(self, filepath, present=None):
+        # True for quarantined files and for finished ones whose actions all pass present
+        entry = self.entry(filepath)
+        if entry["status"] == QUARANTINED or (entry["status"] == DONE and (present is None or all(present(name) for name in entry["actions"]))):
+            print("[Mixamo Root] Journal: skipping %s (%s)" % (os.path.basename(filepath), entry["status"]))
+            self.skipped += 1
+            return True
+        return False
+
+    def start(self, filepath):
+        entry = self.entry(filepath)
+        entry.update(status=RUNNING, attempts=entry["attempts"] + 1, started=time.time())
+        self.save()
+
+    def done(self, filepath, actions, wall=0.0):
+        entry = self.entry(filepath)
+        entry.update(status=DONE, actions=list(actions), wall=wall, error=None)
+        self.save()
+
+    def failed(self, filepath, error):
+        self.fail_entry(self.entry(filepath), str(error))
+        self.save()
+
+    def fail_entry(self, entry, error):
+        entry["error"] = error
+        entry["status"] = QUARANTINED if entry["attempts"] >= self.quarantine_after else FAILED
+
+    def counts(self):
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return counts
+
+    def save(self):
+        # Written next to the journal and renamed, a crash never leaves half a file
+        temp = self.path + ".tmp"
+        with open(temp, 'w') as f:
+            json.dump({"files": self.entries, "saved": time.time()}, f, indent=1)
+        os.replace(temp, self.path)
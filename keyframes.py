@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Bulk keyframe access: keyframe points are moved in and out of F-curves with
+# foreach_get/foreach_set and edited as NumPy arrays, instead of one RNA access per key.
+import json
+
+import numpy as np
+
+
+KEY_VECTORS = ('co', 'handle_left', 'handle_right')
+KEY_ENUMS = ('interpolation', 'handle_left_type', 'handle_right_type')
+# Kept when clear_points has to make an F-curve again
+FCURVE_SETTINGS = ('extrapolation', 'mute', 'lock', 'hide', 'select')
+
+
+class KeyframeBuffer:
+    '''Keyframe points of a single F-curve as (n, 2) float arrays of [frame, value]'''
+
+    def __init__(self, co, handle_left=None, handle_right=None, interpolation=None, handle_left_type=None, handle_right_type=None):
+        self.co = np.array(co, dtype=np.float64).reshape(-1, 2)
+        count = len(self.co)
+        self.handle_left = self.co.copy() if handle_left is None else np.array(handle_left, dtype=np.float64).reshape(-1, 2)
+        self.handle_right = self.co.copy() if handle_right is None else np.array(handle_right, dtype=np.float64).reshape(-1, 2)
+        # Enum values are only written back when they were read or given
+        self.enums = {}
+        for attr, values in (('interpolation', interpolation), ('handle_left_type', handle_left_type), ('handle_right_type', handle_right_type)):
+            if values is not None:
+                self.enums[attr] = np.array(values, dtype=np.int32).reshape(count)
+
+    @classmethod
+    def read(cls, fcurve):
+        points = fcurve.keyframe_points
+        count = len(points)
+        arrays = {}
+        for attr in KEY_VECTORS:
+            # Keyframe vectors are stored as C floats, read them without conversion
+            arrays[attr] = np.empty(count * 2, dtype=np.float32)
+            points.foreach_get(attr, arrays[attr])
+        for attr in KEY_ENUMS:
+            arrays[attr] = np.empty(count, dtype=np.int32)
+            points.foreach_get(attr, arrays[attr])
+        return cls(**arrays)
+
+    def write(self, fcurve, update=True):
+        # Returns the F-curve written to, a new one when Blender has no keyframe_points.clear(), see clear_points
+        points = fcurve.keyframe_points
+        count = len(self)
+        if len(points) > count:
+            # Surplus keys go in one call instead of one RNA call per removed key
+            fcurve = clear_points(fcurve)
+            points = fcurve.keyframe_points
+        if len(points) < count:
+            points.add(count - len(points))
+        for attr in KEY_VECTORS:
+            points.foreach_set(attr, getattr(self, attr).astype(np.float32).ravel())
+        for attr, values in self.enums.items():
+            points.foreach_set(attr, values)
+        if update:
+            fcurve.update()
+        return fcurve
+
+    def __len__(self):
+        return len(self.co)
+
+    def copy(self):
+        return KeyframeBuffer(self.co, self.handle_left, self.handle_right, **self.enums)
+
+    @property
+    def frames(self):
+        return self.co[:, 0]
+
+    @property
+    def values(self):
+        return self.co[:, 1]
+
+    def clamp(self, minimum=None, maximum=None):
+        # Only the key values are clamped, handles are left for fcurve.update() to fix
+        values = self.co[:, 1]
+        if minimum is not None:
+            values[values < minimum] = minimum
+        if maximum is not None:
+            values[values > maximum] = maximum
+        return self
+
+    def offset(self, frames=0.0, values=0.0):
+        for vectors in (self.co, self.handle_left, self.handle_right):
+            vectors[:, 0] += frames
+            vectors[:, 1] += values
+        return self
+
+    def scale(self, factor, pivot=0.0):
+        for vectors in (self.co, self.handle_left, self.handle_right):
+            vectors[:, 1] = (vectors[:, 1] - pivot) * factor + pivot
+        return self
+
+
+def clear_points(fcurve):
+    # fcurve without keys. Before keyframe_points.clear() the curve is made again with the same path,
+    # index, group and settings, which leaves the old F-curve object invalid
+    points = fcurve.keyframe_points
+    if hasattr(points, "clear"):
+        points.clear()
+        return fcurve
+    action = fcurve.id_data
+    data_path, array_index = fcurve.data_path, fcurve.array_index
+    group = fcurve.group.name if fcurve.group else ""
+    settings = {attr: getattr(fcurve, attr) for attr in FCURVE_SETTINGS}
+    action.fcurves.remove(fcurve)
+    fcurve = action.fcurves.new(data_path, index=array_index, action_group=group)
+    for attr, value in settings.items():
+        setattr(fcurve, attr, value)
+    return fcurve
+
+
+class Channel:
+    '''An F-curve detached from its action: where it animates and its keyframes'''
+
+    def __init__(self, data_path, array_index, group, keys):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.group = group
+        self.keys = keys
+
+    @classmethod
+    def read(cls, fcurve):
+        group = fcurve.group.name if fcurve.group else ""
+        return cls(fcurve.data_path, fcurve.array_index, group, KeyframeBuffer.read(fcurve))
+
+
+def read_action(action):
+    return [Channel.read(fc) for fc in action.fcurves]
+
+
+def write_action(action, channels):
+    for channel in channels:
+        fc = action.fcurves.find(channel.data_path, index=channel.array_index)
+        if fc is None:
+            fc = action.fcurves.new(channel.data_path, index=channel.array_index, action_group=channel.group)
+        channel.keys.write(fc)
+    return action
+
+
+def save_channels(filepath, channels, **meta):
+    # One .npz holding every keyframe array plus a JSON manifest describing the channels
+    arrays = {}
+    manifest = {"meta": meta, "channels": []}
+    for i, channel in enumerate(channels):
+        manifest["channels"].append({"data_path": channel.data_path, "array_index": channel.array_index, "group": channel.group, "enums": sorted(channel.keys.enums)})
+        for attr in KEY_VECTORS:
+            arrays["%d_%s" % (i, attr)] = getattr(channel.keys, attr)
+        for attr, values in channel.keys.enums.items():
+            arrays["%d_%s" % (i, attr)] = values
+    arrays["manifest"] = np.array(json.dumps(manifest))
+    with open(filepath, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def load_channels(filepath):
+    with np.load(filepath, allow_pickle=False) as data:
+        manifest = json.loads(str(data["manifest"]))
+        channels = []
+        for i, entry in enumerate(manifest["channels"]):
+            vectors = {attr: data["%d_%s" % (i, attr)] for attr in KEY_VECTORS}
+            enums = {attr: data["%d_%s" % (i, attr)] for attr in entry["enums"]}
+            channels.append(Channel(entry["data_path"], entry["array_index"], entry["group"], KeyframeBuffer(**vectors, **enums)))
+    return channels, manifest["meta"]
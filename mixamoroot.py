@@ -26,13 +26,50 @@
 # Bone Renaming Modifications, File Handling, And Addon By: Richard Perry
 import bpy
 import os
+import sys
+import math
 import logging
 from pathlib import Path
 
+import numpy as np
+
+if __name__ == "__main__":
+    # Run as a script, the sibling modules are imported from next to this file
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from .keyframes import Channel, KeyframeBuffer, read_action, write_action
+    from . import fbx_reader
+    from . import retarget
+    from . import profiling
+    from . import core
+    from . import fk
+except ImportError:
+    from keyframes import Channel, KeyframeBuffer, read_action, write_action
+    import fbx_reader
+    import retarget
+    import profiling
+    import core
+    import fk
+
 
 log = logging.getLogger(__name__)
 
-# in future remove_prefix should be renamed to rename prefix and a target prefix should be specifiable via ui
+# Custom property marking actions whose hip motion was already moved to the root bone
+ROOT_MOTION_TAG = "mixamo_root_motion"
+# Custom properties written by normalize_loops
+CYCLIC_PROPERTY = "mixamo_cyclic"
+LOOP_ERROR_PROPERTY = "mixamo_loop_error"
+CYCLE_DISPLACEMENT_PROPERTY = "mixamo_cycle_displacement"
+CYCLE_VELOCITY_PROPERTY = "mixamo_cycle_velocity"
+# {duplicate name: [start frame, frame count]} on the action kept in place of removed duplicates
+ALIASES_PROPERTY = "mixamo_aliases"
+# Frame rate the keys of an imported action were placed at, the FBX import sets the scene rate per file
+SOURCE_FPS_PROPERTY = "mixamo_source_fps"
+# Strip settings pack_nla keeps when it lays the strips out again
+STRIP_SETTINGS = ('scale', 'repeat', 'blend_type', 'influence')
+
+@profiling.timed("fixBones")
 def fixBones(remove_prefix=False, name_prefix="mixamorig:"):
     bpy.ops.object.mode_set(mode = 'OBJECT')
         
@@ -43,23 +80,88 @@ def fixBones(remove_prefix=False, name_prefix="mixamorig:"):
     bpy.context.object.show_in_front = True
 
 
-def removePrefix(name_prefix="mixamorig:"):
-    for rig in bpy.context.selected_objects:
-        if rig.type == 'ARMATURE':
-            for mesh in rig.children:
-                for vg in mesh.vertex_groups:
-                    new_name = vg.name
-                    new_name = new_name.replace(name_prefix,"")
-                    rig.pose.bones[vg.name].name = new_name
-                    vg.name = new_name
-            for bone in rig.pose.bones:
-                bone.name = bone.name.replace(name_prefix,"")
-    for action in bpy.data.actions:
-        fc = action.fcurves
-        for f in fc:
-            f.data_path = f.data_path.replace(name_prefix,"")
-        
-def scaleAll():
+def bone_path_name(data_path):
+    # 'pose.bones["Name"].location' -> 'Name', None for paths that are not bone paths
+    if not data_path.startswith('pose.bones["'):
+        return None
+    end = data_path.find('"]', 12)
+    return data_path[12:end] if end > 0 else None
+
+def rig_actions(rig):
+    anim_data = rig.animation_data
+    if anim_data is None:
+        return []
+    actions = [strip.action for track in anim_data.nla_tracks for strip in track.strips if strip.action]
+    if anim_data.action:
+        actions.append(anim_data.action)
+    return list({action.name: action for action in actions}.values())
+
+def rename_prefix(rigs, name_prefix="mixamorig:", new_prefix=""):
+    # Renames bones, vertex groups and F-curves of the given rigs from name_prefix to new_prefix in one pass.
+    # Only the actions used by those rigs (active action and NLA strips) are touched.
+    renamed = 0
+    for rig in rigs:
+        if rig.type != 'ARMATURE':
+            continue
+        name_map = {bone.name: new_prefix + bone.name[len(name_prefix):] for bone in rig.data.bones if bone.name.startswith(name_prefix)}
+        if not name_map:
+            continue
+
+        fcurve_index = {}
+        groups = []
+        for action in rig_actions(rig):
+            for fc in action.fcurves:
+                bone_name = bone_path_name(fc.data_path)
+                if bone_name in name_map:
+                    fcurve_index.setdefault(bone_name, []).append(fc)
+            groups.extend(group for group in action.groups if group.name in name_map)
+
+        for old_name, new_name in name_map.items():
+            rig.data.bones[old_name].name = new_name
+            old_path = 'pose.bones["{}"]'.format(old_name)
+            new_path = 'pose.bones["{}"]'.format(new_name)
+            # Blender may already have fixed the paths while renaming the bone
+            for fc in fcurve_index.get(old_name, ()):
+                if fc.data_path.startswith(old_path):
+                    fc.data_path = new_path + fc.data_path[len(old_path):]
+        for group in groups:
+            group.name = name_map[group.name]
+        for mesh in rig.children:
+            for vg in mesh.vertex_groups:
+                if vg.name in name_map:
+                    vg.name = name_map[vg.name]
+        renamed += len(name_map)
+    return renamed
+
+@profiling.timed("removePrefix")
+def removePrefix(name_prefix="mixamorig:", new_prefix=""):
+    rename_prefix(bpy.context.selected_objects, name_prefix, new_prefix)
+
+def is_location_path(data_path):
+    return data_path.startswith('pose.bones[') and data_path.endswith('].location')
+
+def scale_locations(actions, factor=0.01):
+    # Scales the values and handles of every bone location curve around 0, over any number of actions
+    scaled = set()
+    for action in actions:
+        if action is None or action.name in scaled:
+            continue
+        scaled.add(action.name)
+        for fc in action.fcurves:
+            if is_location_path(fc.data_path):
+                KeyframeBuffer.read(fc).scale(factor).write(fc)
+    return len(scaled)
+
+@profiling.timed("scaleAll")
+def scaleAll(factor=0.01):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    anim_data = bpy.context.object.animation_data
+    scale_locations([anim_data.action if anim_data else None], factor)
+    # copyHips expects to continue in pose mode
+    bpy.ops.object.mode_set(mode='POSE')
+
+def scale_all_resize():
+    # Graph Editor version of scaleAll, needs a UI area. Kept as the reference for benchmark.py
     bpy.ops.object.mode_set(mode='OBJECT')
 
     prev_context=bpy.context.area.type
@@ -84,6 +186,7 @@ def scaleAll():
     use_proportional_projected=False)
 
 
+@profiling.timed("copyHips")
 def copyHips(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_prefix="mixamorig:"):
     bpy.context.area.ui_type = 'FCURVES'
     #SELECT OUR ROOT MOTION BONE 
@@ -126,22 +229,269 @@ def copyHips(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_prefix=
 
     # Set the minimum Y value of the root bone to 0
     z_fcurve = fcurves[1]
-    for keyframe in z_fcurve.keyframe_points:
-        if keyframe.co.y < 0:
-            keyframe.co.y = 0
+    KeyframeBuffer.read(z_fcurve).clamp(minimum=0.0).write(z_fcurve)
     
     
     anim_data = bpy.context.object.animation_data
     action = anim_data.action if anim_data else None
     hips_fcurves = [hips_fcurve for hips_fcurve in action.fcurves if hips_fcurve.data_path == 'pose.bones["{}"].location'.format(hip_bone_name) and hips_fcurve.array_index in range(3)]
-    for keyframe in hips_fcurves[0].keyframe_points:
-        if keyframe.co.y > 0:
-            keyframe.co.y = 0
-            #keyframe.co.y = keyframe.co.y / 2
+    KeyframeBuffer.read(hips_fcurves[0]).clamp(maximum=0.0).write(hips_fcurves[0])
 
     bpy.context.area.ui_type = 'VIEW_3D'
     bpy.ops.object.mode_set(mode='OBJECT')
 
+def location_path(bone_name):
+    return core.location_path(bone_name)
+
+def write_root_motion(action, root_name, hips_fcurves, root, remaining):
+    # bpy side of core.root_motion_keys: replaces the root location curves and updates or removes the hips ones
+    root_path = location_path(root_name)
+    for index, keys in root.items():
+        existing = action.fcurves.find(root_path, index=index)
+        if existing:
+            action.fcurves.remove(existing)
+        keys.write(action.fcurves.new(root_path, index=index, action_group=root_name))
+    for index, keys in remaining.items():
+        if keys is None:
+            action.fcurves.remove(hips_fcurves[index])
+        else:
+            keys.write(hips_fcurves[index])
+
+@profiling.timed("copy_hips_direct")
+def copy_hips_direct(armature, root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_prefix="mixamorig:"):
+    # Same result as copyHips, but works on the F-curves directly so no Graph Editor area is needed
+    anim_data = armature.animation_data
+    action = anim_data.action if anim_data else None
+    if action is None:
+        log.warning('[Mixamo Root] %s has no action, skipping root motion' % armature.name)
+        return
+
+    hips_path = location_path(hip_bone_name)
+    hips_fcurves = {fc.array_index: fc for fc in action.fcurves if fc.data_path == hips_path}
+    hips_keys = {index: KeyframeBuffer.read(fc) for index, fc in hips_fcurves.items()}
+    root, remaining = core.root_motion_keys(hips_keys, 'IMPORT')
+    write_root_motion(action, name_prefix + root_bone_name, hips_fcurves, root, remaining)
+
+def sample_curves(action, data_path, frames, default):
+    # (frames, len(default)) samples of a vector property, linear between keys, default where there is no curve
+    columns = []
+    for index, value in enumerate(default):
+        fc = action.fcurves.find(data_path, index=index)
+        if fc and len(fc.keyframe_points):
+            keys = KeyframeBuffer.read(fc)
+            columns.append(np.interp(frames, keys.frames, keys.values))
+        else:
+            columns.append(np.full(len(frames), value))
+    return np.column_stack(columns)
+
+def root_motion_actions(armature, actions, root_name, hip_bone_name, mode='GROUND', extract_yaw=False):
+    # bpy side of core.extract_root_motion for several actions of one armature, all solved in one batch
+    bones = armature.data.bones
+    root_rest = np.array(bones[root_name].matrix_local.to_3x3(), dtype=np.float64)
+    hips_rest = np.array(bones[hip_bone_name].matrix_local.to_3x3(), dtype=np.float64)
+    # Hips axes to root axes, and the armature's axes and Z up seen from the root
+    axes = np.linalg.inv(root_rest)
+    hips_to_root = axes @ hips_rest
+    up = axes @ np.array([0.0, 0.0, 1.0])
+    if extract_yaw and armature.pose.bones[hip_bone_name].rotation_mode != 'QUATERNION':
+        log.warning('[Mixamo Root] %s does not use quaternions, facing is not extracted' % hip_bone_name)
+        extract_yaw = False
+
+    hips_location_path = location_path(hip_bone_name)
+    hips_rotation_path = 'pose.bones["{}"].rotation_quaternion'.format(hip_bone_name)
+    samples = []
+    for action in actions:
+        frames = [KeyframeBuffer.read(fc).frames for fc in action.fcurves if fc.data_path in (hips_location_path, hips_rotation_path)]
+        frames = np.unique(np.concatenate(frames)) if frames else np.array([action.frame_range[0]])
+        samples.append((action, frames))
+    if not samples:
+        return 0
+    location = np.concatenate([sample_curves(action, hips_location_path, frames, (0.0, 0.0, 0.0)) for action, frames in samples])
+    rotation = np.concatenate([sample_curves(action, hips_rotation_path, frames, (1.0, 0.0, 0.0, 0.0)) for action, frames in samples])
+    lengths = [len(frames) for action, frames in samples]
+    ground = None
+    if mode == 'CONTACT':
+        # Feet and toes of the original pose, with the root left where it rests
+        with profiling.stage("contact"):
+            heights = [fk.contact_heights(armature, action, frames, exclude=(root_name,))[1] for action, frames in samples]
+        if any(height is None for height in heights):
+            log.warning('[Mixamo Root] %s has no foot or toe bones, using the GROUND root mode' % armature.name)
+            mode = 'GROUND'
+        else:
+            ground = np.concatenate(heights)
+    root_location, root_rotation, hips_location, hips_rotation = core.extract_root_motion(
+        location, rotation, hips_to_root, up, mode, extract_yaw, lengths, ground, axes)
+
+    rows = np.cumsum([0] + lengths)
+    for i, (action, frames) in enumerate(samples):
+        part = slice(rows[i], rows[i + 1])
+        interpolation = np.full(len(frames), fbx_reader.INTERPOLATION_LINEAR)
+        channels = []
+        curves = [(root_name, 'location', root_location), (hip_bone_name, 'location', hips_location)]
+        if extract_yaw:
+            curves += [(root_name, 'rotation_quaternion', root_rotation), (hip_bone_name, 'rotation_quaternion', hips_rotation)]
+        for bone_name, prop, values in curves:
+            data_path = 'pose.bones["{}"].{}'.format(bone_name, prop)
+            for index in range(values.shape[1]):
+                keys = KeyframeBuffer(np.column_stack((frames, values[part, index])), interpolation=interpolation)
+                channels.append(Channel(data_path, index, bone_name, keys))
+        write_action(action, channels)
+        action[ROOT_MOTION_TAG] = True
+    print("[Mixamo Root] %s root motion added to %d actions" % (mode, len(samples)))
+    return len(samples)
+
+def prefixed_name(bone_name, remove_prefix=False, name_prefix="mixamorig:", target_prefix=""):
+    # Name of a bone after the import, when remove_prefix renamed it
+    if remove_prefix and bone_name.startswith(name_prefix):
+        return target_prefix + bone_name[len(name_prefix):]
+    return bone_name
+
+def normalize_loops(actions, root_name, hip_bone_name, threshold=10.0, fps=None):
+    # Finds cyclic clips (first and last pose within threshold degrees on every bone), makes their hips
+    # match at the loop boundary and stores the root displacement per cycle and the cycle velocity.
+    # The velocity uses fps when given, else the rate each action was keyed at
+    actions = [action for action in actions if action]
+    first = []
+    last = []
+    counts = []
+    for action in actions:
+        start, end = action.frame_range
+        # {data path: (first rotation, last rotation)} of every bone with a rotation curve
+        pairs = {}
+        for fc in action.fcurves:
+            if fc.data_path.endswith('.rotation_quaternion') and len(fc.keyframe_points):
+                keys = KeyframeBuffer.read(fc)
+                pair = pairs.setdefault(fc.data_path, ([1.0, 0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]))
+                pair[0][fc.array_index] = np.interp(start, keys.frames, keys.values)
+                pair[1][fc.array_index] = np.interp(end, keys.frames, keys.values)
+        first += [pair[0] for pair in pairs.values()]
+        last += [pair[1] for pair in pairs.values()]
+        counts.append(len(pairs))
+    if not actions:
+        return []
+    errors = core.loop_errors(np.array(first).reshape(-1, 4), np.array(last).reshape(-1, 4), counts)
+
+    root_path = location_path(root_name)
+    hips_location_path = location_path(hip_bone_name)
+    hips_rotation_path = 'pose.bones["{}"].rotation_quaternion'.format(hip_bone_name)
+    cyclic = []
+    for action, error in zip(actions, errors):
+        action[LOOP_ERROR_PROPERTY] = float(error)
+        action[CYCLIC_PROPERTY] = bool(error <= threshold)
+        if error > threshold:
+            continue
+        start, end = action.frame_range
+        boundary = np.array([start, end])
+        root = sample_curves(action, root_path, boundary, (0.0, 0.0, 0.0))
+        displacement = root[1] - root[0]
+        rate = fps or action.get(SOURCE_FPS_PROPERTY) or scene_fps()
+        duration = (end - start) / rate if end > start else 0.0
+        action[CYCLE_DISPLACEMENT_PROPERTY] = displacement.tolist()
+        action[CYCLE_VELOCITY_PROPERTY] = (displacement / duration if duration else displacement * 0.0).tolist()
+
+        # The hips have to match at the boundary, the root keeps its travel. Location curves are closed one
+        # by one, the legacy root motion leaves only some of them on the hips; a rotation needs all 4.
+        groups = [[action.fcurves.find(hips_location_path, index=index)] for index in range(3)]
+        groups.append([action.fcurves.find(hips_rotation_path, index=index) for index in range(4)])
+        for fcurves in groups:
+            if not all(fc and len(fc.keyframe_points) > 1 for fc in fcurves):
+                continue
+            buffers = [KeyframeBuffer.read(fc) for fc in fcurves]
+            frames = buffers[0].frames
+            if any(not np.array_equal(keys.frames, frames) for keys in buffers):
+                log.warning("[Mixamo Root] %s: the hips rotation curves have different keys, the rotation loop is not closed" % action.name)
+                continue
+            values = np.column_stack([keys.values for keys in buffers])
+            values = core.close_quaternion_loop(frames, values) if len(fcurves) == 4 else core.close_loop(frames, values)
+            for index, (fc, keys) in enumerate(zip(fcurves, buffers)):
+                # Handles move with their key, so the tangents are kept
+                keys.offset(values=values[:, index] - keys.values)
+                keys.write(fc)
+        cyclic.append(action)
+    print("[Mixamo Root] %d of %d actions are loops" % (len(cyclic), len(actions)))
+    return cyclic
+
+def fingerprint_index(actions=None, root_name=None):
+    # Duplicate index of the given actions, every action in the file by default, see fingerprint.py
+    try:
+        from . import fingerprint
+    except ImportError:
+        import fingerprint
+    index = fingerprint.FingerprintIndex()
+    for action in bpy.data.actions if actions is None else actions:
+        index.add(action.name, fingerprint.Fingerprint.from_channels(read_action(action), root_name))
+    return index
+
+def merge_duplicate(action, original, mode='ALIAS', frame=0.0, length=0):
+    # Moves the users of a duplicate to the action it repeats from frame on and removes it
+    if mode == 'ALIAS':
+        aliases = dict(original.get(ALIASES_PROPERTY, {}))
+        aliases[action.name] = [float(frame), length]
+        original[ALIASES_PROPERTY] = aliases
+    action.user_remap(original)
+    bpy.data.actions.remove(action)
+
+def dedup_actions(actions, mode='ALIAS', root_name=None, index=None, offloaded=(), deferred=None):
+    # Removes every action equal to, or a trimmed copy of, an indexed one and moves its users over.
+    # ALIAS records the removed name on the kept action, SKIP only drops it. New actions are added
+    # to the index; the result is the actions with None in place of the removed ones.
+    # offloaded names indexed actions an ActionStore moved out of the file: their duplicates are kept
+    # and listed in deferred for merge_deferred_duplicates once the originals are back.
+    try:
+        from . import fingerprint
+    except ImportError:
+        import fingerprint
+    if index is None:
+        index = fingerprint.FingerprintIndex()
+    kept = []
+    removed = 0
+    with profiling.stage("dedup"):
+        for action in actions:
+            if not action:
+                kept.append(action)
+                continue
+            clip = fingerprint.Fingerprint.from_channels(read_action(action), root_name)
+            match = index.find(clip)
+            original = bpy.data.actions.get(match[0]) if match else None
+            if match and original is None and match[0] in offloaded and deferred is not None:
+                name, offset = match
+                deferred.append((action.name, name, float(index.clips[name].frames[offset]), len(clip)))
+                kept.append(action)
+                continue
+            if original is None or original == action:
+                index.add(action.name, clip)
+                kept.append(action)
+                continue
+            name, offset = match
+            print("[Mixamo Root] %s is a duplicate of %s from frame %g" % (action.name, name, index.clips[name].frames[offset]))
+            merge_duplicate(action, original, mode, index.clips[name].frames[offset], len(clip))
+            kept.append(None)
+            removed += 1
+    if removed:
+        print("[Mixamo Root] Removed %d duplicate actions" % removed)
+    return kept
+
+def merge_deferred_duplicates(deferred, mode='ALIAS'):
+    # The duplicates dedup_actions kept because their original was offloaded, see streaming.ActionStore
+    removed = 0
+    for name, original_name, frame, length in deferred:
+        action = bpy.data.actions.get(name)
+        original = bpy.data.actions.get(original_name)
+        if action is None or original is None or action == original:
+            continue
+        print("[Mixamo Root] %s is a duplicate of %s from frame %g" % (name, original_name, frame))
+        merge_duplicate(action, original, mode, frame, length)
+        removed += 1
+    if removed:
+        print("[Mixamo Root] Removed %d duplicates of offloaded actions" % removed)
+    return removed
+
+def remove_duplicate_actions(mode='ALIAS', root_name=None):
+    # Duplicate removal over the actions already in the file, the first of every set is kept
+    # Longest first, so trimmed copies find the clip they were cut from
+    actions = sorted(bpy.data.actions, key=lambda action: action.frame_range[1] - action.frame_range[0], reverse=True)
+    return sum(1 for action in dedup_actions(actions, mode, root_name) if action is None)
+
 def fix_bones_nla(remove_prefix=False, name_prefix="mixamorig:"):
     bpy.ops.object.mode_set(mode = 'OBJECT')
         
@@ -151,36 +501,14 @@ def fix_bones_nla(remove_prefix=False, name_prefix="mixamorig:"):
     bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
     bpy.context.object.show_in_front = True
 
-def scale_all_nla(armature):
+def scale_all_nla(armature, factor=0.01):
     bpy.ops.object.mode_set(mode='OBJECT')
-
-    # prev_context=bpy.context.area.type
-
-    for track in [x for x in armature.animation_data.nla_tracks]:
-        bpy.context.active_nla_track = track
-        for strip in track.strips:
-            bpy.context.active_nla_strip = strip
-            print(bpy.context.active_nla_strip)
-
-        
-    bpy.ops.object.mode_set(mode='POSE')
-    bpy.ops.pose.select_all(action='SELECT')
-    bpy.context.area.type = 'GRAPH_EDITOR'
-    bpy.context.space_data.dopesheet.filter_text = "Location"
-    bpy.context.space_data.pivot_point = 'CURSOR'
-    bpy.context.space_data.dopesheet.use_filter_invert = False
-    
-    bpy.ops.anim.channels_select_all(action='SELECT')   
-        
-    bpy.ops.transform.resize(value=(1, 0.01, 1), orient_type='GLOBAL',
-    orient_matrix=((1, 0, 0), (0, 1, 0), (0, 0, 1)),
-    orient_matrix_type='GLOBAL',
-    constraint_axis=(False, True, False),
-    mirror=True, use_proportional_edit=False,
-    proportional_edit_falloff='SMOOTH',
-    proportional_size=1,
-    use_proportional_connected=False,
-    use_proportional_projected=False)
+    anim_data = armature.animation_data
+    if anim_data is None:
+        return
+    actions = [strip.action for track in anim_data.nla_tracks for strip in track.strips]
+    actions.append(anim_data.action)
+    scale_locations(actions, factor)
 
 def copy_hips_nla(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_prefix="mixamorig:"):
     hip_bone_name="Ctrl_Hips"
@@ -266,8 +594,7 @@ def copy_hips_nla(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_pr
             for fc in loc_fcurves:
                 # Z axis location curve
                 if fc.array_index == 2:
-                    for kp in fc.keyframe_points:
-                        kp.co.z = min(0, abs(kp.co.z))
+                    KeyframeBuffer.read(fc).clamp(minimum=0.0).write(fc)
                         
             # Delete rotation curves for x(0) and y(1) axis. Should we delet Z rotation too? 
             # rot_fcurves = [fc for fc in strip.fcurves if root_bone_name in fc.data_path and fc.data_path.startswith('rotation') and (fc.array_index == 0 or fc.array_index == 1)]
@@ -281,6 +608,46 @@ def copy_hips_nla(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_pr
             bpy.context.area.ui_type = previous_context
     bpy.ops.object.mode_set(mode='OBJECT')
     
+def move_hips_to_root_nla(action, root_name, hip_bone_name="Ctrl_Hips"):
+    # What copy_hips_nla does in tweak mode for one strip action: every Hips location axis moves to the root, root Z is kept >= 0
+    hips_path = location_path(hip_bone_name)
+    hips_fcurves = {fc.array_index: fc for fc in action.fcurves if fc.data_path == hips_path}
+    hips_keys = {index: KeyframeBuffer.read(fc) for index, fc in hips_fcurves.items()}
+    root, remaining = core.root_motion_keys(hips_keys, 'NLA', action.frame_range[0])
+    write_root_motion(action, root_name, hips_fcurves, root, remaining)
+
+def copy_hips_nla_direct(armature, root_bone_name="Root", hip_bone_name="Ctrl_Hips", name_prefix="mixamorig:", frame_range=None, force=False, root_mode='LEGACY', extract_yaw=False):
+    # copy_hips_nla without tweak mode: each strip action is edited once, however many strips share it.
+    # frame_range limits the pass to strips overlapping (start, end). Actions done by an earlier run are
+    # tagged and skipped unless force is set, so a rerun only processes newly added strips.
+    # root_mode other than 'LEGACY' processes all the strip actions in one batch, see core.extract_root_motion
+    anim_data = armature.animation_data
+    if anim_data is None:
+        log.warning('[Mixamo Root] %s has no animation data, skipping root motion' % armature.name)
+        return 0
+    actions = {}
+    for track in anim_data.nla_tracks:
+        for strip in track.strips:
+            if strip.action is None:
+                continue
+            if frame_range and (strip.frame_end < frame_range[0] or strip.frame_start > frame_range[1]):
+                continue
+            actions[strip.action.name] = strip.action
+
+    pending = [action for action in actions.values() if force or not action.get(ROOT_MOTION_TAG)]
+    if root_mode != 'LEGACY':
+        processed = root_motion_actions(armature, pending, name_prefix + root_bone_name, hip_bone_name, root_mode, extract_yaw)
+        print("[Mixamo Root] Root motion added to %d of %d strip actions" % (processed, len(actions)))
+        return processed
+    processed = 0
+    for action in pending:
+        move_hips_to_root_nla(action, name_prefix + root_bone_name, hip_bone_name)
+        action[ROOT_MOTION_TAG] = True
+        processed += 1
+    print("[Mixamo Root] Root motion added to %d of %d strip actions" % (processed, len(actions)))
+    return processed
+
+@profiling.timed("deleteArmature")
 def deleteArmature(imported_objects=set()):
     armature = None
     if bpy.context.selected_objects:
@@ -297,30 +664,119 @@ def deleteArmature(imported_objects=set()):
     if bpy.context.selected_objects:
         bpy.context.view_layer.objects.active = armature
 
-def import_armature(filepath, root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:",  insert_root=False, delete_armatures=False):
+def import_armature(filepath, root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:",  insert_root=False, delete_armatures=False, engine='OPERATOR', target_prefix="", root_mode='LEGACY', extract_yaw=False, templates=None):
+    # templates ({skeleton key: armature data}) lets armatures that are only imported for their action
+    # share the armature data prepared for the first clip of the same skeleton, see use_skeleton_template
     old_objs = set(bpy.context.scene.objects)
-    if insert_root:
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        bpy.ops.import_scene.fbx(filepath = filepath)#,  automatic_bone_orientation=True)
-    else:
-        bpy.ops.import_scene.fbx(filepath = filepath)#,  automatic_bone_orientation=True)
+    with profiling.stage("import"):
+        if insert_root:
+            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+            bpy.ops.import_scene.fbx(filepath = filepath)#,  automatic_bone_orientation=True)
+        else:
+            bpy.ops.import_scene.fbx(filepath = filepath)#,  automatic_bone_orientation=True)
     
     imported_objects = set(bpy.context.scene.objects) - old_objs
     imported_actions = [x.animation_data.action for x in imported_objects if x.animation_data]
     print("[Mixamo Root] Now importing: " + str(filepath), filepath)
     imported_actions[0].name = Path(filepath).resolve().stem # Only reads the first animation associated with an imported armature
+    imported_actions[0][SOURCE_FPS_PROPERTY] = scene_fps()
     imported_armatures = [obj for obj in imported_objects if obj.type == 'ARMATURE']
 
-
+    armature = None
     if imported_armatures:
         armature = imported_armatures[0]
         armature.name = Path(filepath).resolve().stem
     
     if insert_root:
-        add_root_bone(root_bone_name, hip_bone_name, remove_prefix, name_prefix)
-    
-    
-def add_root_bone(root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:"):
+        key = None
+        if templates is not None and armature:
+            key = (retarget.rig_key(armature), root_bone_name, hip_bone_name, remove_prefix, name_prefix, target_prefix)
+        if key and key in templates:
+            use_skeleton_template(armature, templates[key], root_bone_name, hip_bone_name, remove_prefix, name_prefix, engine, target_prefix, root_mode, extract_yaw)
+        else:
+            add_root_bone(root_bone_name, hip_bone_name, remove_prefix, name_prefix, engine, target_prefix, root_mode, extract_yaw)
+            if key:
+                # Kept while the armature it came with is deleted
+                armature.data.use_fake_user = True
+                templates[key] = armature.data
+    return armature
+
+@profiling.timed("template")
+def use_skeleton_template(armature, template, root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:", engine='OPERATOR', target_prefix="", root_mode='LEGACY', extract_yaw=False):
+    # add_root_bone for an armature whose skeleton matches a prepared one: the template data already has the
+    # root bone, applied transforms and renamed bones, so only the action is processed
+    imported = armature.data
+    armature.data = template
+    bpy.data.armatures.remove(imported)
+    # What fixBones leaves after applying the transforms
+    armature.location = (0.0, 0.0, 0.0)
+    armature.rotation_euler = (0.0, 0.0, 0.0)
+    armature.scale = (1.0, 1.0, 1.0)
+    action = armature.animation_data.action
+    # The bones are renamed already, so the curves are renamed first and the root motion uses the new names
+    if remove_prefix:
+        rename_action_prefix(action, name_prefix, target_prefix)
+    root_name = prefixed_name(name_prefix + root_bone_name, remove_prefix, name_prefix, target_prefix)
+    hips_name = prefixed_name(hip_bone_name, remove_prefix, name_prefix, target_prefix)
+    scaleAll()
+    if root_mode != 'LEGACY':
+        root_motion_actions(armature, [action], root_name, hips_name, root_mode, extract_yaw)
+        bpy.ops.object.mode_set(mode='OBJECT')
+    elif engine == 'DIRECT':
+        copy_hips_direct(armature, root_bone_name=root_name, hip_bone_name=hips_name, name_prefix="")
+        bpy.ops.object.mode_set(mode='OBJECT')
+    else:
+        copyHips(root_bone_name=root_name, hip_bone_name=hips_name, name_prefix="")
+
+def release_skeleton_templates(templates):
+    # Template data left without an armature is removed once the import is done
+    for data in templates.values():
+        data.use_fake_user = False
+        if data.users == 0:
+            bpy.data.armatures.remove(data)
+    templates.clear()
+
+def import_animation(filepath, armature, root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:", insert_root=False, target_prefix="", root_mode='LEGACY', extract_yaw=False):
+    # Builds the action of an animation only file on an armature already in the scene, reading the FBX directly instead of importing it
+    print("[Mixamo Root] Now reading: " + str(filepath))
+    with profiling.stage("read"), open(filepath, 'rb') as f:
+        channels, fps = fbx_reader.read_animation(f.read())
+    bone_names = set(armature.pose.bones.keys())
+    channels = [channel for channel in channels if channel.group in bone_names or channel.group.replace(name_prefix, target_prefix, 1) in bone_names]
+    action = write_action(bpy.data.actions.new(Path(filepath).resolve().stem), channels)
+    action[SOURCE_FPS_PROPERTY] = fps
+
+    # The bones of the kept armature are renamed already, so the curves are renamed first and the root motion uses the new names
+    if remove_prefix:
+        rename_action_prefix(action, name_prefix, target_prefix)
+    if insert_root:
+        # The armature already has its root bone, only the curves need the root motion stages
+        root_name = prefixed_name(name_prefix + root_bone_name, remove_prefix, name_prefix, target_prefix)
+        hips_name = prefixed_name(hip_bone_name, remove_prefix, name_prefix, target_prefix)
+        previous_action = armature.animation_data.action
+        armature.animation_data.action = action
+        with profiling.stage("scale_locations"):
+            scale_locations([action])
+        if root_mode != 'LEGACY':
+            root_motion_actions(armature, [action], root_name, hips_name, root_mode, extract_yaw)
+        else:
+            copy_hips_direct(armature, root_bone_name=root_name, hip_bone_name=hips_name, name_prefix="")
+        armature.animation_data.action = previous_action
+    return action
+
+def rename_action_prefix(action, name_prefix="mixamorig:", new_prefix=""):
+    # The F-curve and group half of rename_prefix, for actions of armatures already renamed
+    for fc in action.fcurves:
+        bone_name = bone_path_name(fc.data_path)
+        if bone_name and bone_name.startswith(name_prefix):
+            fc.data_path = fc.data_path.replace(bone_name, new_prefix + bone_name[len(name_prefix):], 1)
+    for group in action.groups:
+        if group.name.startswith(name_prefix):
+            group.name = new_prefix + group.name[len(name_prefix):]
+
+# engine: 'OPERATOR' runs the Graph Editor operators, 'DIRECT' edits the F-curves and also works with blender --background
+# root_mode other than 'LEGACY' replaces copyHips with core.extract_root_motion in that mode
+def add_root_bone(root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:", engine='OPERATOR', target_prefix="", root_mode='LEGACY', extract_yaw=False):
     armature = bpy.context.selected_objects[0]
     bpy.ops.object.mode_set(mode='EDIT')
 
@@ -332,24 +788,37 @@ def add_root_bone(root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_
 
     fixBones()
     scaleAll()
-    copyHips(root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix)
+    if root_mode != 'LEGACY':
+        root_motion_actions(armature, [armature.animation_data.action], name_prefix + root_bone_name, hip_bone_name, root_mode, extract_yaw)
+        bpy.ops.object.mode_set(mode='OBJECT')
+    elif engine == 'DIRECT':
+        copy_hips_direct(armature, root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix)
+        bpy.ops.object.mode_set(mode='OBJECT')
+    else:
+        copyHips(root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix)
     if remove_prefix:
-        removePrefix(name_prefix)
+        removePrefix(name_prefix, target_prefix)
 
-def add_root_bone_nla(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_prefix="mixamorig:"):#remove_prefix=False, name_prefix="mixamorig:"):
+def add_root_bone_nla(root_bone_name="Root", hip_bone_name="mixamorig:Hips", name_prefix="mixamorig:", engine='OPERATOR', frame_range=None, decimate=False, location_tolerance=0.001, rotation_tolerance=0.1, root_mode='LEGACY', extract_yaw=False):#remove_prefix=False, name_prefix="mixamorig:"):
     armature = bpy.context.selected_objects[0]
-    bpy.ops.object.mode_set(mode='EDIT')
+    if name_prefix + root_bone_name not in armature.data.bones:
+        bpy.ops.object.mode_set(mode='EDIT')
 
-    # Add root bone to edit bones
-    root_bone = armature.data.edit_bones.new(name_prefix + root_bone_name)
-    root_bone.tail.z = .25
+        # Add root bone to edit bones
+        root_bone = armature.data.edit_bones.new(name_prefix + root_bone_name)
+        root_bone.tail.z = .25
 
-    armature.data.edit_bones[hip_bone_name].parent = armature.data.edit_bones[name_prefix + root_bone_name]
-    bpy.ops.object.mode_set(mode='OBJECT')
+        armature.data.edit_bones[hip_bone_name].parent = armature.data.edit_bones[name_prefix + root_bone_name]
+        bpy.ops.object.mode_set(mode='OBJECT')
 
     # fix_bones_nla(remove_prefix=remove_prefix, name_prefix=name_prefix)
     # scale_all_nla()
-    copy_hips_nla(root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix)
+    if engine == 'DIRECT' or root_mode != 'LEGACY':
+        copy_hips_nla_direct(armature, root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix, frame_range=frame_range, root_mode=root_mode, extract_yaw=extract_yaw)
+    else:
+        copy_hips_nla(root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix)
+    if decimate and armature.animation_data:
+        decimate_keys([strip.action for track in armature.animation_data.nla_tracks for strip in track.strips], location_tolerance, rotation_tolerance)
 
 def push(obj, action, track_name=None, start_frame=0):
     # Simulate push :
@@ -364,59 +833,482 @@ def push(obj, action, track_name=None, start_frame=0):
     strip = new_track.strips.new(action.name, start_frame, action)
     obj.animation_data.action = None
 
-def get_all_anims(source_dir, root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:",  insert_root=False, delete_armatures=False):
-    files = os.listdir(source_dir)
-    num_files = len(files)
-    current_context = bpy.context.area.ui_type
-    old_objs = set(bpy.context.scene.objects)
-    
-    for file in files:
-        print("file: " + str(file))
-        if not file.endswith('.DS_Store') and file.endswith('.fbx'):
+def nla_layout(lengths, track_count=1, gap=0.0, align=1.0, start_frame=0.0):
+    # (track, start frame) of every strip: each goes after the last strip of the track ending first,
+    # gap frames later and moved up to a multiple of align. track_count 0 gives every strip its own track.
+    # Starts are whole frames, strips are created on whole frames and a rounded start would overlap.
+    track_count = len(lengths) if track_count <= 0 else min(track_count, max(len(lengths), 1))
+    ends = [None] * track_count
+    placement = []
+    for length in lengths:
+        track = min(range(track_count), key=lambda i: -math.inf if ends[i] is None else ends[i])
+        start = start_frame if ends[track] is None else ends[track] + gap
+        if align > 1:
+            start = start_frame + math.ceil((start - start_frame) / align) * align
+        start = math.ceil(start)
+        ends[track] = start + length
+        placement.append((track, start))
+    return placement
+
+def layout_nla(obj, actions, track_count=1, gap=0.0, align=1.0, start_frame=0.0, track_name="Mixamo", settings=None):
+    # Bulk push: all actions as strips on track_count new tracks in one pass, see nla_layout. track_count 0
+    # keeps every strip where push puts it.
+    # settings has a {strip attribute: value} dict per action for its strip, see STRIP_SETTINGS
+    settings = settings or [{}] * len(actions)
+    settings = [setting for action, setting in zip(actions, settings) if action]
+    actions = [action for action in actions if action]
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    if track_count <= 0:
+        # Every strip on its own track at the start of its action, like push
+        placement = [(i, int(action.frame_start)) for i, action in enumerate(actions)]
+    else:
+        lengths = [(action.frame_range[1] - action.frame_range[0]) * setting.get('scale', 1.0) * setting.get('repeat', 1.0) for action, setting in zip(actions, settings)]
+        placement = nla_layout(lengths, track_count, gap, align, start_frame)
+    tracks = []
+    for i in range(max((track for track, _start in placement), default=-1) + 1):
+        track = obj.animation_data.nla_tracks.new(prev=tracks[-1] if tracks else None)
+        track.name = track_name if i == 0 else "%s.%03d" % (track_name, i)
+        tracks.append(track)
+    strips = []
+    for action, setting, (track, start) in zip(actions, settings, placement):
+        strip = tracks[track].strips.new(action.name, int(start), action)
+        for attr in STRIP_SETTINGS:
+            if attr in setting:
+                setattr(strip, attr, setting[attr])
+        strips.append(strip)
+    obj.animation_data.action = None
+    print("[Mixamo Root] Laid out %d strips on %d NLA tracks" % (len(strips), len(tracks)))
+    return strips
+
+def pack_nla(obj, track_count=1, gap=0.0, align=1.0, start_frame=0.0):
+    # Lays the actions of the existing strips, and the active action, out again on track_count tracks
+    anim_data = obj.animation_data
+    if anim_data is None:
+        return []
+    actions = []
+    settings = []
+    for track in anim_data.nla_tracks:
+        for strip in sorted(track.strips, key=lambda strip: strip.frame_start):
+            if strip.action and strip.action not in actions:
+                actions.append(strip.action)
+                settings.append({attr: getattr(strip, attr) for attr in STRIP_SETTINGS})
+    if anim_data.action and anim_data.action not in actions:
+        actions.append(anim_data.action)
+        settings.append({})
+    for action in actions:
+        action.use_fake_user = True
+    for track in list(anim_data.nla_tracks):
+        anim_data.nla_tracks.remove(track)
+    return layout_nla(obj, actions, track_count, gap, align, start_frame, settings=settings)
+
+def unpack_nla(obj):
+    # The reverse of layout_nla: removes every track and keeps the strip actions as standalone
+    # actions with a fake user. Strips sharing an action give one action.
+    anim_data = obj.animation_data
+    if anim_data is None:
+        return []
+    actions = []
+    for track in list(anim_data.nla_tracks):
+        for strip in track.strips:
+            if strip.action and strip.action not in actions:
+                strip.action.use_fake_user = True
+                actions.append(strip.action)
+        anim_data.nla_tracks.remove(track)
+    print("[Mixamo Root] Unpacked %d actions from the NLA" % len(actions))
+    return actions
+
+def decimate_keys(actions, location_tolerance=0.001, rotation_tolerance=0.1):
+    # Optional last stage: removes the redundant baked keys, see decimate.py
+    try:
+        from . import decimate
+    except ImportError:
+        import decimate
+    with profiling.stage("decimate"):
+        return decimate.decimate_actions(actions, location_tolerance, rotation_tolerance)
+
+def scene_fps():
+    render = bpy.context.scene.render
+    return render.fps / render.fps_base
+
+def resample_keys(actions, target_fps=0, start_frame=0.0):
+    # Post import stage: moves the actions to start_frame (None keeps their start) and with a target_fps
+    # samples them again at that rate, from the rate each was imported at. See resample.py
+    try:
+        from . import resample
+    except ImportError:
+        import resample
+    with profiling.stage("resample"):
+        rates = {}
+        for action in actions:
+            if action:
+                rates.setdefault(float(action.get(SOURCE_FPS_PROPERTY, scene_fps())), []).append(action)
+        for fps, group in rates.items():
+            resample.resample_actions(group, fps, target_fps or fps, start_frame)
+            if target_fps:
+                for action in group:
+                    action[SOURCE_FPS_PROPERTY] = float(target_fps)
+        return sum(len(group) for group in rates.values())
+
+def fit_scene(scene, ends, normalize_start=True, target_fps=0):
+    # Scene frame rate and range for actions normalized by resample_keys, ends are their last frames
+    if target_fps:
+        # The resampled actions play at the right speed
+        scene.render.fps = int(target_fps)
+        scene.render.fps_base = 1.0
+    if normalize_start:
+        scene.frame_start = 0
+        if ends:
+            scene.frame_end = max(scene.frame_end, int(math.ceil(max(ends))))
+
+def remove_action(action):
+    # The action of a failed file, its post processing may have removed it already
+    try:
+        if action:
+            bpy.data.actions.remove(action)
+    except ReferenceError:
+        pass
+
+def key_count(action):
+    return sum(len(fc.keyframe_points) for fc in action.fcurves) if action else 0
+
+def get_all_anims(source_dir, *args, **kwargs):
+    # Imports the whole directory in one go, see iter_all_anims for the arguments
+    steps = iter_all_anims(source_dir, *args, **kwargs)
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+def iter_all_anims(source_dir, root_bone_name="Root", hip_bone_name="mixamorig:Hips", remove_prefix=False, name_prefix="mixamorig:",  insert_root=False, delete_armatures=False, engine='OPERATOR', workers=1, native_reader=False, use_cache=False, cache_size=512 * 1024 * 1024, files=None, target_prefix="", decimate=False, location_tolerance=0.001, rotation_tolerance=0.1, streaming=False, max_resident_actions=0, report_path=None, profile_slowest=0, root_mode='LEGACY', extract_yaw=False, normalize_cycles=False, loop_threshold=10.0, dedup='OFF', journal_path=None, resume=True, checkpoint=None, normalize_start=True, target_fps=0, append=False):
+    # Generator doing the import one file per step: it yields (finished files, total files, last file) and stops
+    # with the result of get_all_anims. Sending True cancels the import after the current file, the finished
+    # actions are still post processed.
+    # files restricts the run to these names in source_dir, by default every file is imported
+    # streaming purges the data of every deleted armature before the next import, see streaming.py
+    # report_path gets the per file stage timings (.json or .csv), profile_slowest keeps cProfile dumps of the slowest files
+    # journal_path keeps the status of every file on disk (see journal.py): failing files no longer stop the run,
+    # finished ones are skipped when it is run again and checkpoint() is called after every finished file. Every file is
+    # then post processed on its own before it is marked done.
+    # normalize_start moves every action to start at frame 0, target_fps (0 keeps the rate) resamples them, see resample_keys
+    # dedup 'ALIAS' or 'SKIP' removes imported clips that repeat an action of the file or of the run, see dedup_actions
+    # append adds to an armature already in the scene: with delete_armatures every imported armature is then deleted
+    profile_dir = os.path.join(os.path.dirname(report_path) if report_path else source_dir, "mixamoroot_profiles")
+    with profiling.Profiler(report_path, profile_slowest, profile_dir) as profiler:
+        root_name = prefixed_name(name_prefix + root_bone_name, remove_prefix, name_prefix, target_prefix)
+        index = fingerprint_index(root_name=root_name) if dedup != 'OFF' else None
+        # Duplicates of offloaded actions, merged once the store has restored them
+        deferred = []
+
+        def finish(actions):
+            # Post processing of finished actions, duplicates are found on the imported keys, loops are closed
+            # before keys are reduced. Returns the actions with None for removed duplicates.
+            actions = list(actions)
+            if index is not None:
+                actions = dedup_actions(actions, dedup, root_name, index, store.offloaded if store else (), deferred)
+            result = actions
+            actions = [action for action in actions if action]
+            if normalize_start or target_fps:
+                resample_keys(actions, target_fps, 0.0 if normalize_start else None)
+            if normalize_cycles and insert_root:
+                with profiling.stage("loops"):
+                    normalize_loops(actions, root_name, prefixed_name(hip_bone_name, remove_prefix, name_prefix, target_prefix), loop_threshold, target_fps or None)
+            if decimate:
+                decimate_keys(actions, location_tolerance, rotation_tolerance)
+            ends.extend(action.frame_range[1] for action in actions)
+            return result
+
+        def finish_file(filepath):
+            # Post processes the action of one file and stores it in the cache. With a journal this runs before
+            # the file is marked done, so a resumed run never keeps raw keys of a skipped file.
+            action = finish([processed[filepath]])[0]
+            del processed[filepath]
+            if action and cache:
+                with profiling.stage("cache"):
+                    cache.store(filepath, action)
+            return action
+
+        files = os.listdir(source_dir) if files is None else list(files)
+        num_files = len(files)
+        area = bpy.context.area # None when running in the background
+        current_context = area.ui_type if area else None
+        old_objs = set(bpy.context.scene.objects)
+
+        cache = None
+        if use_cache:
+            try:
+                from .import_cache import ImportCache, CACHE_DIR_NAME
+            except ImportError:
+                from import_cache import ImportCache, CACHE_DIR_NAME
+            options = dict(root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, name_prefix=name_prefix, insert_root=insert_root, remove_prefix=remove_prefix, target_prefix=target_prefix,
+                           root_mode=root_mode, extract_yaw=extract_yaw)
+            if decimate:
+                options.update(location_tolerance=location_tolerance, rotation_tolerance=rotation_tolerance)
+            if normalize_cycles:
+                options.update(loop_threshold=loop_threshold)
+            if normalize_start or target_fps:
+                options.update(normalize_start=normalize_start, target_fps=target_fps)
+            cache = ImportCache(os.path.join(source_dir, CACHE_DIR_NAME), options, cache_size)
+            # Unchanged files are restored from the cache and never imported
+            files = [file for file in files if not file.endswith('.fbx') or cache.restore(os.path.join(source_dir, file)) is None]
+            num_files = len(files)
+        processed = {}
+        ends = []
+
+        journal = None
+        failures = []
+        if journal_path:
             try:
+                from . import journal as batch_journal
+            except ImportError:
+                import journal as batch_journal
+            journal = batch_journal.Journal(journal_path, resume)
+            # Finished files are skipped as long as their actions are still in the file
+            files = [file for file in files if not file.endswith('.fbx') or not journal.skip(os.path.join(source_dir, file), lambda name: name in bpy.data.actions)]
+            num_files = len(files)
+
+        templates = {}
+        store = None
+        try:
+            fbx_files = [file for file in files if not file.endswith('.DS_Store') and file.endswith('.fbx')]
+            native_files = []
+            kept_armature = None
+            if native_reader and delete_armatures and len(fbx_files) > 1:
+                # The last file is imported as the kept armature, the rest only need their actions read onto it
+                native_files = fbx_files[:-1]
+                files = fbx_files[-1:]
+                num_files = 1
+            elif workers > 1 and delete_armatures and len(fbx_files) > 1:
+                # Only the actions of deleted armatures are kept, so all but the last file can be parsed in worker processes
+                try:
+                    from . import fbx_pool
+                except ImportError:
+                    import fbx_pool
+                options = dict(root_bone_name=root_bone_name, hip_bone_name=hip_bone_name, remove_prefix=remove_prefix, name_prefix=name_prefix, insert_root=insert_root, target_prefix=target_prefix,
+                               root_mode=root_mode, extract_yaw=extract_yaw)
+                pooled_files = [os.path.join(source_dir, file) for file in fbx_files[:-1]]
+                if journal:
+                    # Every pooled file counts as an attempt, a crash of the pool leaves them running
+                    for filepath in pooled_files:
+                        journal.start(filepath)
+                with profiling.stage("pool"):
+                    actions, failed = fbx_pool.import_actions(pooled_files, workers, options)
+                if failed:
+                    log.error("[Mixamo Root] ERROR get_all_anims could not process %s" % ", ".join(failed))
+                    if journal is None:
+                        return -1
+                    for filepath, error in failed.items():
+                        journal.failed(filepath, error)
+                    failures += list(failed)
+                processed.update(actions)
+                if journal:
+                    for filepath in actions:
+                        try:
+                            action = finish_file(filepath)
+                            journal.done(filepath, [action.name] if action else [])
+                        except Exception as e:
+                            log.error("[Mixamo Root] ERROR get_all_anims raised %s when processing %s" % (str(e), filepath))
+                            journal.failed(filepath, e)
+                            failures.append(filepath)
+                            remove_action(processed.pop(filepath, None))
+                files = fbx_files[-1:]
+                num_files = 1
+
+            # Files done by the worker pool count as finished
+            finished = len(processed)
+            total = finished + len([file for file in files if not file.endswith('.DS_Store') and file.endswith('.fbx')]) + len(native_files)
+            if (yield (finished, total, None)):
+                files = []
+                native_files = []
+
+            if append and delete_armatures and not native_files and any(obj.type == 'ARMATURE' for obj in old_objs):
+                # The armature already in the scene is the kept one
+                num_files += 1
+
+            if streaming and delete_armatures:
+                try:
+                    from . import streaming as stream
+                except ImportError:
+                    import streaming as stream
+                existing = stream.snapshot()
+                store = stream.ActionStore(max_resident_actions)
+
+            for file in files:
+                print("file: " + str(file))
+                if not file.endswith('.DS_Store') and file.endswith('.fbx'):
+                    filepath = os.path.join(source_dir, file)
+                    scene_objects = set(bpy.context.scene.objects)
+                    counted = False
+                    try:
+                        if journal:
+                            journal.start(filepath)
+                        names = []
+                        with profiler.file(filepath) as record:
+                            # Armatures deleted after the import can share one prepared skeleton
+                            kept_armature = import_armature(filepath, root_bone_name, hip_bone_name, remove_prefix, name_prefix, insert_root, delete_armatures, engine, target_prefix, root_mode, extract_yaw,
+                                                            templates if delete_armatures and num_files > 1 else None)
+                            if kept_armature and kept_armature.animation_data:
+                                processed[filepath] = kept_armature.animation_data.action
+                                record["keys"] = key_count(processed[filepath])
+                                names = [processed[filepath].name] if processed[filepath] else []
+                            imported_objects = set(bpy.context.scene.objects) - old_objs
+                            if delete_armatures and num_files > 1:
+                                deleteArmature(imported_objects)
+                                num_files -= 1
+                                counted = True
+                                if store:
+                                    # The action is finished here, it may be offloaded after this
+                                    action = finish_file(filepath) if filepath in processed else None
+                                    names = [action.name] if action else []
+                                    if action:
+                                        store.add(action)
+                                    with profiling.stage("purge"):
+                                        stream.purge_orphans(existing)
+                            if journal and filepath in processed:
+                                action = finish_file(filepath)
+                                names = [action.name] if action else []
+                        if journal:
+                            journal.done(filepath, names, record["wall"])
+                            if checkpoint:
+                                checkpoint()
+
+                    except Exception as e:
+                        log.error("[Mixamo Root] ERROR get_all_anims raised %s when processing %s" % (str(e), file))
+                        if journal is None:
+                            return -1
+                        journal.failed(filepath, e)
+                        failures.append(filepath)
+                        # Nothing of the failed file is kept
+                        remove_action(processed.pop(filepath, None))
+                        leftovers = set(bpy.context.scene.objects) - scene_objects
+                        if kept_armature in leftovers:
+                            kept_armature = None
+                        if leftovers:
+                            deleteArmature(leftovers)
+                        if delete_armatures and not counted:
+                            num_files -= 1
+                    finished += 1
+                    if (yield (finished, total, file)):
+                        print("[Mixamo Root] Import cancelled after %d of %d files" % (finished, total))
+                        native_files = []
+                        break
+            if journal and native_files and kept_armature is None:
+                # The actions are read onto the kept armature, they are left for the next run
+                log.error("[Mixamo Root] ERROR get_all_anims has no armature to read %d files onto" % len(native_files))
+                failures += [os.path.join(source_dir, file) for file in native_files]
+                native_files = []
+            for file in native_files:
                 filepath = os.path.join(source_dir, file)
-                import_armature(filepath, root_bone_name, hip_bone_name, remove_prefix, name_prefix, insert_root, delete_armatures)
-                imported_objects = set(bpy.context.scene.objects) - old_objs
-                if delete_armatures and num_files > 1:
-                    deleteArmature(imported_objects)
-                    num_files -= 1
-
-
-            except Exception as e:
-                log.error("[Mixamo Root] ERROR get_all_anims raised %s when processing %s" % (str(e), file))
-                return -1
-    bpy.context.area.ui_type = current_context
-    bpy.context.scene.frame_start = 0
-    bpy.ops.object.mode_set(mode='OBJECT')
+                try:
+                    if journal:
+                        journal.start(filepath)
+                    with profiler.file(filepath) as record:
+                        processed[filepath] = import_animation(filepath, kept_armature, root_bone_name, hip_bone_name, remove_prefix, name_prefix, insert_root, target_prefix, root_mode, extract_yaw)
+                        record["keys"] = key_count(processed[filepath])
+                        if journal:
+                            action = finish_file(filepath)
+                            names = [action.name] if action else []
+                    if journal:
+                        journal.done(filepath, names, record["wall"])
+                        if checkpoint:
+                            checkpoint()
+                except Exception as e:
+                    log.error("[Mixamo Root] ERROR get_all_anims raised %s when processing %s" % (str(e), file))
+                    if journal is None:
+                        return -1
+                    journal.failed(filepath, e)
+                    failures.append(filepath)
+                    remove_action(processed.pop(filepath, None))
+                finished += 1
+                if (yield (finished, total, file)):
+                    print("[Mixamo Root] Import cancelled after %d of %d files" % (finished, total))
+                    break
 
-def apply_all_anims(delete_applied_armatures=False, control_rig=None, push_nla=False):
+        finally:
+            # Every exit, a failed file without a journal included, leaves the scene, the cache and the offloaded
+            # actions like a finished run
+            processed = dict(zip(processed, finish(processed.values())))
+            if cache:
+                with profiling.stage("cache"):
+                    for filepath, action in processed.items():
+                        if action:
+                            cache.store(filepath, action)
+                    cache.save()
+            if store:
+                store.restore()
+                merge_deferred_duplicates(deferred, dedup)
+            release_skeleton_templates(templates)
+            if area:
+                area.ui_type = current_context
+            fit_scene(bpy.context.scene, ends, normalize_start, target_fps)
+            bpy.ops.object.mode_set(mode='OBJECT')
+            if journal:
+                counts = journal.counts()
+                print("[Mixamo Root] Journal: %d done, %d failed, %d quarantined, %d skipped, see %s" % (
+                    counts.get(batch_journal.DONE, 0), counts.get(batch_journal.FAILED, 0), counts.get(batch_journal.QUARANTINED, 0), journal.skipped, journal_path))
+        if failures:
+            return -1
+
+def apply_all_anims(delete_applied_armatures=False, control_rig=None, push_nla=False, builtin_retarget=False, name_prefix="mixamorig:", hip_bone_name="mixamorig:Hips", nla_pack=False, nla_tracks=1, nla_gap=0.0, nla_align=1.0):
+    # push_nla pushes every created action to its own track at its own start frame. With nla_pack they are
+    # laid out on nla_tracks tracks once they all exist instead, see layout_nla
     if control_rig and control_rig.type == 'ARMATURE':
         bpy.ops.object.mode_set(mode='OBJECT')
 
         imported_objects = set(bpy.context.scene.objects)
         imported_armatures = [x for x in imported_objects if x.type == 'ARMATURE' and x.name != control_rig.name]
+        # Built-in retargeting: one Retargeter per distinct source rig, reused for all its imports
+        retargeters = {}
+        pushed = []
 
         for obj in imported_armatures:
             action_name = obj.animation_data.action.name
-            bpy.context.scene.mix_source_armature = obj
-            bpy.context.view_layer.objects.active = control_rig
+            if builtin_retarget:
+                key = retarget.rig_key(obj)
+                if key not in retargeters:
+                    retargeters[key] = retarget.Retargeter(obj, control_rig, name_prefix=name_prefix, hip_bone_name=hip_bone_name)
+                if control_rig.animation_data is None:
+                    control_rig.animation_data_create()
+                control_rig.animation_data.action = retargeters[key].retarget(obj.animation_data.action, 'ctrl_' + action_name)
+            else:
+                bpy.context.scene.mix_source_armature = obj
+                bpy.context.view_layer.objects.active = control_rig
 
-            bpy.ops.mr.import_anim_to_rig()
+                bpy.ops.mr.import_anim_to_rig()
 
             bpy.context.view_layer.objects.active = control_rig
             selected_action = control_rig.animation_data.action
             selected_action.name = 'ctrl_' + action_name
             # created_actions.append(selected_action)
 
-            if push_nla:
+            if push_nla and nla_pack:
+                # Kept alive until the strips are created below
+                selected_action.use_fake_user = True
+                pushed.append(selected_action)
+            elif push_nla:
                 push(control_rig, selected_action, None, int(selected_action.frame_start))
 
             if delete_applied_armatures:
                 bpy.context.view_layer.objects.active = control_rig
                 deleteArmature(set([obj]))
 
+        if pushed:
+            layout_nla(control_rig, pushed, nla_tracks, nla_gap, nla_align)
+            # The strips are their users now
+            for action in pushed:
+                action.use_fake_user = False
+
 
 if __name__ == "__main__":
-    dir_path = "" # If using script in place please set this before running.
-    get_all_anims(dir_path)
-    print("[Mixamo Root] Run as plugin, or copy script in text editor while setting parameter defaults.")
+    if "--" in sys.argv:
+        # blender -b -P mixamoroot.py -- --src <dir> --out <file.blend> --jobs N, see batch.py
+        try:
+            from . import batch
+        except ImportError:
+            import batch
+        batch.main(sys.argv[sys.argv.index("--") + 1:])
+    else:
+        dir_path = "" # If using script in place please set this before running.
+        get_all_anims(dir_path)
+        print("[Mixamo Root] Run as plugin, or copy script in text editor while setting parameter defaults.")
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Stage timing for get_all_anims. The pipeline functions are wrapped with @timed("stage") or
+# `with stage("name"):`, which cost nothing unless a Profiler is active. Per file the profiler
+# records the wall time and resident memory change of every stage and the key count of the
+# result, and it can keep cProfile dumps of the slowest files. Stages can be nested, their
+# self time leaves out the stages inside them. Nothing here needs bpy.
+import os
+import csv
+import json
+import time
+import cProfile
+import functools
+import contextlib
+
+
+# The profiler of the running import, and the summary of the last one for the panel
+active = None
+last_summary = []
+# psutil.Process of this process, False once psutil turned out to be missing
+process = None
+
+
+def resident_memory():
+    # Resident set size in bytes, 0 when the platform gives no way to read it
+    global process
+    if process is None:
+        try:
+            import psutil
+            process = psutil.Process()
+        except ImportError:
+            process = False
+    if process:
+        return process.memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+@contextlib.contextmanager
+def stage(name):
+    profiler = active
+    if profiler is None:
+        yield
+        return
+    memory = resident_memory()
+    start = time.perf_counter()
+    # Time spent in the stages nested in this one
+    profiler.nested.append(0.0)
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        nested = profiler.nested.pop()
+        if profiler.nested:
+            profiler.nested[-1] += wall
+        profiler.add(name, wall, resident_memory() - memory, wall - nested)
+
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    '''Stage timings of one import run, one record per file'''
+
+    def __init__(self, report_path=None, profile_slowest=0, profile_dir=None):
+        self.report_path = report_path
+        self.records = []
+        self.current = None
+        # Stages outside of any file, like the pool or the final decimation
+        self.run = {"file": "(run)", "wall": 0.0, "memory": 0, "keys": 0, "stages": {}}
+        self.profile_slowest = profile_slowest
+        self.profile_dir = profile_dir
+        # (wall, path) of the kept cProfile dumps
+        self.dumps = []
+        self.nested = []
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        global active
+        active = self
+        return self
+
+    def __exit__(self, *exc):
+        global active, last_summary
+        active = None
+        self.run["wall"] = time.perf_counter() - self.start
+        last_summary = self.summary()
+        if self.report_path:
+            self.write(self.report_path)
+        return False
+
+    @contextlib.contextmanager
+    def file(self, filepath):
+        record = {"file": os.path.basename(filepath), "wall": 0.0, "memory": 0, "keys": 0, "stages": {}}
+        self.current = record
+        profile = cProfile.Profile() if self.profile_slowest else None
+        memory = resident_memory()
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile:
+                profile.disable()
+            record["wall"] = time.perf_counter() - start
+            record["memory"] = resident_memory() - memory
+            self.records.append(record)
+            self.current = None
+            if profile:
+                self.keep_profile(record, profile)
+
+    def add(self, name, wall, memory, self_wall=None):
+        stages = (self.current or self.run)["stages"]
+        entry = stages.setdefault(name, {"wall": 0.0, "self": 0.0, "memory": 0, "calls": 0})
+        entry["wall"] += wall
+        entry["self"] += wall if self_wall is None else self_wall
+        entry["memory"] += memory
+        entry["calls"] += 1
+
+    def keep_profile(self, record, profile):
+        # Only the dumps of the profile_slowest slowest files so far are kept on disk
+        if len(self.dumps) >= self.profile_slowest and record["wall"] <= self.dumps[0][0]:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, os.path.splitext(record["file"])[0] + ".prof")
+        profile.dump_stats(path)
+        self.dumps.append((record["wall"], path))
+        self.dumps.sort()
+        while len(self.dumps) > self.profile_slowest:
+            _wall, removed = self.dumps.pop(0)
+            try:
+                os.remove(removed)
+            except OSError:
+                pass
+
+    def totals(self):
+        # {stage: summed self time} over every file, nested stages are not counted twice
+        totals = {}
+        for record in self.records + [self.run]:
+            for name, entry in record["stages"].items():
+                totals[name] = totals.get(name, 0.0) + entry["self"]
+        return totals
+
+    def summary(self, count=3):
+        # A few short lines for the panel
+        wall = time.perf_counter() - self.start
+        lines = ["%d files in %.1fs" % (len(self.records), wall)]
+        for name, total in sorted(self.totals().items(), key=lambda item: item[1], reverse=True)[:count]:
+            lines.append("%s: %.1fs (%d%%)" % (name, total, 100.0 * total / wall if wall else 0.0))
+        return lines
+
+    def write(self, path):
+        # .csv gets one row per file and stage, anything else the JSON report
+        if path.lower().endswith(".csv"):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["file", "stage", "wall", "memory", "calls", "keys", "self"])
+                for record in self.records + [self.run]:
+                    writer.writerow([record["file"], "total", "%.6f" % record["wall"], record["memory"], 1, record["keys"], "%.6f" % record["wall"]])
+                    for name, entry in record["stages"].items():
+                        writer.writerow([record["file"], name, "%.6f" % entry["wall"], entry["memory"], entry["calls"], "", "%.6f" % entry["self"]])
+        else:
+            with open(path, 'w') as f:
+                json.dump({"files": self.records, "run": self.run, "totals": self.totals(), "profiles": [dump for _wall, dump in self.dumps]}, f, indent=1)
+        print("[Mixamo Root] Import report written to " + path)
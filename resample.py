@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Start frame and frame rate normalization of the imported actions. The keys of an import are
+# placed at the frame rate of its file; an action is moved to start at start_frame and, with a
+# target rate, sampled again on whole frames of that rate plus its last key. Channels sharing
+# their key frames are evaluated together as one (frames, channels) array, linear between keys,
+# and the 4 channels of a rotation_quaternion are interpolated with slerp. The new keys are linear.
+import numpy as np
+
+try:
+    from .keyframes import Channel, KeyframeBuffer, read_action, write_action
+except ImportError:
+    from keyframes import Channel, KeyframeBuffer, read_action, write_action
+
+
+INTERPOLATION_LINEAR = 1
+
+
+def interpolation_weights(frames, positions):
+    # Indices of the keys before and after every position and the blend between them,
+    # held constant outside the keys like Blender's constant extrapolation
+    positions = np.clip(positions, frames[0], frames[-1])
+    after = np.clip(np.searchsorted(frames, positions, side='right'), 1, len(frames) - 1)
+    before = after - 1
+    span = frames[after] - frames[before]
+    t = np.where(span > 0.0, (positions - frames[before]) / np.where(span > 0.0, span, 1.0), 0.0)
+    return before, after, t
+
+def lerp(values, before, after, t):
+    # values (keys, channels) to (positions, channels)
+    return values[before] * (1.0 - t[:, None]) + values[after] * t[:, None]
+
+def slerp(quaternions, before, after, t):
+    # quaternions (keys, groups, 4) to (positions, groups, 4), along the shorter arc
+    q0 = quaternions[before]
+    q1 = quaternions[after]
+    dots = np.einsum('pgi,pgi->pg', q0, q1)
+    q1 = np.where(dots[..., None] < 0.0, -q1, q1)
+    dots = np.abs(dots)
+    angles = np.arccos(np.clip(dots, -1.0, 1.0))
+    sin = np.sin(angles)
+    close = sin < 1e-6
+    safe = np.where(close, 1.0, sin)
+    t = np.broadcast_to(t[:, None], angles.shape)
+    w0 = np.where(close, 1.0 - t, np.sin((1.0 - t) * angles) / safe)
+    w1 = np.where(close, t, np.sin(t * angles) / safe)
+    result = w0[..., None] * q0 + w1[..., None] * q1
+    return result / np.maximum(np.linalg.norm(result, axis=-1, keepdims=True), 1e-12)
+
+def resample_channels(channels, source_fps, target_fps=None, start_frame=0.0):
+    # Channels of one action moved to start at start_frame (None keeps the start), and sampled at target_fps
+    # when it differs from source_fps
+    keyed = [channel for channel in channels if len(channel.keys)]
+    if not keyed:
+        return channels
+    first = min(channel.keys.frames[0] for channel in keyed)
+    last = max(channel.keys.frames[-1] for channel in keyed)
+    if start_frame is None:
+        start_frame = first
+    if not target_fps or abs(target_fps - source_fps) < 1e-9:
+        # Only the start moves, the keys stay as they are
+        for channel in keyed:
+            channel.keys.offset(frames=start_frame - first)
+        return channels
+
+    ratio = source_fps / target_fps
+    count = int(np.floor((last - first) / ratio + 1e-6)) + 1
+    positions = first + np.arange(count) * ratio
+    new_frames = start_frame + np.arange(count, dtype=np.float64)
+    if last - positions[-1] > 1e-6 * ratio:
+        # The last key is kept, off the whole frames, so a loop still closes on it
+        positions = np.append(positions, last)
+        new_frames = np.append(new_frames, start_frame + (last - first) / ratio)
+        count += 1
+    interpolation = np.full(count, INTERPOLATION_LINEAR)
+
+    # Channels grouped by their key frames, complete quaternions apart
+    groups = {}
+    for channel in keyed:
+        prop = channel.data_path.rpartition('.')[2]
+        groups.setdefault((channel.keys.frames.tobytes(), prop == 'rotation_quaternion'), []).append(channel)
+
+    resampled = {}
+    for (_frames, is_quaternion), members in groups.items():
+        frames = members[0].keys.frames
+        if len(frames) == 1:
+            for channel in members:
+                resampled[id(channel)] = np.full(count, channel.keys.values[0])
+            continue
+        before, after, t = interpolation_weights(frames, positions)
+        paths = {}
+        for channel in members:
+            paths.setdefault(channel.data_path, {})[channel.array_index] = channel
+        quaternions = [components for components in paths.values() if is_quaternion and sorted(components) == [0, 1, 2, 3]]
+        if quaternions:
+            stacked = np.stack([np.column_stack([components[index].keys.values for index in range(4)]) for components in quaternions], axis=1)
+            values = slerp(stacked, before, after, t)
+            for group, components in enumerate(quaternions):
+                for index in range(4):
+                    resampled[id(components[index])] = values[:, group, index]
+        rest = [channel for channel in members if id(channel) not in resampled]
+        if rest:
+            values = lerp(np.column_stack([channel.keys.values for channel in rest]), before, after, t)
+            for column, channel in enumerate(rest):
+                resampled[id(channel)] = values[:, column]
+
+    result = []
+    for channel in channels:
+        if id(channel) in resampled:
+            keys = KeyframeBuffer(np.column_stack((new_frames, resampled[id(channel)])), interpolation=interpolation)
+            channel = Channel(channel.data_path, channel.array_index, channel.group, keys)
+        result.append(channel)
+    return result
+
+def resample_action(action, source_fps, target_fps=None, start_frame=0.0):
+    channels = read_action(action)
+    write_action(action, resample_channels(channels, source_fps, target_fps, start_frame))
+    return action
+
+def resample_actions(actions, source_fps, target_fps=None, start_frame=0.0):
+    seen = set()
+    for action in actions:
+        if action and action.name not in seen:
+            seen.add(action.name)
+            resample_action(action, source_fps, target_fps, start_frame)
+    if seen:
+        if target_fps and abs(target_fps - source_fps) >= 1e-9:
+            print("[Mixamo Root] Resampled %d actions from %g to %g fps" % (len(seen), source_fps, target_fps))
+        elif start_frame is not None:
+            print("[Mixamo Root] Moved %d actions to start at frame %g" % (len(seen), start_frame))
+    return len(seen)
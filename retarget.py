@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Built-in retargeting of imported Mixamo armatures onto a control rig, used by apply_all_anims
+# instead of baking bpy.ops.mr.import_anim_to_rig frame by frame through the depsgraph.
+# The bone map and the rest pose corrections are computed once per source/control rig pair,
+# then every frame of an action is solved at once as (frames, 4, 4) matrix batches:
+#   source pose    G_s = G_s(parent) @ rest_s @ basis_s
+#   control pose   G_t = G_s @ inv(world_rest_s) @ world_rest_t
+#   control basis  basis_t = inv(G_t(parent) @ rest_t) @ G_t
+# Only the hips keep their translation, scaled by the ratio of the hips heights, every other
+# control bone is rotated around its rest position. Only the FK controls are driven.
+import hashlib
+import logging
+
+import numpy as np
+
+try:
+    from . import transforms
+    from . import fk
+    from .fk import rest_matrices
+    from .keyframes import Channel, KeyframeBuffer, write_action
+except ImportError:
+    import transforms
+    import fk
+    from fk import rest_matrices
+    from keyframes import Channel, KeyframeBuffer, write_action
+
+
+log = logging.getLogger(__name__)
+
+CONTROL_PREFIX = "Ctrl_"
+INTERPOLATION_LINEAR = 1
+
+
+def control_candidates(name, name_prefix="mixamorig:"):
+    # Names a Mixamo bone can have on the control rig, most specific first
+    base = name[len(name_prefix):] if name_prefix and name.startswith(name_prefix) else name
+    candidates = [name, base, CONTROL_PREFIX + base, CONTROL_PREFIX + base + "_FK"]
+    for side in ("Left", "Right"):
+        if base.startswith(side) and len(base) > len(side):
+            part = base[len(side):]
+            candidates += [CONTROL_PREFIX + part + "_FK_" + side, CONTROL_PREFIX + part + "_" + side]
+    return candidates
+
+def map_bones(source_names, target_names, name_prefix="mixamorig:", hip_bone_name="mixamorig:Hips"):
+    # {source bone: control bone}, the hips always go to Ctrl_Hips when the rig has one
+    targets = set(target_names)
+    mapping = {}
+    for name in source_names:
+        candidates = control_candidates(name, name_prefix)
+        if name == hip_bone_name:
+            candidates.insert(0, CONTROL_PREFIX + "Hips")
+        for candidate in candidates:
+            if candidate in targets and candidate not in mapping.values():
+                mapping[name] = candidate
+                break
+    return mapping
+
+def rig_key(armature):
+    # Two imports of the same Mixamo character share their rest pose, so they share a Retargeter
+    # and a skeleton template. Covers the bone names, hierarchy and rest matrices.
+    digest = hashlib.sha1()
+    for bone in armature.data.bones:
+        digest.update(bone.name.encode())
+        digest.update(b"/" + (bone.parent.name.encode() if bone.parent else b""))
+        digest.update(np.round(np.array(bone.matrix_local, dtype=np.float64), 5).tobytes())
+    digest.update(np.round(np.array(armature.matrix_world, dtype=np.float64), 5).tobytes())
+    return digest.hexdigest()
+
+
+class Retargeter:
+    '''Bone map and rest pose corrections from one source armature to a control rig'''
+
+    def __init__(self, source, control_rig, name_prefix="mixamorig:", hip_bone_name="mixamorig:Hips", bone_map=None):
+        self.source_world = np.array(source.matrix_world, dtype=np.float64)
+        self.target_world = np.array(control_rig.matrix_world, dtype=np.float64)
+        self.source_rest, source_absolute = rest_matrices(source)
+        self.target_rest, target_absolute = rest_matrices(control_rig)
+        self.source_parents = {bone.name: bone.parent.name if bone.parent else None for bone in source.data.bones}
+        self.target_parents = {bone.name: bone.parent.name if bone.parent else None for bone in control_rig.data.bones}
+        self.source_modes = {pb.name: pb.rotation_mode for pb in source.pose.bones}
+        self.target_modes = {pb.name: pb.rotation_mode for pb in control_rig.pose.bones}
+
+        self.mapping = bone_map or map_bones(self.source_rest, self.target_rest, name_prefix, hip_bone_name)
+        self.sources = {target: source_name for source_name, target in self.mapping.items()}
+        # Rotation offset of every mapped pair at rest, in world space
+        self.offsets = {name: np.linalg.inv(source_absolute[name]) @ target_absolute[target] for name, target in self.mapping.items()}
+
+        # The hips may have lost their prefix on import, then they are found through Ctrl_Hips
+        self.hips = self.mapping.get(hip_bone_name) or (CONTROL_PREFIX + "Hips" if CONTROL_PREFIX + "Hips" in self.sources else None)
+        self.height_ratio = 1.0
+        if self.hips:
+            self.source_hips_rest = source_absolute[self.sources[self.hips]][:3, 3]
+            self.target_hips_rest = target_absolute[self.hips][:3, 3]
+            if abs(self.source_hips_rest[2]) > 1e-6:
+                self.height_ratio = self.target_hips_rest[2] / self.source_hips_rest[2]
+        if len(self.mapping) < len(self.source_rest):
+            log.warning("[Mixamo Root] Retarget: %d of %d bones have no control bone" % (len(self.source_rest) - len(self.mapping), len(self.source_rest)))
+
+    def sample(self, action):
+        # Frames and {bone: (frames, 4, 4) pose basis} of the source bones the action animates
+        return fk.sample_basis(action, {name: self.source_modes.get(name, 'QUATERNION') for name in self.source_rest})
+
+    def solve(self, frames, basis):
+        # {control bone: (location, rotation)} of every mapped control bone
+        source_pose = fk.evaluate(self.source_rest, self.source_parents, basis, len(frames), self.source_world)
+
+        solved = {}
+        target_pose = {}
+        for name, rest in self.target_rest.items():
+            parent = self.target_parents[name]
+            rest_pose = (target_pose[parent] if parent else self.target_world) @ rest
+            source_name = self.sources.get(name)
+            if source_name is None:
+                target_pose[name] = np.broadcast_to(rest_pose, (len(frames), 4, 4)) if rest_pose.ndim == 2 else rest_pose
+                continue
+            pose = source_pose[source_name] @ self.offsets[source_name]
+            if name == self.hips:
+                moved = source_pose[source_name][:, :3, 3] - self.source_hips_rest
+                pose[:, :3, 3] = self.target_hips_rest + moved * self.height_ratio
+            local = np.linalg.inv(rest_pose) @ pose
+            location, rotation, _scale = transforms.decompose(local)
+            if name != self.hips:
+                location[:] = 0.0
+            rotation = transforms.make_compatible(rotation)
+            solved[name] = (location, rotation)
+            target_pose[name] = rest_pose @ transforms.translation_matrices(location) @ transforms.quaternion_matrices(rotation)
+        return solved
+
+    def channels(self, frames, solved):
+        channels = []
+        interpolation = np.full(len(frames), INTERPOLATION_LINEAR)
+
+        def add(name, prop, samples):
+            data_path = 'pose.bones["{}"].{}'.format(name, prop)
+            for index in range(samples.shape[1]):
+                keys = KeyframeBuffer(np.column_stack((frames, samples[:, index])), interpolation=interpolation)
+                channels.append(Channel(data_path, index, name, keys))
+
+        for name, (location, rotation) in solved.items():
+            if name == self.hips:
+                add(name, 'location', location)
+            mode = self.target_modes.get(name, 'QUATERNION')
+            if mode == 'QUATERNION':
+                add(name, 'rotation_quaternion', rotation)
+            elif mode == 'XYZ':
+                add(name, 'rotation_euler', transforms.matrix_eulers_xyz(transforms.quaternion_matrices(rotation)))
+            else:
+                log.warning("[Mixamo Root] Retarget: rotation mode %s of %s is not supported, bone skipped" % (mode, name))
+        return channels
+
+    def retarget(self, action, name):
+        # New action on the control rig's bones with the motion of a source action. bpy is only
+        # needed here, the rest of the module works on plain matrices and runs outside Blender.
+        import bpy
+        frames, basis = self.sample(action)
+        if not len(frames):
+            log.warning("[Mixamo Root] Retarget: " + action.name + " has no keys on the source bones")
+        result = bpy.data.actions.new(name)
+        if len(frames):
+            write_action(result, self.channels(frames, self.solve(frames, basis)))
+        return result
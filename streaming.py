@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Streaming import support. Deleting an imported armature leaves its meshes, materials, images
+# and armature data in bpy.data until the file is reloaded, so get_all_anims(streaming=True)
+# purges what each file left behind before importing the next one. Finished actions can also be
+# moved out to library .blend files past a threshold and are appended back once the run is done.
+import os
+import shutil
+import logging
+import tempfile
+
+import bpy
+
+
+log = logging.getLogger(__name__)
+
+# Data an FBX import creates besides the objects and the action
+PURGE_COLLECTIONS = ('meshes', 'materials', 'images', 'textures', 'armatures', 'node_groups', 'cameras', 'lights', 'curves')
+
+
+def snapshot():
+    # Data blocks present before the run, they are never purged
+    return {name: set(getattr(bpy.data, name)) for name in PURGE_COLLECTIONS}
+
+def purge_orphans(existing):
+    # Removes data blocks without users created since the snapshot, repeated because
+    # removing a material can orphan its images. Returns the number removed.
+    removed = 0
+    while True:
+        orphans = []
+        for name in PURGE_COLLECTIONS:
+            orphans += [block for block in getattr(bpy.data, name) if block.users == 0 and block not in existing[name]]
+        if not orphans:
+            return removed
+        bpy.data.batch_remove(orphans)
+        removed += len(orphans)
+
+
+class ActionStore:
+    '''Finished actions of a streaming import, written out to library files past max_resident'''
+
+    def __init__(self, max_resident=0):
+        self.max_resident = max_resident
+        self.resident = []
+        self.libraries = []
+        self.offload_dir = None
+        # Names of the actions in the library files, they are missing from bpy.data until restore()
+        self.offloaded = set()
+
+    def add(self, action):
+        # The action outlives its deleted armature
+        action.use_fake_user = True
+        self.resident.append(action)
+        if self.max_resident and len(self.resident) > self.max_resident:
+            self.offload()
+
+    def offload(self):
+        if self.offload_dir is None:
+            self.offload_dir = tempfile.mkdtemp(prefix="mixamoroot_actions_")
+        path = os.path.join(self.offload_dir, "actions%03d.blend" % len(self.libraries))
+        bpy.data.libraries.write(path, set(self.resident), fake_user=True)
+        for action in self.resident:
+            self.offloaded.add(action.name)
+            bpy.data.actions.remove(action)
+        self.libraries.append(path)
+        print("[Mixamo Root] Offloaded %d actions to %s" % (len(self.resident), path))
+        self.resident = []
+
+    def restore(self):
+        # Appends the offloaded actions back into the file and removes the library files
+        for path in self.libraries:
+            with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+                data_to.actions = list(data_from.actions)
+            for action in data_to.actions:
+                if action:
+                    action.use_fake_user = True
+        if self.offload_dir:
+            shutil.rmtree(self.offload_dir, ignore_errors=True)
+        self.libraries = []
+        self.offload_dir = None
+        self.offloaded = set()
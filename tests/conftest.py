@@ -0,0 +1,6 @@
+# The modules under test sit in the add-on root and are imported as top level modules,
+# like Blender does when mixamoroot.py runs as a script. Only bpy-free modules are tested.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,146 @@
+# Stand-ins for the few bpy types the bpy-free modules touch: F-curves with bulk keyframe
+# access, actions, and armatures with their bones.
+import numpy as np
+
+
+class KeyframePoints:
+    '''FCurveKeyframePoints with foreach_get/foreach_set and add, without per key removal'''
+
+    SHAPES = {'co': 2, 'handle_left': 2, 'handle_right': 2, 'interpolation': 1, 'handle_left_type': 1, 'handle_right_type': 1}
+
+    def __init__(self, count=0):
+        self.arrays = {}
+        self.add(count)
+
+    def __len__(self):
+        return len(self.arrays['co'])
+
+    def add(self, count):
+        for attr, size in self.SHAPES.items():
+            dtype = np.float32 if size == 2 else np.int32
+            grown = np.zeros((count, size), dtype=dtype)
+            self.arrays[attr] = np.concatenate((self.arrays[attr], grown)) if attr in self.arrays else grown
+
+    def foreach_get(self, attr, out):
+        out[:] = self.arrays[attr].ravel()
+
+    def foreach_set(self, attr, values):
+        self.arrays[attr][...] = np.asarray(values).reshape(self.arrays[attr].shape)
+
+
+class ClearableKeyframePoints(KeyframePoints):
+    '''KeyframePoints of Blender versions with keyframe_points.clear()'''
+
+    def clear(self):
+        for attr in self.SHAPES:
+            self.arrays[attr] = self.arrays[attr][:0]
+
+
+class Group:
+    def __init__(self, name):
+        self.name = name
+
+
+class FCurve:
+    def __init__(self, data_path, array_index=0, group="", points=ClearableKeyframePoints, action=None):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.group = Group(group) if group else None
+        self.keyframe_points = points()
+        self.id_data = action
+        self.extrapolation = 'CONSTANT'
+        self.mute = False
+        self.lock = False
+        self.hide = False
+        self.select = False
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+    def set_keys(self, co, handle_left=None, handle_right=None, interpolation=None):
+        co = np.asarray(co, dtype=np.float32).reshape(-1, 2)
+        points = self.keyframe_points
+        points.add(len(co) - len(points))
+        points.arrays['co'][...] = co
+        points.arrays['handle_left'][...] = co if handle_left is None else handle_left
+        points.arrays['handle_right'][...] = co if handle_right is None else handle_right
+        if interpolation is not None:
+            points.arrays['interpolation'][:, 0] = interpolation
+        return self
+
+
+class FCurves(list):
+    def __init__(self, action, points=ClearableKeyframePoints):
+        super().__init__()
+        self.action = action
+        self.points = points
+
+    def new(self, data_path, index=0, action_group=""):
+        fcurve = FCurve(data_path, index, action_group, self.points, self.action)
+        self.append(fcurve)
+        return fcurve
+
+    def find(self, data_path, index=0):
+        for fcurve in self:
+            if fcurve.data_path == data_path and fcurve.array_index == index:
+                return fcurve
+        return None
+
+
+class Action:
+    def __init__(self, name="Action", points=ClearableKeyframePoints):
+        self.name = name
+        self.fcurves = FCurves(self, points)
+
+    @property
+    def frame_range(self):
+        frames = [fcurve.keyframe_points.arrays['co'][:, 0] for fcurve in self.fcurves if len(fcurve.keyframe_points)]
+        if not frames:
+            return (1.0, 1.0)
+        frames = np.concatenate(frames)
+        return (float(frames.min()), float(frames.max()))
+
+    def key(self, data_path, index, frames, values):
+        return self.fcurves.new(data_path, index).set_keys(np.column_stack((frames, values)))
+
+
+class Bone:
+    def __init__(self, name, matrix_local, parent=None, length=1.0):
+        self.name = name
+        self.matrix_local = np.asarray(matrix_local, dtype=np.float64)
+        self.parent = parent
+        self.length = length
+
+    @property
+    def parent_recursive(self):
+        parents = []
+        bone = self.parent
+        while bone:
+            parents.append(bone)
+            bone = bone.parent
+        return parents
+
+
+class PoseBone:
+    def __init__(self, name, rotation_mode='QUATERNION'):
+        self.name = name
+        self.rotation_mode = rotation_mode
+
+
+class Armature:
+    '''An armature object: matrix_world, data.bones and pose.bones'''
+
+    class Data:
+        def __init__(self, bones):
+            self.bones = bones
+
+    class Pose:
+        def __init__(self, bones):
+            self.bones = bones
+
+    def __init__(self, name, bones, matrix_world=np.eye(4), rotation_modes=None):
+        self.name = name
+        self.matrix_world = np.asarray(matrix_world, dtype=np.float64)
+        self.data = Armature.Data(bones)
+        self.pose = Armature.Pose([PoseBone(bone.name, (rotation_modes or {}).get(bone.name, 'QUATERNION')) for bone in bones])
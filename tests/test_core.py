@@ -0,0 +1,168 @@
+# Root motion math without Blender: the legacy key edits against the copyHips and copy_hips_nla
+# loops they replaced, and the explicit modes checked where they show, the world space motion
+# the root and the hips end up with.
+import numpy as np
+import pytest
+
+import core
+import transforms
+from keyframes import KeyframeBuffer
+from fakes import FCurve
+
+
+FRAMES = np.arange(3.0, 11.0)
+HIPS = np.array([
+    [0.5, -1.25, 3.0, -0.001, 0.0, 2.5, -7.0, 1.0],
+    [1.0, -0.5, 0.25, 2.0, -3.0, 0.0, 0.75, -0.1],
+    [-2.0, 4.0, 0.0, -0.25, 1.5, -1.0, 3.5, 0.2],
+])
+
+
+def hips_curves(axes=(0, 1, 2)):
+    # Hips location curves with handles off the keys, so an edit touching them shows
+    curves = {}
+    for axis in axes:
+        co = np.column_stack((FRAMES, HIPS[axis]))
+        curves[axis] = FCurve('pose.bones["mixamorig:Hips"].location', axis).set_keys(co, co - (0.3, 0.1), co + (0.3, 0.2))
+    return curves
+
+
+def old_copy(fcurves, frame_offset=0.0, minimum=None, maximum=None):
+    # What graph.copy/paste and the keyframe_points loops left: the pasted keys moved by the frame
+    # offset, then only keys past the bound set to it, one key at a time
+    co = fcurves.keyframe_points.arrays['co'].astype(np.float64) + (frame_offset, 0.0)
+    handles = [fcurves.keyframe_points.arrays[attr].astype(np.float64) + (frame_offset, 0.0) for attr in ('handle_left', 'handle_right')]
+    for key in co:
+        if minimum is not None and key[1] < minimum:
+            key[1] = minimum
+        if maximum is not None and key[1] > maximum:
+            key[1] = maximum
+    return co, handles
+
+
+def assert_keys(keys, expected):
+    co, (handle_left, handle_right) = expected
+    assert np.array_equal(keys.co.astype(np.float32), co.astype(np.float32))
+    assert np.array_equal(keys.handle_left.astype(np.float32), handle_left.astype(np.float32))
+    assert np.array_equal(keys.handle_right.astype(np.float32), handle_right.astype(np.float32))
+
+
+def test_import_keys_match_copy_hips():
+    curves = hips_curves()
+    root, hips = core.root_motion_keys({axis: KeyframeBuffer.read(fc) for axis, fc in curves.items()}, 'IMPORT')
+    # graph.paste puts the first key on frame 0, the root Y is clamped to >= 0
+    for axis in range(3):
+        assert_keys(root[axis], old_copy(curves[axis], -FRAMES[0], minimum=0.0 if axis == 1 else None))
+    # The hips keep only Y, clamped to <= 0
+    assert hips[0] is None and hips[2] is None
+    assert_keys(hips[1], old_copy(curves[1], maximum=0.0))
+
+
+def test_import_keys_without_a_hips_axis_keep_the_rest_key():
+    curves = hips_curves((0, 1))
+    root, hips = core.root_motion_keys({axis: KeyframeBuffer.read(fc) for axis, fc in curves.items()}, 'IMPORT')
+    # keyframe_insert_menu keyed the rest value on frame 0, nothing was pasted over it
+    assert np.array_equal(root[2].co, [[0.0, 0.0]])
+    assert set(hips) == {0, 1}
+
+
+def test_nla_keys_match_copy_hips_nla():
+    curves = hips_curves((0, 2))
+    root, hips = core.root_motion_keys({axis: KeyframeBuffer.read(fc) for axis, fc in curves.items()}, 'NLA', FRAMES[0])
+    # Pasted in place, the root Z kept >= 0 and the rest key on the strip's first frame
+    assert_keys(root[0], old_copy(curves[0]))
+    assert_keys(root[2], old_copy(curves[2], minimum=0.0))
+    assert np.array_equal(root[1].co, [[FRAMES[0], 0.0]])
+    # Every hips location curve is removed
+    assert hips == {0: None, 2: None}
+
+
+# Rest orientations of an imported Mixamo rig: the root's Y and the hips' Y point up the world Z
+ROOT_REST = transforms.axis_rotations(np.array([np.pi / 2]), 0)[0][:3, :3]
+HIPS_REST = transforms.axis_rotations(np.array([np.pi / 2]), 0)[0][:3, :3] @ transforms.axis_rotations(np.array([0.3]), 1)[0][:3, :3]
+# The hips walk forward (-Y) and rise
+TRAVEL = np.array([[0.0, 0.0, 0.0], [0.0, -0.5, 0.25], [0.0, -1.0, 0.5]])
+
+
+def split(world, mode, ground=None):
+    # Hips travel in world axes to the world travel of the root and of the hips, set up like
+    # mixamoroot.root_motion_actions does it
+    axes = np.linalg.inv(ROOT_REST)
+    location = world @ np.linalg.inv(HIPS_REST).T
+    root, _root_rotation, hips, _hips_rotation = core.extract_root_motion(
+        location, None, axes @ HIPS_REST, axes @ [0.0, 0.0, 1.0], mode, ground=ground, axes=axes)
+    return root @ ROOT_REST.T, hips @ HIPS_REST.T
+
+
+@pytest.mark.parametrize("mode, root_travel", [
+    ('XY', [[0.0, 0.0, 0.0], [0.0, -0.5, 0.0], [0.0, -1.0, 0.0]]),
+    ('XYZ', TRAVEL),
+    ('GROUND', [[0.0, 0.0, 0.0], [0.0, -0.5, 0.0], [0.0, -1.0, 0.0]]),
+    ('CONTACT', [[0.0, 0.0, 0.0], [0.0, -0.5, 0.1], [0.0, -1.0, 0.2]]),
+])
+def test_world_split_per_mode(mode, root_travel):
+    root, hips = split(TRAVEL, mode, ground=[0.0, 0.1, 0.2] if mode == 'CONTACT' else None)
+    assert np.allclose(root, root_travel)
+    # Whatever the root does not take stays on the hips
+    assert np.allclose(root + hips, TRAVEL)
+
+
+def test_root_height_never_goes_below_the_ground():
+    root, hips = split(np.array([[0.5, 0.0, -0.25]]), 'XYZ')
+    assert np.allclose(root, [[0.5, 0.0, 0.0]])
+    assert np.allclose(hips, [[0.0, 0.0, -0.25]])
+
+
+def test_extract_yaw_moves_the_facing_to_the_root():
+    # The hips turn around up and walk along X, the root takes the turn and the travel
+    angles = np.array([0.0, 1.5, 3.0, -1.8])
+    rotation = np.column_stack((np.cos(angles / 2), 0.0 * angles, 0.0 * angles, np.sin(angles / 2)))
+    location = np.column_stack((np.arange(4.0), 0.0 * angles, np.full(4, 0.5)))
+    root, root_rotation, hips, hips_rotation = core.extract_root_motion(location, rotation, mode='GROUND', extract_yaw=True)
+    assert np.allclose(root, location * (1.0, 1.0, 0.0))
+    # Unwrapped past half a turn, the last angle is -1.8 + 2 pi
+    yaw = 2.0 * np.arctan2(root_rotation[:, 3], root_rotation[:, 0])
+    assert np.allclose(yaw, [0.0, 1.5, 3.0, 2.0 * np.pi - 1.8])
+    assert np.allclose(np.abs(hips_rotation[:, 0]), 1.0)
+    assert np.allclose(hips, [[0.0, 0.0, 0.5]] * 4)
+
+
+def test_extract_root_motion_rejects_unknown_modes():
+    with pytest.raises(ValueError):
+        core.extract_root_motion(np.zeros((1, 3)), mode='LEGACY')
+    with pytest.raises(ValueError):
+        core.extract_root_motion(np.zeros((1, 3)), mode='CONTACT')
+
+
+def test_loop_errors_per_action():
+    # Two actions of 2 and 1 bones, the second bone of the first one turns by 90 degrees
+    first = np.array([[1.0, 0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+    last = np.array([[1.0, 0.0, 0.0, 0.0], [np.cos(np.pi / 4), np.sin(np.pi / 4), 0.0, 0.0], [0.0, -1.0, 0.0, 0.0]])
+    assert np.allclose(core.loop_errors(first, last, [2, 1]), [90.0, 0.0])
+    # An action without rotation curves has nothing to compare and is never a loop
+    assert np.allclose(core.loop_errors(first, last, [2, 0, 1]), [90.0, np.inf, 0.0])
+    assert np.isinf(core.loop_errors(np.zeros((0, 4)), np.zeros((0, 4)), [0])).all()
+
+
+def test_close_loop_spreads_the_difference():
+    frames = np.array([0.0, 1.0, 3.0, 4.0])
+    values = np.array([[0.0, 1.0], [1.0, 1.0], [2.0, 1.0], [4.0, 3.0]])
+    closed = core.close_loop(frames, values)
+    assert np.allclose(closed[-1], closed[0])
+    assert np.allclose(closed, values - np.outer(frames / 4.0, [4.0, 2.0]))
+
+
+def test_close_quaternion_loop_matches_the_first_rotation():
+    frames = np.arange(5.0)
+    angles = np.linspace(0.0, 0.6, 5)
+    axis = np.array([1.0, 2.0, 0.5]) / np.linalg.norm([1.0, 2.0, 0.5])
+    quaternions = np.column_stack((np.cos(angles / 2), np.sin(angles / 2)[:, None] * axis))
+    # Sign flips on the way do not matter
+    quaternions[2] *= -1.0
+    closed = core.close_quaternion_loop(frames, quaternions)
+    assert np.allclose(core.quaternion_angles(closed[:1], closed[-1:]), 0.0, atol=1e-7)
+    # The correction grows linearly, so a steady turn is undone on every frame
+    assert np.allclose(core.quaternion_angles(closed[:1], closed), 0.0, atol=1e-7)
+    assert np.allclose(np.linalg.norm(closed, axis=1), 1.0)
+    unchanged = core.close_quaternion_loop(frames, np.tile([1.0, 0.0, 0.0, 0.0], (5, 1)))
+    assert np.allclose(unchanged, [1.0, 0.0, 0.0, 0.0])
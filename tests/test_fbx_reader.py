@@ -0,0 +1,150 @@
+# The animation only FBX reader on a small binary FBX built in memory: the record layout of
+# both header widths, compressed arrays, skipped records and the pose space channels.
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import fbx_reader
+from fbx_reader import FBX_MAGIC, FBX_KTIME
+
+
+FRAME = FBX_KTIME // 30
+
+
+def encode_property(value, compress):
+    # bytes are written as they are, for records the reader must never decode
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        return b'S' + struct.pack('<I', len(data)) + data
+    if isinstance(value, int):
+        return b'L' + struct.pack('<q', value)
+    if isinstance(value, float):
+        return b'D' + struct.pack('<d', value)
+    code = {'<f8': b'd', '<f4': b'f', '<i8': b'l'}[value.dtype.str]
+    data = value.tobytes()
+    if compress:
+        data = zlib.compress(data)
+    return code + struct.pack('<III', len(value), 1 if compress else 0, len(data)) + data
+
+
+def encode_node(node, offset, wide, compress):
+    # One record and its children, end offsets are absolute so the start offset has to be known
+    name, props, children = node
+    header = '<QQQB' if wide else '<IIIB'
+    props = b''.join(encode_property(value, compress) for value in props)
+    body = name.encode('ascii') + props
+    position = offset + struct.calcsize(header) + len(body)
+    for child in children:
+        data = encode_node(child, position, wide, compress)
+        body += data
+        position += len(data)
+    if children:
+        # A null record ends every list of children
+        body += bytes(struct.calcsize(header))
+    end = offset + struct.calcsize(header) + len(body)
+    return struct.pack(header, end, len(node[1]), len(props), len(name)) + body
+
+
+def encode_fbx(nodes, version, compress):
+    data = FBX_MAGIC + struct.pack('<I', version)
+    for node in nodes:
+        data += encode_node(node, len(data), version >= 7500, compress)
+    return data + bytes(25 if version >= 7500 else 13)
+
+
+def p(name, *values):
+    return ("P", [name, "", "", ""] + list(values), [])
+
+
+def properties(*rows):
+    return ("Properties70", [], list(rows))
+
+
+def curve(uid, frames, values):
+    return ("AnimationCurve", [uid, "\x00\x01AnimCurve", ""], [
+        ("KeyTime", [np.array(frames, dtype='<i8') * FRAME], []),
+        ("KeyValueFloat", [np.array(values, dtype='<f4')], []),
+    ])
+
+
+def connection(kind, child, parent, prop=None):
+    return ("C", [kind, child, parent] + ([prop] if prop else []), [])
+
+
+def walk_fbx(version=7400, compress=True):
+    # Hips walking up 10 units and back down 5, the spine turning 90 degrees around Z, at 30 fps
+    return encode_fbx([
+        ("FBXHeaderExtension", [b'Z'], []),
+        ("GlobalSettings", [], [properties(p("TimeMode", 6))]),
+        ("Objects", [], [
+            ("Geometry", [1, b'Z'], [("Vertices", [b'Z'], [])]),
+            ("Model", [100, "mixamorig:Hips\x00\x01Model", "LimbNode"], [properties(p("Lcl Translation", 0.0, 100.0, 0.0))]),
+            ("Model", [200, "mixamorig:Spine\x00\x01Model", "LimbNode"], [properties(p("Lcl Translation", 0.0, 10.0, 0.0))]),
+            ("Model", [250, "mixamorig:Still\x00\x01Model", "LimbNode"], []),
+            ("AnimationStack", [300, "Take 001\x00\x01AnimStack", ""], []),
+            ("AnimationLayer", [400, "BaseLayer\x00\x01AnimLayer", ""], []),
+            ("AnimationCurveNode", [500, "T\x00\x01AnimCurveNode", ""], [properties(p("d|X", 0.0), p("d|Y", 100.0), p("d|Z", 0.0))]),
+            ("AnimationCurveNode", [510, "R\x00\x01AnimCurveNode", ""], [properties(p("d|X", 0.0), p("d|Y", 0.0), p("d|Z", 0.0))]),
+            curve(600, [0, 1, 2], [100.0, 110.0, 105.0]),
+            curve(610, [0, 2], [0.0, 90.0]),
+        ]),
+        ("Connections", [], [
+            connection("OO", 100, 0),
+            connection("OO", 200, 100),
+            connection("OO", 250, 100),
+            connection("OO", 400, 300),
+            connection("OO", 500, 400),
+            connection("OO", 510, 400),
+            connection("OP", 500, 100, "Lcl Translation"),
+            connection("OP", 510, 200, "Lcl Rotation"),
+            connection("OP", 600, 500, "d|Y"),
+            connection("OP", 610, 510, "d|Z"),
+        ]),
+    ], version, compress)
+
+
+@pytest.mark.parametrize("version", [7400, 7500])
+@pytest.mark.parametrize("compress", [False, True])
+def test_parse_keeps_only_the_animation_records(version, compress):
+    # The skipped records hold a property type the reader does not know, decoding them would raise
+    root = fbx_reader.parse(walk_fbx(version, compress))
+    assert root.props == [version]
+    assert [node.name for node in root.children] == ["GlobalSettings", "Objects", "Connections"]
+    objects = root.find("Objects")
+    assert "Geometry" not in [node.name for node in objects.children]
+    times = objects.find_all("AnimationCurve")[0].find("KeyTime").props[0]
+    assert np.array_equal(times, [0, FRAME, 2 * FRAME])
+    assert objects.find("Model").properties70()["Lcl Translation"] == [0.0, 100.0, 0.0]
+
+
+def test_parse_rejects_other_files():
+    with pytest.raises(fbx_reader.FBXError):
+        fbx_reader.parse(b"; FBX 7.4.0 project file")
+
+
+@pytest.mark.parametrize("version", [7400, 7500])
+def test_read_animation_gives_pose_space_channels(version):
+    channels, fps = fbx_reader.read_animation(walk_fbx(version), anim_offset=1.0)
+    assert fps == 30.0
+    curves = {(channel.data_path, channel.array_index): channel.keys for channel in channels}
+    # Only animated bones get channels: location, rotation_quaternion and scale
+    assert len(curves) == 20
+    assert {path.split('"')[1] for path, index in curves} == {"mixamorig:Hips", "mixamorig:Spine"}
+
+    hips = 'pose.bones["mixamorig:Hips"].'
+    assert np.array_equal(curves[(hips + 'location', 1)].frames, [1.0, 2.0, 3.0])
+    # Relative to the rest translation of 100
+    assert np.allclose(curves[(hips + 'location', 1)].values, [0.0, 10.0, 5.0])
+    assert np.allclose(curves[(hips + 'rotation_quaternion', 0)].values, 1.0)
+    assert np.allclose(curves[(hips + 'scale', 2)].values, 1.0)
+
+    spine = 'pose.bones["mixamorig:Spine"].'
+    assert np.array_equal(curves[(spine + 'rotation_quaternion', 3)].frames, [1.0, 3.0])
+    rotation = np.column_stack([curves[(spine + 'rotation_quaternion', index)].values for index in range(4)])
+    assert np.allclose(rotation, [[1.0, 0.0, 0.0, 0.0], [np.cos(np.pi / 4), 0.0, 0.0, np.sin(np.pi / 4)]])
+    assert np.allclose(curves[(spine + 'location', 1)].values, 0.0)
+    assert all((keys.enums['interpolation'] == fbx_reader.INTERPOLATION_LINEAR).all() for keys in curves.values())
@@ -0,0 +1,41 @@
+# Duplicate lookups of the fingerprint index on frame hashes, the way dedup_actions uses it.
+import numpy as np
+
+from fingerprint import Fingerprint, FingerprintIndex, WINDOW
+
+
+def clip(rows):
+    return Fingerprint(np.asarray(rows, dtype=np.uint64))
+
+
+def test_full_and_trimmed_copies_are_found():
+    index = FingerprintIndex()
+    walk = clip(np.arange(1, 61))
+    index.add("Walk", walk)
+    assert index.find(clip(np.arange(1, 61))) == ("Walk", 0)
+    assert index.find(clip(np.arange(21, 51))) == ("Walk", 20)
+    assert index.find(clip(np.arange(21, 51) + 100)) is None
+    # Too short to have a window
+    assert index.find(clip(np.arange(21, 21 + WINDOW - 1))) is None
+
+
+def test_a_trim_starting_on_a_held_pose_is_verified_at_every_offset():
+    # The clip holds its first pose for 40 frames, a trim starting inside the hold shares its first
+    # window with every earlier offset but only matches at one of them
+    index = FingerprintIndex()
+    rows = np.concatenate((np.full(40, 7), np.arange(100, 140)))
+    index.add("Idle", clip(rows))
+    assert index.find(clip(rows[30:70])) == ("Idle", 30)
+    assert index.find(clip(rows[24:80])) == ("Idle", 24)
+
+
+def test_remove_keeps_the_other_clips_windows():
+    index = FingerprintIndex()
+    rows = np.arange(1, 41)
+    index.add("A", clip(rows))
+    index.add("B", clip(np.concatenate((rows, [99] * 5))))
+    index.remove("A")
+    assert index.find(clip(rows[5:35])) == ("B", 5)
+    index.remove("B")
+    assert index.find(clip(rows[5:35])) is None
+    assert not index.windows and not index.clips
@@ -0,0 +1,73 @@
+# Forward kinematics of whole actions against the bone by bone matrix products Blender evaluates.
+import numpy as np
+
+import fk
+import transforms
+from fakes import Action, Armature, Bone
+
+
+def leg():
+    # Hips above a thigh, shin and foot pointing down the Y axis of each bone
+    down = transforms.axis_rotations(np.array([-np.pi / 2]), 0)[0]
+    hips = Bone("Hips", transforms.translation_matrices([0.0, 0.0, 1.0])[0])
+    thigh = Bone("UpLeg", transforms.translation_matrices([0.1, 0.0, 0.9])[0] @ down, hips, 0.4)
+    shin = Bone("Leg", transforms.translation_matrices([0.1, 0.0, 0.5])[0] @ down, thigh, 0.4)
+    foot = Bone("LeftFoot", transforms.translation_matrices([0.1, 0.0, 0.1])[0] @ down, shin, 0.1)
+    # Listed children first, evaluation has to order them
+    return Armature("Leg", [foot, shin, hips, thigh], rotation_modes={"Leg": 'XYZ'})
+
+
+def test_hierarchy_order_puts_parents_first():
+    names = [bone.name for bone in fk.hierarchy_order(leg().data.bones)]
+    assert names == ["Hips", "UpLeg", "Leg", "LeftFoot"]
+
+
+def test_evaluate_matches_bone_by_bone_products():
+    armature = leg()
+    rest, absolute = fk.rest_matrices(armature)
+    parents = {bone.name: bone.parent.name if bone.parent else None for bone in armature.data.bones}
+    generator = np.random.default_rng(1)
+    basis = {name: transforms.quaternion_matrices(generator.normal(size=(4, 4))) for name in ("UpLeg", "LeftFoot")}
+    world = transforms.translation_matrices([1.0, 2.0, 0.0])[0]
+    pose = fk.evaluate(rest, parents, basis, 4, world)
+
+    for frame in range(4):
+        expected = {}
+        for bone in fk.hierarchy_order(armature.data.bones):
+            parent = expected[bone.parent.name] @ np.linalg.inv(bone.parent.matrix_local) if bone.parent else world
+            local = basis[bone.name][frame] if bone.name in basis else np.eye(4)
+            expected[bone.name] = parent @ bone.matrix_local @ local
+        for name, matrix in expected.items():
+            assert np.allclose(pose[name][frame], matrix), name
+    # At rest every bone sits at its world rest matrix
+    still = fk.evaluate(rest, parents, {}, 1)
+    for name, matrix in absolute.items():
+        assert np.allclose(still[name][0], matrix)
+
+
+def test_sample_basis_interpolates_every_channel():
+    armature = leg()
+    action = Action()
+    action.key('pose.bones["Hips"].location', 2, [1.0, 5.0], [0.0, 0.4])
+    action.key('pose.bones["Leg"].rotation_euler', 0, [1.0, 3.0], [0.0, 1.0])
+    modes = {bone.name: bone.rotation_mode for bone in armature.pose.bones}
+    frames, basis = fk.sample_basis(action, modes)
+    assert np.array_equal(frames, [1.0, 3.0, 5.0])
+    assert set(basis) == {"Hips", "Leg"}
+    assert np.allclose(basis["Hips"][:, 2, 3], [0.0, 0.2, 0.4])
+    # Euler curves are radians, held constant past the last key
+    expected = transforms.axis_rotations(np.array([0.0, 1.0, 1.0]), 0)
+    assert np.allclose(basis["Leg"], expected)
+
+
+def test_contact_heights_follow_the_lowest_point():
+    armature = leg()
+    action = Action()
+    # The hips go up half a unit and come back
+    action.key('pose.bones["Hips"].location', 2, [1.0, 2.0, 3.0], [0.0, 0.5, 0.0])
+    frames, heights = fk.contact_heights(armature, action)
+    assert np.array_equal(frames, [1.0, 2.0, 3.0])
+    # The foot tail is 0.1 below its head at 0.1
+    assert np.allclose(heights, [0.0, 0.5, 0.0])
+    _frames, none = fk.contact_heights(armature, action, exclude=("Hips",))
+    assert np.allclose(none, 0.0)
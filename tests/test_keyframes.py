@@ -0,0 +1,127 @@
+# KeyframeBuffer against the per key loops it replaced: every edit has to leave the F-curve
+# with exactly the keys the loop over keyframe_points left.
+import numpy as np
+import pytest
+
+from keyframes import KeyframeBuffer, Channel, read_action, write_action, save_channels, load_channels
+from fakes import Action, FCurve, KeyframePoints
+
+
+FRAMES = np.arange(1.0, 13.0)
+VALUES = np.array([0.5, -1.25, 3.0, -0.001, 0.0, 2.5, -7.0, 1.0, 0.25, -0.75, 4.0, -2.0])
+
+
+def curve(values=VALUES, frames=FRAMES, points=None):
+    fcurve = FCurve('pose.bones["mixamorig:Hips"].location', 1, "mixamorig:Hips", **({"points": points} if points else {}))
+    co = np.column_stack((frames, values))
+    # Handles off the keys, so an edit touching them shows
+    return fcurve.set_keys(co, co - (0.3, 0.1), co + (0.3, 0.2), interpolation=np.arange(len(co)) % 3)
+
+
+def per_key(fcurve, edit):
+    # The old loops: one Python level access per key and vector, stored back as C floats
+    points = fcurve.keyframe_points.arrays
+    for i in range(len(points['co'])):
+        for attr in ('co', 'handle_left', 'handle_right'):
+            x, y = (float(v) for v in points[attr][i])
+            points[attr][i] = edit(attr, x, y)
+    return fcurve
+
+
+def assert_same_keys(a, b):
+    for attr, values in a.keyframe_points.arrays.items():
+        assert np.array_equal(values, b.keyframe_points.arrays[attr]), attr
+
+
+@pytest.mark.parametrize("minimum, maximum", [(0.0, None), (None, 0.0), (-1.0, 2.0)])
+def test_clamp_matches_key_loop(minimum, maximum):
+    def clamp(attr, x, y):
+        # Only keys strictly past the bound are set to it, handles untouched
+        if attr == 'co':
+            if minimum is not None and y < minimum:
+                y = minimum
+            if maximum is not None and y > maximum:
+                y = maximum
+        return x, y
+
+    fcurve = curve()
+    KeyframeBuffer.read(fcurve).clamp(minimum, maximum).write(fcurve)
+    assert_same_keys(fcurve, per_key(curve(), clamp))
+
+
+def test_offset_matches_key_loop():
+    fcurve = curve()
+    KeyframeBuffer.read(fcurve).offset(frames=-1.0, values=0.5).write(fcurve)
+    assert_same_keys(fcurve, per_key(curve(), lambda attr, x, y: (x - 1.0, y + 0.5)))
+
+
+@pytest.mark.parametrize("factor, pivot", [(0.01, 0.0), (2.0, 1.5), (-1.0, 0.0)])
+def test_scale_matches_key_loop(factor, pivot):
+    fcurve = curve()
+    KeyframeBuffer.read(fcurve).scale(factor, pivot).write(fcurve)
+    assert_same_keys(fcurve, per_key(curve(), lambda attr, x, y: (x, (y - pivot) * factor + pivot)))
+
+
+def test_read_matches_key_values():
+    fcurve = curve()
+    keys = KeyframeBuffer.read(fcurve)
+    points = fcurve.keyframe_points.arrays
+    assert len(keys) == len(FRAMES)
+    for i in range(len(keys)):
+        assert tuple(keys.co[i]) == tuple(float(v) for v in points['co'][i])
+        assert tuple(keys.handle_left[i]) == tuple(float(v) for v in points['handle_left'][i])
+        assert tuple(keys.handle_right[i]) == tuple(float(v) for v in points['handle_right'][i])
+        assert keys.enums['interpolation'][i] == points['interpolation'][i, 0]
+
+
+def test_write_round_trip_is_exact():
+    fcurve = curve()
+    before = {attr: values.copy() for attr, values in fcurve.keyframe_points.arrays.items()}
+    KeyframeBuffer.read(fcurve).write(fcurve)
+    for attr, values in before.items():
+        assert np.array_equal(values, fcurve.keyframe_points.arrays[attr]), attr
+    assert fcurve.updates == 1
+
+
+@pytest.mark.parametrize("count", [3, 12, 20])
+def test_write_resizes_the_curve(count):
+    fcurve = curve()
+    frames = np.arange(count, dtype=np.float64)
+    written = KeyframeBuffer(np.column_stack((frames, frames * 0.5))).write(fcurve)
+    assert written is fcurve
+    assert len(fcurve.keyframe_points) == count
+    assert np.array_equal(fcurve.keyframe_points.arrays['co'][:, 1], (frames * 0.5).astype(np.float32))
+
+
+def test_write_without_clear_makes_the_curve_again():
+    action = Action(points=KeyframePoints)
+    fcurve = action.fcurves.new('pose.bones["mixamorig:Hips"].location', 2, "mixamorig:Hips")
+    fcurve.set_keys(np.column_stack((FRAMES, VALUES)))
+    fcurve.extrapolation = 'LINEAR'
+    written = KeyframeBuffer(np.column_stack((FRAMES[:4], VALUES[:4]))).write(fcurve)
+    assert written is not fcurve and list(action.fcurves) == [written]
+    assert (written.data_path, written.array_index, written.group.name) == (fcurve.data_path, 2, "mixamorig:Hips")
+    assert written.extrapolation == 'LINEAR'
+    assert np.array_equal(written.keyframe_points.arrays['co'], np.column_stack((FRAMES[:4], VALUES[:4])).astype(np.float32))
+
+
+def test_enums_are_only_written_when_read_or_given():
+    fcurve = curve()
+    KeyframeBuffer(np.column_stack((FRAMES, VALUES))).write(fcurve)
+    assert np.array_equal(fcurve.keyframe_points.arrays['interpolation'][:, 0], np.arange(len(FRAMES)) % 3)
+
+
+def test_actions_and_payloads_round_trip(tmp_path):
+    source = Action("Walk")
+    source.key('pose.bones["mixamorig:Hips"].location', 0, FRAMES, VALUES)
+    source.key('pose.bones["mixamorig:Spine"].rotation_quaternion', 3, FRAMES, -VALUES)
+    payload = str(tmp_path / "walk.npz")
+    save_channels(payload, read_action(source), name="Walk", properties={"mixamo_source_fps": 30.0})
+    channels, meta = load_channels(payload)
+    assert meta == {"name": "Walk", "properties": {"mixamo_source_fps": 30.0}}
+    assert all(isinstance(channel, Channel) for channel in channels)
+
+    restored = write_action(Action("Walk"), channels)
+    for original, copy in zip(source.fcurves, restored.fcurves):
+        assert (original.data_path, original.array_index) == (copy.data_path, copy.array_index)
+        assert_same_keys(original, copy)
@@ -0,0 +1,164 @@
+# Built-in retargeting on a small Mixamo style source rig and a control rig with other rest
+# orientations: the bone map, and solve() checked against forward kinematics of both rigs.
+import numpy as np
+import pytest
+
+import fk
+import transforms
+from retarget import Retargeter, map_bones, CONTROL_PREFIX
+from fakes import Action, Armature, Bone
+
+
+def rest(location, axis=(1.0, 0.0, 0.0), angle=0.0):
+    # Armature space rest matrix of a bone
+    axis = np.asarray(axis, dtype=np.float64) / np.linalg.norm(axis)
+    quaternion = np.concatenate(([np.cos(angle / 2)], np.sin(angle / 2) * axis))
+    matrix = transforms.quaternion_matrices(quaternion)[0]
+    matrix[:3, 3] = location
+    return matrix
+
+
+def rig(name, bones, matrix_world=np.eye(4), rotation_modes=None):
+    # bones: (name, parent name, rest matrix) in hierarchy order
+    made = {}
+    for bone_name, parent, matrix in bones:
+        made[bone_name] = Bone(bone_name, matrix, made.get(parent))
+    return Armature(name, list(made.values()), matrix_world, rotation_modes)
+
+
+def source_rig():
+    # Imported like the FBX importer does it: rotated upright and scaled to meters
+    world = rest((0.0, 0.0, 0.0), (1.0, 0.0, 0.0), np.pi / 2) @ np.diag([0.01, 0.01, 0.01, 1.0])
+    return rig("Walk", [
+        ("mixamorig:Hips", None, rest((0.0, 100.0, 0.0), (1.0, 0.0, 0.0), -np.pi / 2)),
+        ("mixamorig:Spine", "mixamorig:Hips", rest((0.0, 110.0, 2.0), (1.0, 0.0, 0.0), -np.pi / 2)),
+        ("mixamorig:Head", "mixamorig:Spine", rest((0.0, 160.0, 1.0), (1.0, 0.0, 0.0), -np.pi / 2)),
+        ("mixamorig:LeftUpLeg", "mixamorig:Hips", rest((10.0, 95.0, 0.0), (0.0, 0.0, 1.0), np.pi)),
+        ("mixamorig:LeftLeg", "mixamorig:LeftUpLeg", rest((10.0, 50.0, 1.0), (0.0, 0.0, 1.0), np.pi)),
+        ("mixamorig:RightHand", "mixamorig:Spine", rest((-60.0, 140.0, 0.0), (0.0, 0.0, 1.0), np.pi / 2)),
+    ], world)
+
+
+def control_rig(rotation_modes=None):
+    # Twice as tall, other bone rolls, and a control with no Mixamo counterpart
+    return rig("Rig", [
+        ("Ctrl_Hips", None, rest((0.0, 0.0, 2.0), (0.0, 1.0, 0.0), 0.4)),
+        ("Ctrl_Spine", "Ctrl_Hips", rest((0.0, 0.0, 2.2), (1.0, 1.0, 0.0), 0.3)),
+        ("Ctrl_Spine_IK", "Ctrl_Hips", rest((0.0, 0.5, 2.2))),
+        ("Ctrl_Head_FK", "Ctrl_Spine", rest((0.0, 0.02, 3.2), (0.0, 0.0, 1.0), -0.7)),
+        ("Ctrl_UpLeg_FK_Left", "Ctrl_Hips", rest((0.2, 0.0, 1.9), (1.0, 0.0, 0.0), np.pi)),
+        ("Ctrl_Leg_FK_Left", "Ctrl_UpLeg_FK_Left", rest((0.2, -0.02, 1.0), (1.0, 0.2, 0.0), np.pi)),
+    ], rotation_modes=rotation_modes)
+
+
+EXPECTED_MAP = {
+    "mixamorig:Hips": "Ctrl_Hips",
+    "mixamorig:Spine": "Ctrl_Spine",
+    "mixamorig:Head": "Ctrl_Head_FK",
+    "mixamorig:LeftUpLeg": "Ctrl_UpLeg_FK_Left",
+    "mixamorig:LeftLeg": "Ctrl_Leg_FK_Left",
+}
+
+
+def random_basis(names, count, seed=7):
+    # {bone: (count, 4, 4)} random pose rotations, plus a hips translation
+    generator = np.random.default_rng(seed)
+    basis = {}
+    for name in names:
+        quaternions = generator.normal(size=(count, 4))
+        basis[name] = transforms.quaternion_matrices(quaternions)
+    basis["mixamorig:Hips"] = transforms.translation_matrices(generator.normal(scale=20.0, size=(count, 3))) @ basis["mixamorig:Hips"]
+    return basis
+
+
+def rotations(matrices):
+    matrices = np.asarray(matrices)[..., :3, :3]
+    return matrices / np.linalg.norm(matrices, axis=-2, keepdims=True)
+
+
+def test_map_bones_fixture_rig():
+    source = source_rig()
+    target = control_rig()
+    mapping = map_bones([bone.name for bone in source.data.bones], [bone.name for bone in target.data.bones])
+    assert mapping == EXPECTED_MAP
+
+
+def test_map_bones_prefers_ctrl_hips_and_never_maps_a_control_twice():
+    mapping = map_bones(["mixamorig:Hips", "Hips", "mixamorig:Spine", "Spine"], ["Hips", "Ctrl_Hips", "Ctrl_Spine"])
+    assert mapping["mixamorig:Hips"] == "Ctrl_Hips"
+    assert mapping["Hips"] == "Hips"
+    assert mapping["mixamorig:Spine"] == "Ctrl_Spine"
+    assert "Spine" not in mapping
+
+
+def test_map_bones_without_prefix():
+    mapping = map_bones(["Hips", "RightArm"], [CONTROL_PREFIX + "Hips", "Ctrl_Arm_FK_Right"], name_prefix="mixamorig:", hip_bone_name="Hips")
+    assert mapping == {"Hips": "Ctrl_Hips", "RightArm": "Ctrl_Arm_FK_Right"}
+
+
+def test_rest_pose_solves_to_identity():
+    retargeter = Retargeter(source_rig(), control_rig())
+    frames = np.arange(3.0)
+    identity = {name: np.tile(np.eye(4), (3, 1, 1)) for name in retargeter.source_rest}
+    solved = retargeter.solve(frames, identity)
+    assert set(solved) == set(EXPECTED_MAP.values())
+    for location, rotation in solved.values():
+        assert np.allclose(location, 0.0, atol=1e-9)
+        assert np.allclose(np.abs(rotation[:, 0]), 1.0, atol=1e-9)
+
+
+def test_solve_matches_forward_kinematics():
+    source = source_rig()
+    target = control_rig()
+    retargeter = Retargeter(source, target)
+    frames = np.arange(6.0)
+    basis = random_basis(retargeter.source_rest, len(frames))
+    solved = retargeter.solve(frames, basis)
+
+    # The control rig posed with the solved channels, evaluated like Blender does
+    control_basis = {name: transforms.translation_matrices(location) @ transforms.quaternion_matrices(rotation) for name, (location, rotation) in solved.items()}
+    control_pose = fk.evaluate(retargeter.target_rest, retargeter.target_parents, control_basis, len(frames), retargeter.target_world)
+    source_pose = fk.evaluate(retargeter.source_rest, retargeter.source_parents, basis, len(frames), retargeter.source_world)
+
+    for source_name, control_name in EXPECTED_MAP.items():
+        # Every control bone turns with its source bone, keeping their rest offset
+        expected = source_pose[source_name] @ retargeter.offsets[source_name]
+        assert np.allclose(rotations(control_pose[control_name]), rotations(expected), atol=1e-9), control_name
+
+    # Only the hips move, by the source hips travel scaled to the control rig's height
+    moved = source_pose["mixamorig:Hips"][:, :3, 3] - retargeter.source_hips_rest
+    assert retargeter.height_ratio == pytest.approx(2.0)
+    assert np.allclose(control_pose["Ctrl_Hips"][:, :3, 3], retargeter.target_hips_rest + moved * 2.0, atol=1e-9)
+    for name, (location, _rotation) in solved.items():
+        if name != "Ctrl_Hips":
+            assert np.allclose(location, 0.0)
+
+
+def test_euler_controls_get_the_same_rotation():
+    source = source_rig()
+    retargeter = Retargeter(source, control_rig({"Ctrl_Head_FK": 'XYZ'}))
+    frames = np.arange(4.0)
+    solved = retargeter.solve(frames, random_basis(retargeter.source_rest, len(frames), seed=3))
+    channels = [channel for channel in retargeter.channels(frames, solved) if channel.data_path == 'pose.bones["Ctrl_Head_FK"].rotation_euler']
+    assert [channel.array_index for channel in channels] == [0, 1, 2]
+    eulers = np.column_stack([channel.keys.values for channel in channels])
+    expected = transforms.quaternion_matrices(solved["Ctrl_Head_FK"][1])
+    assert np.allclose(transforms.euler_matrices(np.degrees(eulers), 'XYZ'), expected, atol=1e-9)
+
+
+def test_sample_and_solve_from_an_action():
+    source = source_rig()
+    retargeter = Retargeter(source, control_rig())
+    action = Action("Walk")
+    path = 'pose.bones["mixamorig:Spine"].rotation_quaternion'
+    angles = np.linspace(0.0, 1.0, 5)
+    for index, values in enumerate((np.cos(angles / 2), np.sin(angles / 2), 0.0 * angles, 0.0 * angles)):
+        action.key(path, index, np.arange(1.0, 6.0), values)
+    frames, basis = retargeter.sample(action)
+    assert np.array_equal(frames, np.arange(1.0, 6.0))
+    assert set(basis) == {"mixamorig:Spine"}
+    solved = retargeter.solve(frames, basis)
+    # Only the spine turns, everything above and beside it stays at rest
+    for name in ("Ctrl_Hips", "Ctrl_UpLeg_FK_Left", "Ctrl_Leg_FK_Left"):
+        assert np.allclose(np.abs(solved[name][1][:, 0]), 1.0, atol=1e-6)
+    assert not np.allclose(np.abs(solved["Ctrl_Spine"][1][-1, 0]), 1.0, atol=1e-3)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Batched transform math on NumPy arrays, one row per frame. Quaternions are (w, x, y, z)
+# like Blender's rotation_quaternion. Nothing here needs bpy.
+import numpy as np
+
+
+def translation_matrices(vectors):
+    vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, 3)
+    matrices = np.tile(np.eye(4), (len(vectors), 1, 1))
+    matrices[:, :3, 3] = vectors
+    return matrices
+
+def scale_matrices(vectors):
+    vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, 3)
+    matrices = np.tile(np.eye(4), (len(vectors), 1, 1))
+    matrices[:, [0, 1, 2], [0, 1, 2]] = vectors
+    return matrices
+
+def axis_rotations(angles, axis):
+    # (n,) radians to (n, 4, 4) rotations around a single axis
+    cos, sin = np.cos(angles), np.sin(angles)
+    matrices = np.tile(np.eye(4), (len(angles), 1, 1))
+    a, b = [(1, 2), (2, 0), (0, 1)][axis]
+    matrices[:, a, a] = cos
+    matrices[:, a, b] = -sin
+    matrices[:, b, a] = sin
+    matrices[:, b, b] = cos
+    return matrices
+
+def euler_matrices(degrees, order="XYZ"):
+    # order names the axis applied first, so XYZ gives Rz @ Ry @ Rx
+    radians = np.radians(np.asarray(degrees, dtype=np.float64).reshape(-1, 3))
+    matrices = np.tile(np.eye(4), (len(radians), 1, 1))
+    for axis_name in order:
+        axis = "XYZ".index(axis_name)
+        matrices = axis_rotations(radians[:, axis], axis) @ matrices
+    return matrices
+
+def quaternion_matrices(quaternions):
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    matrices = np.tile(np.eye(4), (len(q), 1, 1))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+def matrix_quaternions(matrices):
+    # Rotation part of (n, 3+, 3+) matrices to unit quaternions, choosing the stable branch per row
+    m = np.asarray(matrices, dtype=np.float64)[:, :3, :3]
+    diagonal = np.stack((m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2], m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]), axis=1)
+    branch = np.argmax(diagonal, axis=1)
+    quaternions = np.empty((len(m), 4))
+
+    s = 2.0 * np.sqrt(np.maximum(1.0 + diagonal[:, 0], 1e-12))
+    w_branch = np.stack((0.25 * s, (m[:, 2, 1] - m[:, 1, 2]) / s, (m[:, 0, 2] - m[:, 2, 0]) / s, (m[:, 1, 0] - m[:, 0, 1]) / s), axis=1)
+    s = 2.0 * np.sqrt(np.maximum(1.0 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2], 1e-12))
+    x_branch = np.stack(((m[:, 2, 1] - m[:, 1, 2]) / s, 0.25 * s, (m[:, 0, 1] + m[:, 1, 0]) / s, (m[:, 0, 2] + m[:, 2, 0]) / s), axis=1)
+    s = 2.0 * np.sqrt(np.maximum(1.0 + m[:, 1, 1] - m[:, 0, 0] - m[:, 2, 2], 1e-12))
+    y_branch = np.stack(((m[:, 0, 2] - m[:, 2, 0]) / s, (m[:, 0, 1] + m[:, 1, 0]) / s, 0.25 * s, (m[:, 1, 2] + m[:, 2, 1]) / s), axis=1)
+    s = 2.0 * np.sqrt(np.maximum(1.0 + m[:, 2, 2] - m[:, 0, 0] - m[:, 1, 1], 1e-12))
+    z_branch = np.stack(((m[:, 1, 0] - m[:, 0, 1]) / s, (m[:, 0, 2] + m[:, 2, 0]) / s, (m[:, 1, 2] + m[:, 2, 1]) / s, 0.25 * s), axis=1)
+
+    for i, candidate in enumerate((w_branch, x_branch, y_branch, z_branch)):
+        quaternions[branch == i] = candidate[branch == i]
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    # Canonical w >= 0, like mathutils
+    quaternions[quaternions[:, 0] < 0] *= -1
+    return quaternions
+
+def make_compatible(quaternions):
+    # Flip signs so consecutive quaternions stay in the same hemisphere, like Quaternion.make_compatible
+    q = np.array(quaternions, dtype=np.float64).reshape(-1, 4)
+    if len(q) > 1:
+        flips = np.where(np.einsum('ij,ij->i', q[1:], q[:-1]) < 0, -1.0, 1.0)
+        q[1:] *= np.cumprod(flips)[:, None]
+    return q
+
+def decompose(matrices):
+    # (n, 4, 4) to location (n, 3), quaternion (n, 4) and scale (n, 3)
+    matrices = np.asarray(matrices, dtype=np.float64)
+    location = matrices[:, :3, 3].copy()
+    scale = np.linalg.norm(matrices[:, :3, :3], axis=1)
+    scale[np.linalg.det(matrices[:, :3, :3]) < 0, 0] *= -1
+    rotation = matrix_quaternions(matrices[:, :3, :3] / scale[:, None, :])
+    return location, rotation, scale
+
+def matrix_eulers_xyz(matrices):
+    # Rotation part of (n, 3+, 3+) matrices to XYZ euler radians (Blender's default order), unwrapped over the rows
+    m = np.asarray(matrices, dtype=np.float64)[:, :3, :3]
+    x = np.arctan2(m[:, 2, 1], m[:, 2, 2])
+    y = np.arcsin(np.clip(-m[:, 2, 0], -1.0, 1.0))
+    z = np.arctan2(m[:, 1, 0], m[:, 0, 0])
+    return np.unwrap(np.column_stack((x, y, z)), axis=0)
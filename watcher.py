@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+'''
+    Copyright (C) 2026  Richard Perry
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+# Polling watcher for the Source Directory. Files are indexed by mtime and size; a poll only
+# lists the directory when its own mtime changed (a file was added, removed or renamed) or
+# when the periodic rescan for in place overwrites is due, otherwise it only stats the
+# directory and the files still settling. New or changed files are reported once their
+# mtime and size have been stable for the debounce time, so half written downloads are skipped.
+# A reported file is only indexed once the caller marks it imported, a failed import is
+# reported again after the next rescan.
+import os
+import time
+
+
+class DirectoryWatcher:
+    '''Reports new or modified files of a directory once they stop changing'''
+
+    def __init__(self, directory, extension='.fbx', debounce=5.0, rescan_interval=60.0, include_existing=False):
+        self.directory = directory
+        self.extension = extension
+        self.debounce = debounce
+        self.rescan_interval = rescan_interval
+        self.index = {}
+        self.pending = {}
+        self.settled = {}
+        self.directory_mtime = None
+        self.last_scan = 0.0
+        if not include_existing:
+            self.index = self.scan()
+            self.directory_mtime = os.stat(directory).st_mtime_ns
+            self.last_scan = time.monotonic()
+
+    def scan(self):
+        # {name: (mtime, size)} of every matching file
+        entries = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.extension) and entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return entries
+
+    def stat(self, name):
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self, now=None):
+        # Returns the names of files that are new or modified and have settled
+        now = time.monotonic() if now is None else now
+        directory_mtime = os.stat(self.directory).st_mtime_ns
+        if directory_mtime != self.directory_mtime or now - self.last_scan >= self.rescan_interval:
+            self.directory_mtime = directory_mtime
+            self.last_scan = now
+            for name, signature in self.scan().items():
+                if self.index.get(name) != signature and name not in self.pending:
+                    self.pending[name] = (signature, now)
+
+        ready = []
+        for name, (signature, since) in list(self.pending.items()):
+            current = self.stat(name)
+            if current is None:
+                del self.pending[name]
+            elif current != signature:
+                # Still being written, restart the debounce
+                self.pending[name] = (current, now)
+            elif now - since >= self.debounce:
+                del self.pending[name]
+                self.settled[name] = current
+                ready.append(name)
+        return sorted(ready)
+
+    def imported(self, name):
+        # Indexes a reported file, it is reported again only once it changes
+        signature = self.settled.pop(name, None)
+        if signature is not None:
+            self.index[name] = signature